@@ -0,0 +1,440 @@
+import asyncio
+import functools
+from datetime import datetime, MAXYEAR, MINYEAR
+from typing import AsyncIterator, Iterable, List, Tuple
+import Solution
+from Solution import entity_cache, QUERIES, zero_months
+from Utility.AsyncDBConnector import AsyncDBConnector
+from Utility.ReturnValue import ReturnValue
+from Utility.Exceptions import DatabaseException
+from Business.Customer import Customer, BadCustomer
+from Business.Order import Order, BadOrder
+from Business.Dish import Dish, BadDish
+from Business.OrderDish import OrderDish
+
+'''
+    asyncio counterpart of Solution.py: the same functions with the same results, as coroutines sharing
+    a small pool of asynchronous connections per event loop (see Utility/AsyncDBConnector.py).
+    Schema management, place_order, the bulk API and the CSV imports need transactions or COPY, which
+    asynchronous connections do not support, so they run the functions of Solution.py in the loop's
+    default executor
+'''
+
+
+# run a blocking function of Solution.py without blocking the event loop
+async def _in_executor(function, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+# ---------------------------------- CRUD API: ----------------------------------
+# Basic database functions
+
+
+async def create_tables() -> None:
+    await _in_executor(Solution.create_tables)
+
+
+async def clear_tables() -> None:
+    await _in_executor(Solution.clear_tables)
+
+
+async def drop_tables() -> None:
+    await _in_executor(Solution.drop_tables)
+
+
+# CRUD API
+
+async def add_customer(customer: Customer) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            await connection.execute(QUERIES['add_customer'], params=(customer.get_cust_id(), customer.get_full_name(),
+                                                                       customer.get_phone(), customer.get_address()))
+        entity_cache.invalidate('customer', customer.get_cust_id())
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
+        return ReturnValue.BAD_PARAMS
+    except DatabaseException.UNIQUE_VIOLATION:
+        return ReturnValue.ALREADY_EXISTS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+async def get_customer(customer_id: int) -> Customer:
+    cached = entity_cache.get('customer', customer_id)
+    if cached is not None:
+        return Customer(*cached)
+    token = entity_cache.token()
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute_prepared('get_customer', (customer_id,))
+    except DatabaseException.ConnectionInvalid:
+        return BadCustomer()
+    if result.size() == 0:
+        return BadCustomer()
+    db_result = result[0]
+    customer = Customer(db_result['cust_id'], db_result['full_name'], db_result['phone'], db_result['address'])
+    entity_cache.put('customer', customer_id, (customer.get_cust_id(), customer.get_full_name(),
+                                               customer.get_phone(), customer.get_address()), token)
+    return customer
+
+
+async def delete_customer(customer_id: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            rows_effected, _ = await connection.execute(QUERIES['delete_customer'], params=(customer_id,))
+        entity_cache.invalidate('customer', customer_id)
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.NOT_EXISTS if rows_effected == 0 else ReturnValue.OK
+
+
+async def add_order(order: Order) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            await connection.execute(QUERIES['add_order'], params=(order.get_order_id(), order.get_datetime()))
+        entity_cache.invalidate('order', order.get_order_id())
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
+        return ReturnValue.BAD_PARAMS
+    except DatabaseException.UNIQUE_VIOLATION:
+        return ReturnValue.ALREADY_EXISTS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+async def get_order(order_id: int) -> Order:
+    cached = entity_cache.get('order', order_id)
+    if cached is not None:
+        return Order(*cached)
+    token = entity_cache.token()
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute_prepared('get_order', (order_id,))
+    except DatabaseException.ConnectionInvalid:
+        return BadOrder()
+    if result.size() == 0:
+        return BadOrder()
+    db_result = result[0]
+    order = Order(db_result['order_id'], db_result['date'])
+    entity_cache.put('order', order_id, (order.get_order_id(), order.get_datetime()), token)
+    return order
+
+
+async def delete_order(order_id: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            rows_effected, _ = await connection.execute(QUERIES['delete_order'], params=(order_id,))
+        entity_cache.invalidate('order', order_id)
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.NOT_EXISTS if rows_effected == 0 else ReturnValue.OK
+
+
+async def add_dish(dish: Dish) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            await connection.execute(QUERIES['add_dish'], params=(dish.get_dish_id(), dish.get_name(),
+                                                                   dish.get_price(), dish.get_is_active()))
+        entity_cache.invalidate('dish', dish.get_dish_id())
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
+        return ReturnValue.BAD_PARAMS
+    except DatabaseException.UNIQUE_VIOLATION:
+        return ReturnValue.ALREADY_EXISTS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+async def get_dish(dish_id: int) -> Dish:
+    cached = entity_cache.get('dish', dish_id)
+    if cached is not None:
+        return Dish(*cached)
+    token = entity_cache.token()
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute_prepared('get_dish', (dish_id,))
+    except DatabaseException.ConnectionInvalid:
+        return BadDish()
+    if result.size() == 0:
+        return BadDish()
+    db_result = result[0]
+    dish = Dish(db_result['dish_id'], db_result['name'], db_result['price'], db_result['is_active'])
+    entity_cache.put('dish', dish_id, (dish.get_dish_id(), dish.get_name(), dish.get_price(),
+                                       dish.get_is_active()), token)
+    return dish
+
+
+async def update_dish_price(dish_id: int, price: float) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            rows_affected, _ = await connection.execute(QUERIES['update_dish_price'], params=(price, dish_id))
+        entity_cache.invalidate('dish', dish_id)
+    except DatabaseException.CHECK_VIOLATION:
+        return ReturnValue.BAD_PARAMS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.NOT_EXISTS if rows_affected == 0 else ReturnValue.OK
+
+
+async def update_dish_active_status(dish_id: int, is_active: bool) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            rows_affected, _ = await connection.execute(QUERIES['update_dish_active_status'],
+                                                        params=(is_active, dish_id))
+        entity_cache.invalidate('dish', dish_id)
+    except DatabaseException.CHECK_VIOLATION:
+        return ReturnValue.BAD_PARAMS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.NOT_EXISTS if rows_affected == 0 else ReturnValue.OK
+
+
+async def customer_placed_order(customer_id: int, order_id: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            await connection.execute(QUERIES['customer_placed_order'], params=(customer_id, order_id))
+    except DatabaseException.FOREIGN_KEY_VIOLATION:
+        return ReturnValue.NOT_EXISTS
+    except DatabaseException.UNIQUE_VIOLATION:
+        return ReturnValue.ALREADY_EXISTS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+async def get_customer_that_placed_order(order_id: int) -> Customer:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_customer_that_placed_order'], params=(order_id,))
+    except DatabaseException.ConnectionInvalid:
+        return BadCustomer()
+    if result.size() == 0:
+        return BadCustomer()
+    db_result = result[0]
+    return Customer(db_result['cust_id'], db_result['full_name'], db_result['phone'], db_result['address'])
+
+
+async def order_contains_dish(order_id: int, dish_id: int, amount: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            await connection.execute_prepared('order_contains_dish', (dish_id, order_id, amount))
+    except (DatabaseException.FOREIGN_KEY_VIOLATION, DatabaseException.NOT_NULL_VIOLATION):
+        return ReturnValue.NOT_EXISTS
+    except DatabaseException.UNIQUE_VIOLATION:
+        return ReturnValue.ALREADY_EXISTS
+    except DatabaseException.CHECK_VIOLATION:
+        return ReturnValue.BAD_PARAMS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+async def order_does_not_contain_dish(order_id: int, dish_id: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            rows_effected, _ = await connection.execute(QUERIES['order_does_not_contain_dish'],
+                                                        params=(order_id, dish_id))
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.NOT_EXISTS if rows_effected == 0 else ReturnValue.OK
+
+
+async def place_order(order: Order, customer_id: int,
+                      lines: Iterable[Tuple[int, int]]) -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]], float]:
+    return await _in_executor(Solution.place_order, order, customer_id, list(lines))
+
+
+async def get_all_order_items(order_id: int) -> List[OrderDish]:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_all_order_items'], params=(order_id,))
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return [OrderDish(order_dish['dish_id'], order_dish['amount'], order_dish['dish_price']) for order_dish in result]
+
+
+async def customer_likes_dish(cust_id: int, dish_id: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            await connection.execute(QUERIES['customer_likes_dish'], params=(cust_id, dish_id))
+    except DatabaseException.UNIQUE_VIOLATION:
+        return ReturnValue.ALREADY_EXISTS
+    except DatabaseException.FOREIGN_KEY_VIOLATION:
+        return ReturnValue.NOT_EXISTS
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+async def customer_dislike_dish(cust_id: int, dish_id: int) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as connection:
+            rows_affected, _ = await connection.execute(QUERIES['customer_dislike_dish'], params=(cust_id, dish_id))
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    return ReturnValue.NOT_EXISTS if rows_affected == 0 else ReturnValue.OK
+
+
+async def get_all_customer_likes(cust_id: int) -> List[Dish]:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_all_customer_likes'], params=(cust_id,))
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return [Dish(dish['dish_id'], dish['name'], dish['price'], dish['is_active']) for dish in result]
+
+
+# ---------------------------------- BASIC API: ----------------------------------
+
+# Basic API
+
+
+async def get_order_total_price(order_id: int) -> float:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_order_total_price'], params=(order_id,))
+    except DatabaseException.ConnectionInvalid:
+        return -1
+    if result.size() == 0:
+        return float(0)
+    return float(result[0]['order_price'])
+
+
+async def get_max_amount_of_money_cust_spent(cust_id: int) -> float:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_max_amount_of_money_cust_spent'], params=(cust_id,))
+    except DatabaseException.ConnectionInvalid:
+        return float(0)
+    price = result[0]['max_price']
+    return float(0 if price is None else price)
+
+
+async def get_most_expensive_anonymous_order() -> Order:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_most_expensive_anonymous_order'])
+    except DatabaseException.ConnectionInvalid:
+        return BadOrder()
+    db_result = result[0]
+    return Order(db_result['order_id'], db_result['date'])
+
+
+async def check_order_totals(repair: bool = False) -> List[tuple]:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['check_order_totals'])
+            if repair and result.size() > 0:
+                await connection.execute(QUERIES['repair_order_totals'])
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return [(row['order_id'], row['stored_price'], row['expected_price'], row['stored_items'], row['expected_items'])
+            for row in result]
+
+
+async def is_most_liked_dish_equal_to_most_purchased() -> bool:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['is_most_liked_dish_equal_to_most_purchased'])
+    except DatabaseException.ConnectionInvalid:
+        return False
+    return result[0]['bool_dish'] if result.size() > 0 else False
+
+
+# ---------------------------------- ADVANCED API: ----------------------------------
+
+# Advanced API
+
+
+async def get_customers_ordered_top_5_dishes() -> List[int]:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_customers_ordered_top_5_dishes'])
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return result['cust_id']
+
+
+async def get_non_worth_price_increase() -> List[int]:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_non_worth_price_increase'])
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return result['dish_id']
+
+
+async def get_total_profit_per_month(year: int) -> List[Tuple[int, float]]:
+    return [(month, profit) for _, month, profit in await get_total_profit_per_month_range(year, year)]
+
+
+# see Solution.get_total_profit_per_month_range
+async def get_total_profit_per_month_range(from_year: int, to_year: int) -> List[Tuple[int, int, float]]:
+    first, last = max(from_year, MINYEAR), min(to_year, MAXYEAR)
+    months = []
+    if first <= last:
+        try:
+            async with AsyncDBConnector() as connection:
+                _, result = await connection.execute(QUERIES['get_total_profit_per_month_range'],
+                                                     params={'from_year': first, 'to_year': last})
+        except DatabaseException.ConnectionInvalid:
+            return []
+        months = [(row['year'], row['month'], float(row['price'])) for row in result]
+        unfilled = [datetime(row['year'], row['month'], 1) for row in result if row['unfilled']]
+        if unfilled:
+            try:
+                async with AsyncDBConnector() as connection:
+                    await connection.execute(QUERIES['fill_monthly_profit'], params=(unfilled,))
+            except DatabaseException.ConnectionInvalid:
+                pass
+    return (zero_months(max(last + 1, from_year), to_year) + months
+            + zero_months(from_year, min(first - 1, to_year)))
+
+
+async def get_potential_dish_recommendations(cust_id: int) -> List[int]:
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_potential_dish_recommendations'],
+                                                 params=(cust_id, cust_id))
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return result['dish_recommendations']
+
+
+# (cust_id, recommendations) for every requested customer, in the order requested. Asynchronous
+# connections have no server-side cursors, so the result is read at once and then yielded
+async def get_potential_dish_recommendations_bulk(cust_ids: Iterable[int]) -> AsyncIterator[Tuple[int, List[int]]]:
+    cust_ids = list(cust_ids)
+    if not cust_ids:
+        return
+    try:
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute(QUERIES['get_potential_dish_recommendations_bulk'],
+                                                 params=(cust_ids,))
+    except DatabaseException.ConnectionInvalid:
+        return
+    for row in result:
+        yield row['cust_id'], row['dish_recommendations']
+
+
+# ---------------------------------- BULK API: ----------------------------------
+
+
+async def add_customers(customers: List[Customer]) -> List[ReturnValue]:
+    return await _in_executor(Solution.add_customers, customers)
+
+
+async def add_orders(orders: List[Order]) -> List[ReturnValue]:
+    return await _in_executor(Solution.add_orders, orders)
+
+
+async def add_dishes(dishes: List[Dish]) -> List[ReturnValue]:
+    return await _in_executor(Solution.add_dishes, dishes)
+
+
+async def import_order_dishes(source, header: bool = False) -> List[Tuple[int, tuple, ReturnValue]]:
+    return await _in_executor(Solution.import_order_dishes, source, header=header)
+
+
+async def import_likes(source, header: bool = False) -> List[Tuple[int, tuple, ReturnValue]]:
+    return await _in_executor(Solution.import_likes, source, header=header)
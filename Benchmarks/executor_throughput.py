@@ -0,0 +1,53 @@
+import datetime
+import sys
+import time
+import Solution
+import Utility.DBConnector as Connector
+from Business.Dish import Dish
+from Business.Order import Order
+from Utility.Executor import SolutionExecutor
+
+'''
+    Benchmark: throughput of Solution API calls run through SolutionExecutor with 1, 2, 4, ...
+    workers (a mix of get_dish, get_order_total_price and order_contains_dish / order_does_not_contain_dish).
+    Creates and drops the schema of Solution.py, the entity cache is left disabled.
+    Run from the repository root: python -m Benchmarks.executor_throughput [max_workers]
+'''
+
+CALLS = 4000
+ORDERS = 200
+DISHES = 50
+
+
+def call(i: int):
+    kind = i % 4
+    if kind == 0:
+        return Solution.get_dish(1 + i % DISHES)
+    if kind == 1:
+        return Solution.get_order_total_price(1 + i % ORDERS)
+    if kind == 2:
+        return Solution.order_contains_dish(1 + i % ORDERS, 1 + (i // ORDERS) % DISHES, 1)
+    return Solution.order_does_not_contain_dish(1 + (i - 1) % ORDERS, 1 + ((i - 1) // ORDERS) % DISHES)
+
+
+if __name__ == '__main__':
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    Connector.DBConnector.configure_pool(maxconn=max_workers)
+    Solution.create_tables()
+    try:
+        Solution.add_dishes([Dish(dish_id, 'dish' + str(dish_id), 10, True) for dish_id in range(1, DISHES + 1)])
+        Solution.add_orders([Order(order_id, datetime.datetime(2024, 1, 1)) for order_id in range(1, ORDERS + 1)])
+        workers = 1
+        baseline = None
+        while workers <= max_workers:
+            with SolutionExecutor(workers) as executor:
+                list(executor.map(call, range(200)))
+                start = time.perf_counter()
+                list(executor.map(call, range(CALLS)))
+                rate = CALLS / (time.perf_counter() - start)
+            baseline = baseline or rate
+            print('%2d workers %8.0f calls/s  (%.2fx)' % (workers, rate, rate / baseline))
+            workers *= 2
+    finally:
+        Solution.drop_tables()
+        Connector.DBConnector.configure_pool()
@@ -0,0 +1,36 @@
+import time
+import Solution
+from Business.Customer import Customer
+from Utility.Instrumentation import Instrumentation, QueryMetrics
+
+'''
+    Benchmark: time per get_customer call (a prepared statement returning one row) with no
+    instrumentation hook, with QueryMetrics(measure_bytes=False) and with QueryMetrics().
+    Creates and drops the schema of Solution.py.
+    Run from the repository root: python -m Benchmarks.instrumentation_overhead
+'''
+
+CALLS = 5000
+
+
+def measure() -> float:
+    start = time.perf_counter()
+    for i in range(CALLS):
+        Solution.get_customer(1 + i % 100)
+    return (time.perf_counter() - start) * 1e6 / CALLS
+
+
+if __name__ == '__main__':
+    Solution.create_tables()
+    try:
+        Solution.add_customers([Customer(cust_id, 'name', '0502220000', 'Haifa') for cust_id in range(1, 101)])
+        measure()
+        for name, hook in (('no hook', None), ('QueryMetrics(measure_bytes=False)', QueryMetrics(measure_bytes=False)),
+                           ('QueryMetrics()', QueryMetrics())):
+            if hook is not None:
+                Instrumentation.add_hook(hook)
+            print('%-35s %6.1f us per call' % (name, measure()))
+            if hook is not None:
+                Instrumentation.remove_hook(hook)
+    finally:
+        Solution.drop_tables()
@@ -0,0 +1,58 @@
+import datetime
+import time
+import Solution
+import Utility.DBConnector as Connector
+from Business.Customer import Customer
+from Business.Dish import Dish
+from Business.Order import Order
+
+'''
+    Benchmark: latency histogram of the lookups get_customer (a prepared statement) and
+    get_all_order_items run through DBConnector with read_only=False (BEGIN, SELECT, COMMIT)
+    and read_only=True (the SELECT alone, in autocommit mode).
+    Creates and drops the schema of Solution.py.
+    Run from the repository root: python -m Benchmarks.read_latency
+'''
+
+CALLS = 5000
+# upper bounds of the histogram buckets, in microseconds
+BUCKETS = [50, 100, 200, 400, 800, 1600, 3200, 6400, float('inf')]
+
+
+def measure(connection: Connector.DBConnector, read_only: bool) -> list:
+    latencies = []
+    for i in range(CALLS):
+        start = time.perf_counter()
+        if i % 2 == 0:
+            connection.execute_prepared('get_customer', (1 + i % 100,), read_only=read_only)
+        else:
+            connection.execute(Solution.QUERIES['get_all_order_items'], params=(1 + i % 100,), read_only=read_only)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return sorted(latencies)
+
+
+def report(name: str, latencies: list) -> None:
+    print('%s: p50 %.0f us, p99 %.0f us, mean %.0f us' % (
+        name, latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100], sum(latencies) / len(latencies)))
+    lower = 0
+    for upper in BUCKETS:
+        count = sum(1 for latency in latencies if lower <= latency < upper)
+        print('  %6s - %-6s us %6d %s' % (lower, upper, count, '#' * (60 * count // len(latencies))))
+        lower = upper
+
+
+if __name__ == '__main__':
+    Solution.create_tables()
+    try:
+        Solution.add_customers([Customer(cust_id, 'name', '0502220000', 'Haifa') for cust_id in range(1, 101)])
+        Solution.add_dishes([Dish(dish_id, 'dish' + str(dish_id), 10, True) for dish_id in range(1, 11)])
+        for order_id in range(1, 101):
+            Solution.place_order(Order(order_id, datetime.datetime(2024, 1, 1)), order_id,
+                                 [(dish_id, 1) for dish_id in range(1, 11)])
+        connection = Connector.DBConnector()
+        measure(connection, False)
+        for read_only in (False, True):
+            report('read_only=%s' % read_only, measure(connection, read_only))
+        connection.close()
+    finally:
+        Solution.drop_tables()
@@ -0,0 +1,83 @@
+import random
+import sys
+import time
+import Solution
+import Utility.DBConnector as Connector
+
+'''
+    Benchmark: latency of get_potential_dish_recommendations answered from the customer_similarity
+    co-like table versus the former likes self-join, on a generated population where a few dishes
+    are liked by thousands of customers. Creates and drops the schema of Solution.py.
+    Run from the repository root: python -m Benchmarks.recommendations [customers]
+'''
+
+DISHES = 500
+LIKES_PER_CUSTOMER = 8
+CALLS = 200
+
+SELF_JOIN = """
+    select distinct l.dish_id dish_recommendations
+    from likes l
+    where l.cust_id in (
+        select l2.cust_id
+        from likes l1
+        join likes l2 on l1.dish_id = l2.dish_id
+        where l1.cust_id = %s
+        and l1.cust_id <> l2.cust_id
+        group by l2.cust_id
+        having count(*) > 2
+    )
+    and not exists (
+        select 1
+        from likes l3
+        where l3.dish_id = l.dish_id
+        and l3.cust_id = %s
+    )
+    order by l.dish_id
+    """
+
+
+# likes drawn from a Zipf-like popularity, so the most popular dishes are liked by most customers
+def populate(conn, customers: int) -> None:
+    rng = random.Random(0)
+    weights = [1 / dish_id ** 0.7 for dish_id in range(1, DISHES + 1)]
+    likes = set()
+    for cust_id in range(1, customers + 1):
+        while len(likes) < cust_id * LIKES_PER_CUSTOMER:
+            likes.add((cust_id, rng.choices(range(1, DISHES + 1), weights)[0]))
+    conn.execute("""insert into customer select n, 'name', '0500000000', 'Haifa' from generate_series(1, %s) n;
+                    insert into dish select n, 'dish', 10, true from generate_series(1, %s) n;""",
+                 params=(customers, DISHES))
+    start = time.perf_counter()
+    conn.copy("copy likes from stdin with (format csv)", sorted(likes))
+    conn.execute("analyze")
+    print('loaded %d likes in %.1f s (customer_similarity maintained by trigger)'
+          % (len(likes), time.perf_counter() - start))
+
+
+# milliseconds per call
+def measure(conn, query: str, cust_ids) -> float:
+    start = time.perf_counter()
+    for cust_id in cust_ids:
+        conn.execute(query, params=(cust_id, cust_id))
+    return (time.perf_counter() - start) / len(cust_ids) * 1e3
+
+
+if __name__ == '__main__':
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Solution.create_tables()
+    conn = Connector.DBConnector()
+    try:
+        populate(conn, customers)
+        cust_ids = random.Random(1).sample(range(1, customers + 1), min(CALLS, customers))
+        self_join_ms = measure(conn, SELF_JOIN, cust_ids)
+        similarity_ms = measure(conn, Solution.QUERIES['get_potential_dish_recommendations'], cust_ids)
+        for cust_id in cust_ids[:20]:
+            assert conn.execute(SELF_JOIN, params=(cust_id, cust_id))[1]['dish_recommendations'] == \
+                   conn.execute(Solution.QUERIES['get_potential_dish_recommendations'],
+                                params=(cust_id, cust_id))[1]['dish_recommendations']
+        print('self join %8.3f ms/call   customer_similarity %8.3f ms/call   (%.1fx)'
+              % (self_join_ms, similarity_ms, self_join_ms / similarity_ms))
+    finally:
+        conn.close()
+        Solution.drop_tables()
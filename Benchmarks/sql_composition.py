@@ -0,0 +1,60 @@
+import time
+from psycopg2 import sql
+import Solution
+import Utility.DBConnector as Connector
+
+'''
+    Micro-benchmark: CPU time per call spent building the SQL of add_customer and
+    get_all_order_items, composing sql.SQL(...).format(sql.Literal(...)) per call
+    versus rendering the cached QUERIES template with %s parameters.
+    Run from the repository root: python -m Benchmarks.sql_composition
+'''
+
+ITERATIONS = 20000
+
+
+def composed_add_customer(cursor, cust_id):
+    return sql.SQL(
+        """insert into customer values({cust_id}, {cust_fullname}, {cust_phone}, {cust_adress});"""
+    ).format(
+        cust_id=sql.Literal(cust_id),
+        cust_fullname=sql.Literal('name'),
+        cust_phone=sql.Literal('0502220000'),
+        cust_adress=sql.Literal('Haifa')
+    ).as_string(cursor)
+
+
+def cached_add_customer(cursor, cust_id):
+    return cursor.mogrify(Solution.QUERIES['add_customer'], (cust_id, 'name', '0502220000', 'Haifa'))
+
+
+def composed_get_all_order_items(cursor, order_id):
+    return sql.SQL("""
+                     select dish_id, dish_price, amount
+                     from dishes_in_order
+                     where order_id= {order}
+                     order by dish_id;
+                      """).format(order=sql.Literal(order_id)).as_string(cursor)
+
+
+def cached_get_all_order_items(cursor, order_id):
+    return cursor.mogrify(Solution.QUERIES['get_all_order_items'], (order_id,))
+
+
+# CPU microseconds per call
+def measure(render, cursor) -> float:
+    start = time.process_time()
+    for i in range(ITERATIONS):
+        render(cursor, i)
+    return (time.process_time() - start) / ITERATIONS * 1e6
+
+
+if __name__ == '__main__':
+    conn = Connector.DBConnector()
+    for name, composed, cached in [('add_customer', composed_add_customer, cached_add_customer),
+                                   ('get_all_order_items', composed_get_all_order_items, cached_get_all_order_items)]:
+        composed_us = measure(composed, conn.cursor)
+        cached_us = measure(cached, conn.cursor)
+        print('%-20s composed %6.2f us/call   cached %6.2f us/call   saved %6.2f us/call (%.0f%%)'
+              % (name, composed_us, cached_us, composed_us - cached_us, 100 * (1 - cached_us / composed_us)))
+    conn.close()
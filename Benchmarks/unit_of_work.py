@@ -0,0 +1,55 @@
+import datetime
+import time
+import Solution
+from Business.Customer import Customer
+from Business.Dish import Dish
+from Business.Order import Order
+
+'''
+    Benchmark: placing an order of 20 dishes with 22 separate Solution API calls (add_order,
+    customer_placed_order and order_contains_dish per dish, each its own transaction) vs one UnitOfWork
+    vs place_order.
+    Creates and drops the schema of Solution.py.
+    Run from the repository root: python -m Benchmarks.unit_of_work
+'''
+
+ORDERS = 200
+ITEMS = 20
+
+
+def separate_calls(order_id: int) -> None:
+    Solution.add_order(Order(order_id, datetime.datetime(2024, 1, 1)))
+    Solution.customer_placed_order(1, order_id)
+    for dish_id in range(1, ITEMS + 1):
+        Solution.order_contains_dish(order_id, dish_id, 1)
+
+
+def unit_of_work(order_id: int) -> None:
+    work = Solution.UnitOfWork()
+    work.add_order(Order(order_id, datetime.datetime(2024, 1, 1)))
+    work.customer_placed_order(1, order_id)
+    for dish_id in range(1, ITEMS + 1):
+        work.order_contains_dish(order_id, dish_id, 1)
+    work.commit()
+
+
+def place_order(order_id: int) -> None:
+    Solution.place_order(Order(order_id, datetime.datetime(2024, 1, 1)), 1,
+                         [(dish_id, 1) for dish_id in range(1, ITEMS + 1)])
+
+
+if __name__ == '__main__':
+    Solution.create_tables()
+    try:
+        for name, place in (('separate calls', separate_calls), ('unit of work', unit_of_work),
+                            ('place_order', place_order)):
+            Solution.clear_tables()
+            Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa'))
+            Solution.add_dishes([Dish(dish_id, 'dish' + str(dish_id), 10, True) for dish_id in range(1, ITEMS + 1)])
+            start = time.perf_counter()
+            for order_id in range(1, ORDERS + 1):
+                place(order_id)
+            elapsed = time.perf_counter() - start
+            print('%-15s %7.2f ms per order' % (name, 1000 * elapsed / ORDERS))
+    finally:
+        Solution.drop_tables()
@@ -1,14 +1,253 @@
-from typing import List, Tuple
-from psycopg2 import sql
-from datetime import date, datetime
+from typing import Iterable, Iterator, List, Tuple
+from psycopg2 import errors, sql
+from datetime import date, datetime, MAXYEAR, MINYEAR
+import csv
 import Utility.DBConnector as Connector
+from Utility.EntityCache import EntityCache
+from Utility.Instrumentation import Instrumentation
 from Utility.ReturnValue import ReturnValue
+from Utility.SlowQueryLog import SlowQueryLog
 from Utility.Exceptions import DatabaseException
 from Business.Customer import Customer, BadCustomer
 from Business.Order import Order, BadOrder
 from Business.Dish import Dish, BadDish
 from Business.OrderDish import OrderDish
 
+# read-through cache of get_customer / get_dish / get_order, configured by the [cache] section of database.ini
+entity_cache = EntityCache.from_config()
+
+# statements slower than the threshold of the [slow_query_log] section of database.ini are logged with their plans
+slow_query_log = SlowQueryLog.from_config()
+if slow_query_log.enabled:
+    Instrumentation.add_hook(slow_query_log)
+
+# hot path statements, prepared once per pooled connection (see DBConnector.execute_prepared)
+Connector.DBConnector.register_statement('get_customer', 'select * from customer where cust_id = $1')
+Connector.DBConnector.register_statement('get_order', 'select * from "order" where order_id = $1')
+Connector.DBConnector.register_statement('get_dish', 'select * from dish where dish_id = $1')
+Connector.DBConnector.register_statement('order_contains_dish', """
+    insert into dishes_in_order values($1, $2, $3, (select price from dish where dish_id = $1 and is_active = true))
+    """)
+
+# query templates of the API functions, keyed by function name (AsyncSolution.py runs them too). Values are
+# passed as parameters (%s placeholders) and rendered by psycopg2, so no sql.Composed is built per call
+QUERIES = {
+    'add_customer': """
+        insert into customer values(%s, %s, %s, %s);
+        """,
+    'delete_customer': """
+        delete from customer where cust_id= %s;
+        """,
+    'add_order': """
+        insert into "order" values(%s, %s);
+        """,
+    'delete_order': """
+        DELETE FROM "order" where order_id = %s;
+        """,
+    'add_dish': """
+        insert into dish values(%s, %s, %s, %s);
+        """,
+    'update_dish_price': """
+        update dish
+        set price= %s
+        where dish_id = %s and is_active = true;
+        """,
+    'update_dish_active_status': """
+        update dish set is_active= %s where dish_id = %s;
+        """,
+    'customer_placed_order': """
+        insert into customer_orders values(%s, %s);
+        """,
+    'get_customer_that_placed_order': """
+        select c.* from customer_orders co
+        join customer c on c.cust_id = co.cust_id
+        where order_id= %s;
+        """,
+    'order_does_not_contain_dish': """
+        delete from dishes_in_order where order_id = %s and dish_id= %s;
+        """,
+    'place_order_lines': """
+        with line as (
+            select l.line, l.dish_id, l.amount, d.price
+            from unnest(%(dish_ids)s::integer[], %(amounts)s::integer[]) with ordinality l(dish_id, amount, line)
+            left join dish d on d.dish_id = l.dish_id and d.is_active = true
+        ), placed as (
+            select distinct on (dish_id) line, dish_id, amount, price
+            from line
+            where price is not null and amount > 0
+            order by dish_id, line
+        ), inserted as (
+            insert into dishes_in_order
+            select dish_id, %(order_id)s, amount, price from placed
+        )
+        select line.dish_id,
+               case when line.price is null or line.amount is null then 'NOT_EXISTS'
+                    when line.amount <= 0 then 'BAD_PARAMS'
+                    when placed.line is null then 'ALREADY_EXISTS'
+                    else 'OK' end status,
+               placed.amount * placed.price line_price
+        from line
+        left join placed on placed.line = line.line
+        order by line.line;
+        """,
+    'get_all_order_items': """
+        select dish_id, dish_price, amount
+        from dishes_in_order
+        where order_id= %s
+        order by dish_id;
+        """,
+    'customer_likes_dish': """
+        insert into likes values(%s, %s);
+        """,
+    'customer_dislike_dish': """
+        delete from likes
+        where cust_id = %s and dish_id= %s;
+        """,
+    'get_all_customer_likes': """
+        select d.dish_id, d.name, d.price, d.is_active
+        from dish d
+        join likes l on l.dish_id = d.dish_id
+        where l.cust_id= %s;
+        """,
+    'get_order_total_price': """
+        select order_price
+        from order_totals
+        where order_id= %s;
+        """,
+    'get_max_amount_of_money_cust_spent': """
+        select max(ot.order_price) max_price
+        from order_totals ot
+        join customer_orders co on co.order_id = ot.order_id
+        where co.cust_id= %s;
+        """,
+    'get_most_expensive_anonymous_order': """
+        select ot.order_price max_price, o.order_id, o.date
+        from order_totals ot
+        join "order" o on o.order_id = ot.order_id
+        where not exists (select 1 from customer_orders co where co.order_id = ot.order_id)
+        order by ot.order_price desc, ot.order_id limit 1;
+        """,
+    'check_order_totals': """
+        select o.order_id, ot.order_price stored_price, coalesce(otp.order_price, 0) expected_price,
+               ot.item_count stored_items, (select count(*) from dishes_in_order dio
+                                            where dio.order_id = o.order_id) expected_items
+        from "order" o
+        left join order_totals ot on ot.order_id = o.order_id
+        left join orders_total_price otp on otp.order_id = o.order_id
+        where ot.order_id is null
+        or ot.order_price <> coalesce(otp.order_price, 0)
+        or ot.item_count <> (select count(*) from dishes_in_order dio where dio.order_id = o.order_id)
+        order by o.order_id;
+        """,
+    'repair_order_totals': """
+        insert into order_totals
+        select o.order_id, coalesce(sum(dio.amount * dio.dish_price), 0), count(dio.order_id)
+        from "order" o
+        left join dishes_in_order dio on dio.order_id = o.order_id
+        group by o.order_id
+        on conflict (order_id) do update
+        set order_price = excluded.order_price, item_count = excluded.item_count
+        where (order_totals.order_price, order_totals.item_count)
+              is distinct from (excluded.order_price, excluded.item_count);
+        """,
+    'is_most_liked_dish_equal_to_most_purchased': """
+        select dish_like.dish_id = dish_purch.dish_id bool_dish
+        from (select dish_id
+              from dish_stats
+              where like_count > 0
+              order by like_count desc, dish_id limit 1) dish_like,
+             (select dish_id
+              from dish_stats
+              where purchased_amount > 0
+              order by purchased_amount desc, dish_id limit 1) dish_purch;
+        """,
+    'get_customers_ordered_top_5_dishes': """
+        select distinct cust_id
+        from customer_orders co
+        join (
+            select count(*), order_id
+            from dishes_in_order dio
+            where dish_id in
+            (
+                select dish_id
+                from dish_stats
+                order by like_count desc, dish_id limit 5
+            )
+            group by order_id
+            having count(*) = 5
+        ) orders
+        on orders.order_id = co.order_id
+        order by cust_id
+        """,
+    'get_non_worth_price_increase': """
+        with avg_dish_price as (
+        select avg(dish_profit) avg_profit, dish_price, dish_id
+        from dish_profit_in_order
+        group by dish_price, dish_id
+        )
+        select distinct d.dish_id
+        from dish d
+        join avg_dish_price curr_avg
+        on curr_avg.dish_id = d.dish_id and curr_avg.dish_price = d.price
+        join avg_dish_price former_avg
+        on former_avg.dish_id = d.dish_id and former_avg.dish_price <> d.price
+        where d.is_active = true
+        and curr_avg.avg_profit < former_avg.avg_profit
+        order by d.dish_id
+        """,
+    'get_total_profit_per_month_range': """
+        select extract(year from months.month)::integer "year", extract(month from months.month)::integer "month",
+               coalesce(mp.profit, live.profit, 0) price,
+               mp.month is null and live.profit is not null
+               and months.month < date_trunc('month', localtimestamp) unfilled
+        from (select make_date(%(from_year)s, 1, 1) + n * interval '1 month' "month"
+              from generate_series(0, (%(to_year)s - %(from_year)s + 1) * 12 - 1) n) months
+        left join monthly_profit mp
+        on mp.month = months.month and mp.month >= make_date(%(from_year)s, 1, 1)
+        and mp.month < least(make_date(%(to_year)s + 1, 1, 1), date_trunc('month', localtimestamp))
+        left join lateral (
+            select sum(items.profit) profit
+            from "order" o
+            cross join lateral (
+                select sum(dpio.dish_profit) profit from dish_profit_in_order dpio where dpio.order_id = o.order_id
+            ) items
+            where mp.month is null and o.date >= months.month and o.date < months.month + interval '1 month'
+        ) live on true
+        order by months.month desc
+        """,
+    'fill_monthly_profit': """
+        select monthly_profit_fill(%s::timestamp[])
+        """,
+    'get_potential_dish_recommendations': """
+        select distinct l.dish_id dish_recommendations
+        from customer_similarity cs
+        join likes l on l.cust_id = cs.other_id
+        where cs.cust_id = %s
+        and cs.common_likes > 2
+        and not exists (
+            select 1
+            from likes l3
+            where l3.dish_id = l.dish_id
+            and l3.cust_id = %s
+        )
+        order by l.dish_id
+        """,
+    'get_potential_dish_recommendations_bulk': """
+        select c.cust_id, coalesce(array_agg(distinct l.dish_id order by l.dish_id)
+                                   filter (where l.dish_id is not null), '{}') dish_recommendations
+        from unnest(%s::integer[]) with ordinality c(cust_id, position)
+        left join customer_similarity cs on cs.cust_id = c.cust_id and cs.common_likes > 2
+        left join likes l on l.cust_id = cs.other_id
+        and not exists (
+            select 1
+            from likes l3
+            where l3.dish_id = l.dish_id
+            and l3.cust_id = c.cust_id
+        )
+        group by c.position, c.cust_id
+        order by c.position
+        """,
+}
 
 # ---------------------------------- CRUD API: ----------------------------------
 # Basic database functions
@@ -58,6 +297,10 @@ def create_tables() -> None:
                         foreign key (dish_id) references dish(dish_id) on delete cascade,
                         primary key (dish_id, cust_id)
                         );
+                        create index customer_orders_cust_id on customer_orders (cust_id);
+                        create index dishes_in_order_order_id on dishes_in_order (order_id, dish_id);
+                        create index likes_cust_id on likes (cust_id, dish_id);
+                        create index order_date on "order" (date);
                         create view dish_profit_in_order as
                         select amount * dish_price dish_profit, dish_id, order_id, dish_price
                         from dishes_in_order;
@@ -65,22 +308,325 @@ def create_tables() -> None:
                         select sum(dish_profit) order_price, order_id 
                         from dish_profit_in_order
                         group by order_id;
+                        create table order_totals (
+                        order_id integer,
+                        order_price decimal not null default 0,
+                        item_count integer not null default 0,
+                        foreign key (order_id) references "order"(order_id) on delete cascade,
+                        primary key (order_id)
+                        );
+                        create index order_totals_price on order_totals (order_price desc, order_id);
+                        create function order_totals_add_orders() returns trigger language plpgsql as $$
+                        begin
+                            insert into order_totals (order_id) select order_id from new_orders;
+                            return null;
+                        end $$;
+                        create function order_totals_apply_items() returns trigger language plpgsql as $$
+                        begin
+                            if TG_OP in ('DELETE', 'UPDATE') then
+                                update order_totals ot
+                                set order_price = ot.order_price - d.price, item_count = ot.item_count - d.items
+                                from (select order_id, sum(amount * dish_price) price, count(*) items
+                                      from old_items group by order_id) d
+                                where ot.order_id = d.order_id;
+                            end if;
+                            if TG_OP in ('INSERT', 'UPDATE') then
+                                update order_totals ot
+                                set order_price = ot.order_price + d.price, item_count = ot.item_count + d.items
+                                from (select order_id, sum(amount * dish_price) price, count(*) items
+                                      from new_items group by order_id) d
+                                where ot.order_id = d.order_id;
+                            end if;
+                            return null;
+                        end $$;
+                        create table monthly_profit (
+                        "month" timestamp(0),
+                        profit decimal not null,
+                        primary key ("month")
+                        );
+                        create function monthly_profit_key("month" timestamp) returns integer
+                        language sql immutable as $$
+                            select (extract(year from "month") * 12 + extract(month from "month"))::integer
+                        $$;
+                        create function monthly_profit_add(months timestamp[], profits decimal[]) returns void
+                        language plpgsql as $$
+                        begin
+                            -- only the rollup rows of closed months exist (see monthly_profit_fill), writes to
+                            -- an open month change no row and do not wait for each other. The shared lock,
+                            -- held until commit, keeps a fill from missing a write in progress
+                            perform pg_advisory_xact_lock_shared('monthly_profit'::regclass::oid::integer,
+                                                                 monthly_profit_key(m))
+                            from unnest(months) m;
+                            perform 1 from monthly_profit where "month" = any(months) order by "month" for update;
+                            update monthly_profit mp set profit = mp.profit + d.profit
+                            from (select "month", sum(profit) profit
+                                  from unnest(months, profits) d("month", profit)
+                                  group by "month") d
+                            where mp.month = d.month;
+                        end $$;
+                        create function monthly_profit_fill(months timestamp[]) returns void language plpgsql as $$
+                        declare
+                            locked timestamp[];
+                        begin
+                            -- closed months without a rollup row that no write is in progress on
+                            select array_agg(m) into locked
+                            from unnest(months) m
+                            where m < date_trunc('month', localtimestamp)
+                            and not exists (select 1 from monthly_profit mp where mp.month = m)
+                            and pg_try_advisory_xact_lock('monthly_profit'::regclass::oid::integer,
+                                                          monthly_profit_key(m));
+                            insert into monthly_profit
+                            select l.month, coalesce(sum(dpio.dish_profit), 0)
+                            from unnest(locked) l("month")
+                            left join "order" o on o.date >= l.month and o.date < l.month + interval '1 month'
+                            left join dish_profit_in_order dpio on dpio.order_id = o.order_id
+                            group by l.month
+                            on conflict ("month") do nothing;
+                        end $$;
+                        create function monthly_profit_apply_items() returns trigger language plpgsql as $$
+                        declare
+                            months timestamp[];
+                            profits decimal[];
+                        begin
+                            if TG_OP in ('DELETE', 'UPDATE') then
+                                select array_agg("month"), array_agg(profit) into months, profits
+                                from (select date_trunc('month', o.date) "month", -sum(i.amount * i.dish_price) profit
+                                      from old_items i join "order" o on o.order_id = i.order_id
+                                      group by date_trunc('month', o.date)) d;
+                                perform monthly_profit_add(months, profits);
+                            end if;
+                            if TG_OP in ('INSERT', 'UPDATE') then
+                                select array_agg("month"), array_agg(profit) into months, profits
+                                from (select date_trunc('month', o.date) "month", sum(i.amount * i.dish_price) profit
+                                      from new_items i join "order" o on o.order_id = i.order_id
+                                      group by date_trunc('month', o.date)) d;
+                                perform monthly_profit_add(months, profits);
+                            end if;
+                            return null;
+                        end $$;
+                        create function monthly_profit_delete_order() returns trigger language plpgsql as $$
+                        begin
+                            perform monthly_profit_add(array[date_trunc('month', old.date)], array[-ot.order_price])
+                            from order_totals ot
+                            where ot.order_id = old.order_id;
+                            return old;
+                        end $$;
+                        create function monthly_profit_move_order() returns trigger language plpgsql as $$
+                        begin
+                            perform monthly_profit_add(
+                                array[date_trunc('month', old.date), date_trunc('month', new.date)],
+                                array[-ot.order_price, ot.order_price])
+                            from order_totals ot
+                            where ot.order_id = new.order_id;
+                            return null;
+                        end $$;
+                        create table dish_stats (
+                        dish_id integer,
+                        like_count integer not null default 0,
+                        purchased_amount bigint not null default 0,
+                        foreign key (dish_id) references dish(dish_id) on delete cascade,
+                        primary key (dish_id)
+                        );
+                        create index dish_stats_like_count on dish_stats (like_count desc, dish_id);
+                        create index dish_stats_purchased_amount on dish_stats (purchased_amount desc, dish_id);
+                        create function dish_stats_add_dishes() returns trigger language plpgsql as $$
+                        begin
+                            insert into dish_stats (dish_id) select dish_id from new_dishes;
+                            return null;
+                        end $$;
+                        -- the counter changes of the transactions in progress, merged into dish_stats when
+                        -- they commit (rows live only until then, so the table is not WAL-logged)
+                        create unlogged table dish_stats_pending (
+                        txid bigint,
+                        dish_id integer,
+                        like_count integer not null default 0,
+                        purchased_amount bigint not null default 0,
+                        primary key (txid, dish_id)
+                        );
+                        create function dish_stats_apply_likes() returns trigger language plpgsql as $$
+                        begin
+                            if TG_OP = 'DELETE' then
+                                insert into dish_stats_pending (txid, dish_id, like_count)
+                                select txid_current(), dish_id, -count(*) from old_likes group by dish_id
+                                on conflict (txid, dish_id)
+                                do update set like_count = dish_stats_pending.like_count + excluded.like_count;
+                            else
+                                insert into dish_stats_pending (txid, dish_id, like_count)
+                                select txid_current(), dish_id, count(*) from new_likes group by dish_id
+                                on conflict (txid, dish_id)
+                                do update set like_count = dish_stats_pending.like_count + excluded.like_count;
+                            end if;
+                            return null;
+                        end $$;
+                        create function dish_stats_apply_items() returns trigger language plpgsql as $$
+                        begin
+                            if TG_OP in ('DELETE', 'UPDATE') then
+                                insert into dish_stats_pending (txid, dish_id, purchased_amount)
+                                select txid_current(), dish_id, -sum(amount) from old_items group by dish_id
+                                on conflict (txid, dish_id) do update
+                                set purchased_amount = dish_stats_pending.purchased_amount + excluded.purchased_amount;
+                            end if;
+                            if TG_OP in ('INSERT', 'UPDATE') then
+                                insert into dish_stats_pending (txid, dish_id, purchased_amount)
+                                select txid_current(), dish_id, sum(amount) from new_items group by dish_id
+                                on conflict (txid, dish_id) do update
+                                set purchased_amount = dish_stats_pending.purchased_amount + excluded.purchased_amount;
+                            end if;
+                            return null;
+                        end $$;
+                        create function dish_stats_merge_pending() returns trigger language plpgsql as $$
+                        begin
+                            -- the first merge of the transaction takes all of its changes
+                            if not exists (select 1 from dish_stats_pending where txid = new.txid) then
+                                return null;
+                            end if;
+                            -- every transaction locks the counters it changes at commit and in dish_id order,
+                            -- so writers that changed the same dishes in another order cannot deadlock
+                            perform 1 from dish_stats
+                            where dish_id in (select dish_id from dish_stats_pending where txid = new.txid)
+                            order by dish_id
+                            for update;
+                            with pending as (
+                                delete from dish_stats_pending where txid = new.txid
+                                returning dish_id, like_count, purchased_amount
+                            )
+                            update dish_stats ds
+                            set like_count = ds.like_count + p.like_count,
+                                purchased_amount = ds.purchased_amount + p.purchased_amount
+                            from pending p
+                            where ds.dish_id = p.dish_id;
+                            return null;
+                        end $$;
+                        create constraint trigger dish_stats_merge_pending after insert on dish_stats_pending
+                        deferrable initially deferred
+                        for each row execute function dish_stats_merge_pending();
+                        create trigger dish_stats_insert_dish after insert on dish
+                        referencing new table as new_dishes
+                        for each statement execute function dish_stats_add_dishes();
+                        create trigger dish_stats_insert_likes after insert on likes
+                        referencing new table as new_likes
+                        for each statement execute function dish_stats_apply_likes();
+                        create trigger dish_stats_delete_likes after delete on likes
+                        referencing old table as old_likes
+                        for each statement execute function dish_stats_apply_likes();
+                        create trigger dish_stats_insert_items after insert on dishes_in_order
+                        referencing new table as new_items
+                        for each statement execute function dish_stats_apply_items();
+                        create trigger dish_stats_update_items after update on dishes_in_order
+                        referencing old table as old_items new table as new_items
+                        for each statement execute function dish_stats_apply_items();
+                        create trigger dish_stats_delete_items after delete on dishes_in_order
+                        referencing old table as old_items
+                        for each statement execute function dish_stats_apply_items();
+                        create table customer_similarity (
+                        cust_id integer,
+                        other_id integer,
+                        common_likes integer not null,
+                        primary key (cust_id, other_id)
+                        );
+                        create index customer_similarity_similar on customer_similarity (cust_id, other_id)
+                        where common_likes > 2;
+                        create function customer_similarity_add_likes() returns trigger language plpgsql as $$
+                        begin
+                            -- writers of the same dish wait for each other (in dish_id order, until commit), so
+                            -- the likes counted below include those of the writers that went first
+                            perform pg_advisory_xact_lock('customer_similarity'::regclass::oid::integer, dish_id)
+                            from (select distinct dish_id from new_likes order by dish_id) dishes;
+                            insert into customer_similarity
+                            select a, b, count(*)
+                            from (select n.cust_id a, l.cust_id b
+                                  from new_likes n join likes l on l.dish_id = n.dish_id and l.cust_id <> n.cust_id
+                                  union all
+                                  select l.cust_id, n.cust_id
+                                  from new_likes n join likes l on l.dish_id = n.dish_id and l.cust_id <> n.cust_id
+                                  where not exists (select 1 from new_likes n2
+                                                    where n2.cust_id = l.cust_id and n2.dish_id = l.dish_id)) pairs
+                            group by a, b
+                            order by a, b
+                            on conflict (cust_id, other_id)
+                            do update set common_likes = customer_similarity.common_likes + excluded.common_likes;
+                            return null;
+                        end $$;
+                        create function customer_similarity_delete_likes() returns trigger language plpgsql as $$
+                        declare
+                            emptied_cust_ids integer[];
+                            emptied_other_ids integer[];
+                        begin
+                            perform pg_advisory_xact_lock('customer_similarity'::regclass::oid::integer, dish_id)
+                            from (select distinct dish_id from old_likes order by dish_id) dishes;
+                            with pairs as (
+                                select a, b, count(*) lost
+                                from (select o.cust_id a, l.cust_id b
+                                      from old_likes o join likes l on l.dish_id = o.dish_id
+                                      union all
+                                      select l.cust_id, o.cust_id
+                                      from old_likes o join likes l on l.dish_id = o.dish_id
+                                      union all
+                                      select o.cust_id, o2.cust_id
+                                      from old_likes o join old_likes o2 on o2.dish_id = o.dish_id
+                                      and o2.cust_id <> o.cust_id) lost_pairs
+                                group by a, b
+                            ), updated as (
+                                update customer_similarity cs set common_likes = cs.common_likes - pairs.lost
+                                from pairs
+                                where cs.cust_id = pairs.a and cs.other_id = pairs.b
+                                returning cs.cust_id, cs.other_id, cs.common_likes
+                            )
+                            select array_agg(cust_id), array_agg(other_id) into emptied_cust_ids, emptied_other_ids
+                            from updated where common_likes = 0;
+                            delete from customer_similarity cs
+                            using unnest(emptied_cust_ids, emptied_other_ids) emptied(cust_id, other_id)
+                            where cs.cust_id = emptied.cust_id and cs.other_id = emptied.other_id
+                            and cs.common_likes = 0;
+                            return null;
+                        end $$;
+                        create trigger customer_similarity_insert_likes after insert on likes
+                        referencing new table as new_likes
+                        for each statement execute function customer_similarity_add_likes();
+                        create trigger customer_similarity_delete_likes after delete on likes
+                        referencing old table as old_likes
+                        for each statement execute function customer_similarity_delete_likes();
+                        create trigger order_totals_insert_order after insert on "order"
+                        referencing new table as new_orders
+                        for each statement execute function order_totals_add_orders();
+                        create trigger order_totals_insert_items after insert on dishes_in_order
+                        referencing new table as new_items
+                        for each statement execute function order_totals_apply_items();
+                        create trigger order_totals_update_items after update on dishes_in_order
+                        referencing old table as old_items new table as new_items
+                        for each statement execute function order_totals_apply_items();
+                        create trigger order_totals_delete_items after delete on dishes_in_order
+                        referencing old table as old_items
+                        for each statement execute function order_totals_apply_items();
+                        create trigger monthly_profit_insert_items after insert on dishes_in_order
+                        referencing new table as new_items
+                        for each statement execute function monthly_profit_apply_items();
+                        create trigger monthly_profit_update_items after update on dishes_in_order
+                        referencing old table as old_items new table as new_items
+                        for each statement execute function monthly_profit_apply_items();
+                        create trigger monthly_profit_delete_items after delete on dishes_in_order
+                        referencing old table as old_items
+                        for each statement execute function monthly_profit_apply_items();
+                        create trigger monthly_profit_delete_order before delete on "order"
+                        for each row execute function monthly_profit_delete_order();
+                        create trigger monthly_profit_move_order after update of date on "order"
+                        for each row when (date_trunc('month', old.date) <> date_trunc('month', new.date))
+                        execute function monthly_profit_move_order();
                          """)
 
     connection.execute(query)
     connection.close()
+    entity_cache.clear()
 
 
 def clear_tables() -> None:
     connection = Connector.DBConnector()
-    query = sql.SQL("""delete from likes; 
-             delete from dishes_in_order; 
-             delete from customer_orders; 
-             delete from customer; 
-             delete from "order"; 
-             delete from dish;""")
+    # truncate skips the row-by-row maintenance of the derived tables, which are emptied along with their sources
+    query = sql.SQL("""truncate likes, dishes_in_order, customer_orders, customer, "order", dish,
+             order_totals, monthly_profit, dish_stats, dish_stats_pending, customer_similarity;""")
     connection.execute(query)
     connection.close()
+    entity_cache.clear()
 
 
 def drop_tables() -> None:
@@ -88,340 +634,330 @@ def drop_tables() -> None:
     query = sql.SQL("""
                         drop view orders_total_price;
                         drop view dish_profit_in_order;
+                        drop table monthly_profit;
+                        drop table order_totals;
+                        drop table dish_stats;
+                        drop table dish_stats_pending;
+                        drop table customer_similarity;
                         drop table likes;
                         drop table dishes_in_order;
                         drop table customer_orders;
                         drop table customer;
                         drop table "order";
                         drop table dish;
+                        drop function order_totals_add_orders;
+                        drop function order_totals_apply_items;
+                        drop function monthly_profit_apply_items;
+                        drop function monthly_profit_delete_order;
+                        drop function monthly_profit_move_order;
+                        drop function monthly_profit_fill;
+                        drop function monthly_profit_add;
+                        drop function monthly_profit_key;
+                        drop function dish_stats_add_dishes;
+                        drop function dish_stats_apply_likes;
+                        drop function dish_stats_apply_items;
+                        drop function dish_stats_merge_pending;
+                        drop function customer_similarity_add_likes;
+                        drop function customer_similarity_delete_likes;
                         """)
     connection.execute(query)
     connection.close()
+    entity_cache.clear()
 
 
 # CRUD API
+# each write is a helper that runs on a given connection (so it can be part of a UnitOfWork) and
+# a public function that runs the helper on a connection of its own
 
-def add_customer(customer: Customer) -> ReturnValue:
+
+# runs a write helper on its own connection, ReturnValue.ERROR if the database cannot be reached
+def _write(helper, *args) -> ReturnValue:
     connection = None
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL(
-            """insert into customer values({cust_id}, {cust_fullname}, {cust_phone}, {cust_adress});"""
-        ).format(
-            cust_id=sql.Literal(customer.get_cust_id()),
-            cust_fullname=sql.Literal(customer.get_full_name()),
-            cust_phone=sql.Literal(customer.get_phone()),
-            cust_adress=sql.Literal(customer.get_address())
-        )
-        connection.execute(query)
-        connection.close()
-    except DatabaseException.NOT_NULL_VIOLATION:
-        return ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION:
-        connection.close()
+        return helper(connection, *args)
+    except DatabaseException.ConnectionInvalid:
+        return ReturnValue.ERROR
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+# a transaction postgres aborted to break a deadlock (40P01) or a serialization conflict (40001) is run
+# again, up to _TRANSACTION_ATTEMPTS times in all
+_TRANSACTION_ATTEMPTS = 3
+
+
+# runs work(connection) in one transaction and returns its result. Raises what work raised, or the
+# last deadlock / serialization failure if every attempt was aborted
+def _run_transaction(work):
+    for attempt in range(1, _TRANSACTION_ATTEMPTS + 1):
+        connection = Connector.DBConnector()
+        try:
+            with connection.transaction():
+                return work(connection)
+        except (errors.DeadlockDetected, errors.SerializationFailure):
+            if attempt == _TRANSACTION_ATTEMPTS:
+                raise
+        finally:
+            connection.close()
+
+
+def _add_customer(connection: Connector.DBConnector, customer: Customer) -> ReturnValue:
+    try:
+        connection.execute(QUERIES['add_customer'], params=(customer.get_cust_id(), customer.get_full_name(),
+                                                             customer.get_phone(), customer.get_address()))
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
         return ReturnValue.BAD_PARAMS
     except DatabaseException.UNIQUE_VIOLATION:
-        connection.close()
         return ReturnValue.ALREADY_EXISTS
-    except DatabaseException.ConnectionInvalid:
-        connection.close()
-        return ReturnValue.ERROR
     return ReturnValue.OK
 
 
+def add_customer(customer: Customer) -> ReturnValue:
+    result = _write(_add_customer, customer)
+    entity_cache.invalidate('customer', customer.get_cust_id())
+    return result
+
+
 def get_customer(customer_id: int) -> Customer:
+    cached = entity_cache.get('customer', customer_id)
+    if cached is not None:
+        return Customer(*cached)
+    token = entity_cache.token()
     connection = None
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL(
-            """select * from customer where cust_id = {cust};"""
-        ).format(cust=sql.Literal(customer_id))
-
-        _, result = connection.execute(query)
+        _, result = connection.execute_prepared('get_customer', (customer_id,), read_only=True)
         if result.size() == 0:
             customer = BadCustomer()
         else:
             db_result = result[0]
             customer = Customer(db_result['cust_id'], db_result['full_name'], db_result['phone'], db_result['address'])
+            entity_cache.put('customer', customer_id, (customer.get_cust_id(), customer.get_full_name(),
+                                                       customer.get_phone(), customer.get_address()), token)
     except DatabaseException.ConnectionInvalid:
         customer = BadCustomer()
     connection.close()
     return customer
 
 
-def delete_customer(customer_id: int) -> ReturnValue:
-    connection = None
-    try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        delete from customer where cust_id= {cust};
-                        """).format(cust=sql.Literal(customer_id))
-
-        rows_effected, _ = connection.execute(query)
-        connection.close()
+def _delete_customer(connection: Connector.DBConnector, customer_id: int) -> ReturnValue:
+    rows_effected, _ = connection.execute(QUERIES['delete_customer'], params=(customer_id,))
+    return ReturnValue.NOT_EXISTS if rows_effected == 0 else ReturnValue.OK
 
-        if rows_effected == 0:
-            return ReturnValue.NOT_EXISTS
 
-    except DatabaseException.ConnectionInvalid:
-        connection.close()
-        return ReturnValue.ERROR
-    return ReturnValue.OK
+def delete_customer(customer_id: int) -> ReturnValue:
+    result = _write(_delete_customer, customer_id)
+    entity_cache.invalidate('customer', customer_id)
+    return result
 
 
-def add_order(order: Order) -> ReturnValue:
-    connection = None
+def _add_order(connection: Connector.DBConnector, order: Order) -> ReturnValue:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL(
-            """insert into "order" values({orderID}, {date});"""
-        ).format(
-            orderID=sql.Literal(order.get_order_id()),
-            date=sql.Literal(order.get_datetime())
-        )
-        connection.execute(query)
-
-    except DatabaseException.NOT_NULL_VIOLATION:
-        connection.close()
-        return ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION:
-        connection.close()
+        connection.execute(QUERIES['add_order'], params=(order.get_order_id(), order.get_datetime()))
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
         return ReturnValue.BAD_PARAMS
     except DatabaseException.UNIQUE_VIOLATION:
-        connection.close()
         return ReturnValue.ALREADY_EXISTS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    connection.close()
     return ReturnValue.OK
 
 
+def add_order(order: Order) -> ReturnValue:
+    result = _write(_add_order, order)
+    entity_cache.invalidate('order', order.get_order_id())
+    return result
+
+
 def get_order(order_id: int) -> Order:
+    cached = entity_cache.get('order', order_id)
+    if cached is not None:
+        return Order(*cached)
+    token = entity_cache.token()
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        select * from "order" where order_id = {orderID};
-                        """).format(orderID=sql.Literal(order_id))
-        _, result = connection.execute(query)
+        _, result = connection.execute_prepared('get_order', (order_id,), read_only=True)
         if result.size() == 0:
             order = BadOrder()
         else:
             db_result = result[0]
             order = Order(db_result['order_id'], db_result['date'])
+            entity_cache.put('order', order_id, (order.get_order_id(), order.get_datetime()), token)
     except DatabaseException.ConnectionInvalid:
         return BadOrder()
     connection.close()
     return order
 
 
-def delete_order(order_id: int) -> ReturnValue:
-    try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        DELETE FROM "order" where order_id = {order};
-                        """).format(order=sql.Literal(order_id))
+def _delete_order(connection: Connector.DBConnector, order_id: int) -> ReturnValue:
+    rows_effected, _ = connection.execute(QUERIES['delete_order'], params=(order_id,))
+    return ReturnValue.NOT_EXISTS if rows_effected == 0 else ReturnValue.OK
 
-        rows_effected, _ = connection.execute(query)
-        connection.close()
-        if rows_effected == 0:
-            return ReturnValue.NOT_EXISTS
 
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    return ReturnValue.OK
+def delete_order(order_id: int) -> ReturnValue:
+    result = _write(_delete_order, order_id)
+    entity_cache.invalidate('order', order_id)
+    return result
 
 
-def add_dish(dish: Dish) -> ReturnValue:
-    connection = None
+def _add_dish(connection: Connector.DBConnector, dish: Dish) -> ReturnValue:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        insert into dish values({dishid}, {name}, {price}, {active});
-                        """).format(dishid=sql.Literal(dish.get_dish_id()),
-                                    name=sql.Literal(dish.get_name()),
-                                    price=sql.Literal(dish.get_price()),
-                                    active=sql.Literal(dish.get_is_active()))
-
-        connection.execute(query)
-    except DatabaseException.CHECK_VIOLATION:
-        connection.close()
-        return ReturnValue.BAD_PARAMS
-    except DatabaseException.NOT_NULL_VIOLATION:
-        connection.close()
+        connection.execute(QUERIES['add_dish'], params=(dish.get_dish_id(), dish.get_name(), dish.get_price(),
+                                                         dish.get_is_active()))
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
         return ReturnValue.BAD_PARAMS
     except DatabaseException.UNIQUE_VIOLATION:
-        connection.close()
         return ReturnValue.ALREADY_EXISTS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    connection.close()
     return ReturnValue.OK
 
 
+def add_dish(dish: Dish) -> ReturnValue:
+    result = _write(_add_dish, dish)
+    entity_cache.invalidate('dish', dish.get_dish_id())
+    return result
+
+
 def get_dish(dish_id: int) -> Dish:
+    cached = entity_cache.get('dish', dish_id)
+    if cached is not None:
+        return Dish(*cached)
+    token = entity_cache.token()
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-                          select * from dish where dish_id = {dish_id};
-                          """).format(dish_id=sql.Literal(dish_id))
-        _, result = connection.execute(query)
+        _, result = connection.execute_prepared('get_dish', (dish_id,), read_only=True)
         if result.size() == 0:
             dish = BadDish()
         else:
             db_result = result[0]
             dish = Dish(db_result['dish_id'], db_result['name'], db_result['price'], db_result['is_active'])
+            entity_cache.put('dish', dish_id, (dish.get_dish_id(), dish.get_name(), dish.get_price(),
+                                               dish.get_is_active()), token)
     except DatabaseException.ConnectionInvalid:
         return BadDish()
     connection.close()
     return dish
 
 
-def update_dish_price(dish_id: int, price: float) -> ReturnValue:
-    connection = None
+def _update_dish_price(connection: Connector.DBConnector, dish_id: int, price: float) -> ReturnValue:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        update dish 
-                        set price= {price}
-                        where dish_id = {dish} and is_active = true;
-                        """).format(price=sql.Literal(price),
-                                    dish=sql.Literal(dish_id))
-        rows_affected, _ = connection.execute(query)
-        if rows_affected == 0:
-            connection.close()
-            return ReturnValue.NOT_EXISTS
+        rows_affected, _ = connection.execute(QUERIES['update_dish_price'], params=(price, dish_id))
     except DatabaseException.CHECK_VIOLATION:
-        connection.close()
         return ReturnValue.BAD_PARAMS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    connection.close()
-    return ReturnValue.OK
+    return ReturnValue.NOT_EXISTS if rows_affected == 0 else ReturnValue.OK
 
 
-def update_dish_active_status(dish_id: int, is_active: bool) -> ReturnValue:
-    connection = None
-    try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-            update dish set is_active= {active} where dish_id = {dish};
-        """).format(active=sql.Literal(is_active),
-                    dish=sql.Literal(dish_id))
+def update_dish_price(dish_id: int, price: float) -> ReturnValue:
+    result = _write(_update_dish_price, dish_id, price)
+    entity_cache.invalidate('dish', dish_id)
+    return result
 
-        rows_affected, _ = connection.execute(query)
-        connection.close()
-        if rows_affected == 0:
-            return ReturnValue.NOT_EXISTS
+
+def _update_dish_active_status(connection: Connector.DBConnector, dish_id: int, is_active: bool) -> ReturnValue:
+    try:
+        rows_affected, _ = connection.execute(QUERIES['update_dish_active_status'], params=(is_active, dish_id))
     except DatabaseException.CHECK_VIOLATION:
-        connection.close()
         return ReturnValue.BAD_PARAMS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    return ReturnValue.OK
+    return ReturnValue.NOT_EXISTS if rows_affected == 0 else ReturnValue.OK
 
 
-def customer_placed_order(customer_id: int, order_id: int) -> ReturnValue:
-    connection = None
+def update_dish_active_status(dish_id: int, is_active: bool) -> ReturnValue:
+    result = _write(_update_dish_active_status, dish_id, is_active)
+    entity_cache.invalidate('dish', dish_id)
+    return result
 
-    try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        insert into customer_orders values({cust_id}, {ord_id});
-                        """).format(cust_id=sql.Literal(customer_id),
-                                    ord_id=sql.Literal(order_id))
-        connection.execute(query)
 
+def _customer_placed_order(connection: Connector.DBConnector, customer_id: int, order_id: int) -> ReturnValue:
+    try:
+        connection.execute(QUERIES['customer_placed_order'], params=(customer_id, order_id))
     except DatabaseException.FOREIGN_KEY_VIOLATION:
-        connection.close()
         return ReturnValue.NOT_EXISTS
     except DatabaseException.UNIQUE_VIOLATION:
-        connection.close()
         return ReturnValue.ALREADY_EXISTS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    connection.close()
     return ReturnValue.OK
 
 
+def customer_placed_order(customer_id: int, order_id: int) -> ReturnValue:
+    return _write(_customer_placed_order, customer_id, order_id)
+
+
 def get_customer_that_placed_order(order_id: int) -> Customer:
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-                         select c.* from customer_orders co 
-                         join customer c on c.cust_id = co.cust_id
-                         where order_id= {order};
-                          """).format(order=sql.Literal(order_id))
-
-        _, result = connection.execute(query)
+        _, result = connection.execute(QUERIES['get_customer_that_placed_order'], params=(order_id,), read_only=True)
         if result.size() == 0:
             customer = BadCustomer()
         else:
-            customer = Customer(result["cust_id"][0], result["full_name"][0], result["phone"][0], result["address"][0])
+            db_result = result[0]
+            customer = Customer(db_result['cust_id'], db_result['full_name'], db_result['phone'], db_result['address'])
     except DatabaseException.ConnectionInvalid:
         return BadCustomer()
     connection.close()
     return customer
 
 
-def order_contains_dish(order_id: int, dish_id: int, amount: int) -> ReturnValue:
-    connection = None
+def _order_contains_dish(connection: Connector.DBConnector, order_id: int, dish_id: int, amount: int) -> ReturnValue:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        insert into dishes_in_order values({dishid}, {ord_id}, {amount},
-                        (select price
-                        from dish
-                        where dish_id={dishid} and is_active = true));
-                        """).format(dishid=sql.Literal(dish_id),
-                                    ord_id=sql.Literal(order_id),
-                                    amount=sql.Literal(amount))
-
-        connection.execute(query)
-    except DatabaseException.FOREIGN_KEY_VIOLATION:
-        connection.close()
-        return ReturnValue.NOT_EXISTS
-    except DatabaseException.NOT_NULL_VIOLATION:
-        connection.close()
+        connection.execute_prepared('order_contains_dish', (dish_id, order_id, amount))
+    except (DatabaseException.FOREIGN_KEY_VIOLATION, DatabaseException.NOT_NULL_VIOLATION):
         return ReturnValue.NOT_EXISTS
     except DatabaseException.UNIQUE_VIOLATION:
-        connection.close()
         return ReturnValue.ALREADY_EXISTS
     except DatabaseException.CHECK_VIOLATION:
-        connection.close()
         return ReturnValue.BAD_PARAMS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    connection.close()
     return ReturnValue.OK
 
 
+def order_contains_dish(order_id: int, dish_id: int, amount: int) -> ReturnValue:
+    return _write(_order_contains_dish, order_id, dish_id, amount)
+
+
+def _order_does_not_contain_dish(connection: Connector.DBConnector, order_id: int, dish_id: int) -> ReturnValue:
+    rows_effected, _ = connection.execute(QUERIES['order_does_not_contain_dish'], params=(order_id, dish_id))
+    return ReturnValue.NOT_EXISTS if rows_effected == 0 else ReturnValue.OK
+
+
 def order_does_not_contain_dish(order_id: int, dish_id: int) -> ReturnValue:
+    return _write(_order_does_not_contain_dish, order_id, dish_id)
+
+
+# add the order, link it to the customer and add its lines [(dish_id, amount), ...] in one transaction.
+# The prices of all the lines are looked up with a single statement. Returns the status of the order,
+# the result of every line (as order_contains_dish would return it, a dish listed twice is ALREADY_EXISTS)
+# and the order's total price. Nothing is added unless the status is ReturnValue.OK
+def place_order(order: Order, customer_id: int,
+                lines: Iterable[Tuple[int, int]]) -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]], float]:
+    lines = list(lines)
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        delete from dishes_in_order where order_id = {order} and dish_id= {dishid};
-                        """).format(order=sql.Literal(order_id),
-                                    dishid=sql.Literal(dish_id))
-        row_effected, _ = connection.execute(query)
-        connection.close()
-        if row_effected == 0:
-            return ReturnValue.NOT_EXISTS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    return ReturnValue.OK
+        status, result = _run_transaction(lambda connection: _place_order(connection, order, customer_id, lines))
+    except (DatabaseException.ConnectionInvalid, errors.Error):
+        return ReturnValue.ERROR, [], float(0)
+    finally:
+        entity_cache.invalidate('order', order.get_order_id())
+    if status != ReturnValue.OK:
+        return status, [], float(0)
+    results = [(row['dish_id'], ReturnValue[row['status']]) for row in result]
+    return ReturnValue.OK, results, float(sum(row['line_price'] or 0 for row in result))
+
+
+def _place_order(connection: Connector.DBConnector, order: Order, customer_id: int,
+                 lines: List[Tuple[int, int]]) -> tuple:
+    status = _add_order(connection, order)
+    if status == ReturnValue.OK:
+        status = _customer_placed_order(connection, customer_id, order.get_order_id())
+    if status != ReturnValue.OK:
+        connection.rollback()
+        return status, None
+    _, result = connection.execute(QUERIES['place_order_lines'], params={
+        'order_id': order.get_order_id(),
+        'dish_ids': [dish_id for dish_id, _ in lines],
+        'amounts': [amount for _, amount in lines]})
+    return ReturnValue.OK, result
 
 
 def get_all_order_items(order_id: int) -> List[OrderDish]:
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-                         select dish_id, dish_price, amount
-                         from dishes_in_order 
-                         where order_id= {order}
-                         order by dish_id;
-                          """).format(order=sql.Literal(order_id))
-
-        _, result = connection.execute(query)
+        _, result = connection.execute(QUERIES['get_all_order_items'], params=(order_id,), read_only=True)
         orders_dishes = [
             OrderDish(order_dish['dish_id'], order_dish['amount'], order_dish['dish_price']) for order_dish in result
         ]
@@ -431,53 +967,33 @@ def get_all_order_items(order_id: int) -> List[OrderDish]:
     return orders_dishes
 
 
-def customer_likes_dish(cust_id: int, dish_id: int) -> ReturnValue:
-    connection = None
+def _customer_likes_dish(connection: Connector.DBConnector, cust_id: int, dish_id: int) -> ReturnValue:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        insert into likes values({cust_id}, {dish_id});
-                        """).format(cust_id=sql.Literal(cust_id),
-                                    dish_id=sql.Literal(dish_id))
-        connection.execute(query)
-        connection.close()
+        connection.execute(QUERIES['customer_likes_dish'], params=(cust_id, dish_id))
     except DatabaseException.UNIQUE_VIOLATION:
-        connection.close()
         return ReturnValue.ALREADY_EXISTS
     except DatabaseException.FOREIGN_KEY_VIOLATION:
-        connection.close()
         return ReturnValue.NOT_EXISTS
     return ReturnValue.OK
 
 
-def customer_dislike_dish(cust_id: int, dish_id: int) -> ReturnValue:
-    try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                        delete from likes 
-                        where cust_id = {cust} and dish_id= {dishid};
-                        """).format(cust=sql.Literal(cust_id),
-                                    dishid=sql.Literal(dish_id))
+def customer_likes_dish(cust_id: int, dish_id: int) -> ReturnValue:
+    return _write(_customer_likes_dish, cust_id, dish_id)
 
-        rows_affected, _ = connection.execute(query)
-        connection.close()
-        if rows_affected == 0:
-            return ReturnValue.NOT_EXISTS
-    except DatabaseException.ConnectionInvalid:
-        return ReturnValue.ERROR
-    return ReturnValue.OK
+
+def _customer_dislike_dish(connection: Connector.DBConnector, cust_id: int, dish_id: int) -> ReturnValue:
+    rows_affected, _ = connection.execute(QUERIES['customer_dislike_dish'], params=(cust_id, dish_id))
+    return ReturnValue.NOT_EXISTS if rows_affected == 0 else ReturnValue.OK
+
+
+def customer_dislike_dish(cust_id: int, dish_id: int) -> ReturnValue:
+    return _write(_customer_dislike_dish, cust_id, dish_id)
 
 
 def get_all_customer_likes(cust_id: int) -> List[Dish]:
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-                         select d.dish_id, d.name, d.price, d.is_active
-                         from dish d 
-                         join likes l on l.dish_id = d.dish_id
-                         where l.cust_id= {cust};
-                          """).format(cust=sql.Literal(cust_id))
-        _, result = connection.execute(query)
+        _, result = connection.execute(QUERIES['get_all_customer_likes'], params=(cust_id,), read_only=True)
         dishes = [Dish(dish['dish_id'], dish['name'], dish['price'], dish['is_active']) for dish in result]
         connection.close()
     except DatabaseException.ConnectionInvalid:
@@ -485,20 +1001,96 @@ def get_all_customer_likes(cust_id: int) -> List[Dish]:
     return dishes
 
 
+# ---------------------------------- UNIT OF WORK: ----------------------------------
+
+# queues CRUD writes and runs them in one transaction on one connection when committed, e.g.
+#   work = UnitOfWork()
+#   work.add_order(order)
+#   work.customer_placed_order(customer_id, order.get_order_id())
+#   work.order_contains_dish(order.get_order_id(), dish_id, amount)
+#   results = work.commit()
+# commit() returns the ReturnValue of every queued write, in order. A failed write is rolled back on
+# its own and the others are committed, unless all_or_nothing is set: then nothing is committed if any
+# write failed
+class UnitOfWork:
+    # constructor
+    def __init__(self, all_or_nothing: bool = False):
+        self.all_or_nothing = all_or_nothing
+        self.__writes = []
+
+    def add_customer(self, customer: Customer) -> None:
+        self.__queue(_add_customer, (customer,), ('customer', customer.get_cust_id()))
+
+    def delete_customer(self, customer_id: int) -> None:
+        self.__queue(_delete_customer, (customer_id,), ('customer', customer_id))
+
+    def add_order(self, order: Order) -> None:
+        self.__queue(_add_order, (order,), ('order', order.get_order_id()))
+
+    def delete_order(self, order_id: int) -> None:
+        self.__queue(_delete_order, (order_id,), ('order', order_id))
+
+    def add_dish(self, dish: Dish) -> None:
+        self.__queue(_add_dish, (dish,), ('dish', dish.get_dish_id()))
+
+    def update_dish_price(self, dish_id: int, price: float) -> None:
+        self.__queue(_update_dish_price, (dish_id, price), ('dish', dish_id))
+
+    def update_dish_active_status(self, dish_id: int, is_active: bool) -> None:
+        self.__queue(_update_dish_active_status, (dish_id, is_active), ('dish', dish_id))
+
+    def customer_placed_order(self, customer_id: int, order_id: int) -> None:
+        self.__queue(_customer_placed_order, (customer_id, order_id))
+
+    def order_contains_dish(self, order_id: int, dish_id: int, amount: int) -> None:
+        self.__queue(_order_contains_dish, (order_id, dish_id, amount))
+
+    def order_does_not_contain_dish(self, order_id: int, dish_id: int) -> None:
+        self.__queue(_order_does_not_contain_dish, (order_id, dish_id))
+
+    def customer_likes_dish(self, cust_id: int, dish_id: int) -> None:
+        self.__queue(_customer_likes_dish, (cust_id, dish_id))
+
+    def customer_dislike_dish(self, cust_id: int, dish_id: int) -> None:
+        self.__queue(_customer_dislike_dish, (cust_id, dish_id))
+
+    # run the queued writes (the queue is emptied) in one transaction, run again if postgres aborts it
+    # as a deadlock victim or a serialization failure. ReturnValue.ERROR for every write if the database
+    # cannot be reached, the transaction fails (e.g. a lock timeout) or the commit fails
+    def commit(self) -> List[ReturnValue]:
+        writes, self.__writes = self.__writes, []
+        if not writes:
+            return []
+        try:
+            results = _run_transaction(lambda connection: self.__run(connection, writes))
+        except (DatabaseException.ConnectionInvalid, errors.Error):
+            results = [ReturnValue.ERROR] * len(writes)
+        for _, _, cached in writes:
+            if cached is not None:
+                entity_cache.invalidate(*cached)
+        return results
+
+    def __run(self, connection: Connector.DBConnector, writes: list) -> List[ReturnValue]:
+        results = [helper(connection, *args) for helper, args, _ in writes]
+        if self.all_or_nothing and any(result != ReturnValue.OK for result in results):
+            connection.rollback()
+        return results
+
+    def __queue(self, helper, args: tuple, cached: tuple = None) -> None:
+        self.__writes.append((helper, args, cached))
+
+
 # ---------------------------------- BASIC API: ----------------------------------
 
 # Basic API
+# The read-only functions use DBConnector(read_only=True): they read from a replica when database.ini
+# declares one (see DBConnector.replica_settings), so they may miss writes of the last max_staleness seconds
 
 
 def get_order_total_price(order_id: int) -> float:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                         select order_price
-                         from orders_total_price 
-                         where order_id= {ord_id};
-                          """).format(ord_id=sql.Literal(order_id))
-        _, result = connection.execute(query)
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['get_order_total_price'], params=(order_id,), read_only=True)
         connection.close()
     except DatabaseException.ConnectionInvalid:
         return -1
@@ -509,14 +1101,9 @@ def get_order_total_price(order_id: int) -> float:
 
 def get_max_amount_of_money_cust_spent(cust_id: int) -> float:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                         select max(order_price) max_price
-                         from orders_total_price otp 
-                         join customer_orders co on co.order_id = otp.order_id
-                         where co.cust_id= {cust};
-                          """).format(cust=sql.Literal(cust_id))
-        _, result = connection.execute(query)
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['get_max_amount_of_money_cust_spent'], params=(cust_id,),
+                                       read_only=True)
         connection.close()
     except DatabaseException.ConnectionInvalid:
         return float(0)
@@ -526,40 +1113,37 @@ def get_max_amount_of_money_cust_spent(cust_id: int) -> float:
 
 def get_most_expensive_anonymous_order() -> Order:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-                         select coalesce(max(otp.order_price),0) max_price, o.order_id, o.date
-                         from "order" o 
-                         left join orders_total_price otp on o.order_id = otp.order_id
-                         where not exists (select 1 from customer_orders co where co.order_id = o.order_id)
-                         group by o.order_id, o.date
-                         order by max_price desc limit 1;
-                          """)
-
-        _, result = connection.execute(query)
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['get_most_expensive_anonymous_order'], read_only=True)
         connection.close()
-        return Order(result['order_id'][0], result['date'][0])
+        db_result = result[0]
+        return Order(db_result['order_id'], db_result['date'])
     except DatabaseException.ConnectionInvalid:
         return BadOrder()
 
 
-def is_most_liked_dish_equal_to_most_purchased() -> bool:
+# orders whose maintained total in order_totals differs from the total recomputed by orders_total_price,
+# as (order_id, stored_price, expected_price, stored_items, expected_items). With repair=True the
+# differing rows are rewritten from dishes_in_order
+def check_order_totals(repair: bool = False) -> List[tuple]:
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-                select dish_like.dish_id = dish_purch.dish_id bool_dish 
-                from (select dish_id,count (*) 
-                      from likes 
-                      group by dish_id 
-                      order by count (*) desc ,dish_id limit 1 ) dish_like,
-                      (select dish_id, sum(amount) 
-                       from dishes_in_order 
-                       group by dish_id 
-                       order by sum(amount) desc ,dish_id limit 1 ) dish_purch;
-                    """)
-        _, result = connection.execute(query)
+        _, result = connection.execute(QUERIES['check_order_totals'], read_only=not repair)
+        if repair and result.size() > 0:
+            connection.execute(QUERIES['repair_order_totals'])
+        connection.close()
+    except DatabaseException.ConnectionInvalid:
+        return []
+    return [(row['order_id'], row['stored_price'], row['expected_price'], row['stored_items'], row['expected_items'])
+            for row in result]
+
+
+def is_most_liked_dish_equal_to_most_purchased() -> bool:
+    try:
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['is_most_liked_dish_equal_to_most_purchased'], read_only=True)
         connection.close()
-        return result["bool_dish"][0] if result.size() > 0 else False
+        return result[0]['bool_dish'] if result.size() > 0 else False
     except DatabaseException.ConnectionInvalid:
         return False
 
@@ -567,34 +1151,13 @@ def is_most_liked_dish_equal_to_most_purchased() -> bool:
 # ---------------------------------- ADVANCED API: ----------------------------------
 
 # Advanced API
+# Read from a replica like the Basic API
 
 
 def get_customers_ordered_top_5_dishes() -> List[int]:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-            select distinct cust_id
-            from customer_orders co 
-            join (
-                select count(*), order_id
-                from dishes_in_order dio
-                where dish_id in
-                (
-                    select dish_id from (
-                    select d.dish_id, count(l.dish_id) 
-                    from dish d
-                    left join likes l on l.dish_id = d.dish_id
-                    group by d.dish_id
-                    order by count(l.dish_id) desc, d.dish_id limit 5
-                    )
-                )
-                group by order_id
-                having count(*) = 5
-            ) orders
-            on orders.order_id = co.order_id
-            order by cust_id
-        """)
-        _, result = connection.execute(query)
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['get_customers_ordered_top_5_dishes'], read_only=True)
         connection.close()
         return result['cust_id']
     except DatabaseException.ConnectionInvalid:
@@ -603,24 +1166,8 @@ def get_customers_ordered_top_5_dishes() -> List[int]:
 
 def get_non_worth_price_increase() -> List[int]:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-        with avg_dish_price as (
-        select avg(dish_profit) avg_profit, dish_price, dish_id
-        from dish_profit_in_order
-        group by dish_price, dish_id
-        )
-        select distinct d.dish_id
-        from dish d
-        join avg_dish_price curr_avg 
-        on curr_avg.dish_id = d.dish_id and curr_avg.dish_price = d.price
-        join avg_dish_price former_avg
-        on former_avg.dish_id = d.dish_id and former_avg.dish_price <> d.price
-        where d.is_active = true
-        and curr_avg.avg_profit < former_avg.avg_profit
-        order by d.dish_id
-        """)
-        _, result = connection.execute(query)
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['get_non_worth_price_increase'], read_only=True)
         connection.close()
         return result['dish_id']
     except DatabaseException.ConnectionInvalid:
@@ -628,50 +1175,367 @@ def get_non_worth_price_increase() -> List[int]:
 
 
 def get_total_profit_per_month(year: int) -> List[Tuple[int, float]]:
+    return [(month, profit) for _, month, profit in get_total_profit_per_month_range(year, year)]
+
+
+# (year, month, profit) of every month from January of from_year to December of to_year, latest month first.
+# Closed months are read from the monthly_profit rollup, the current month (and later ones) is computed live,
+# and so is a closed month that has no rollup row yet. Those rows are then filled on the primary, so later
+# calls read them from the rollup.
+# Orders are dated by datetime, so years outside of MINYEAR..MAXYEAR (some of which make_date cannot
+# build) have no orders and get zero months without a query
+def get_total_profit_per_month_range(from_year: int, to_year: int) -> List[Tuple[int, int, float]]:
+    first, last = max(from_year, MINYEAR), min(to_year, MAXYEAR)
+    months = []
+    if first <= last:
+        try:
+            connection = Connector.DBConnector(read_only=True)
+            _, result = connection.execute(QUERIES['get_total_profit_per_month_range'],
+                                           params={'from_year': first, 'to_year': last}, read_only=True)
+            connection.close()
+        except DatabaseException.ConnectionInvalid:
+            return []
+        months = [(row['year'], row['month'], float(row['price'])) for row in result]
+        _fill_monthly_profit([datetime(row['year'], row['month'], 1) for row in result if row['unfilled']])
+    return (zero_months(max(last + 1, from_year), to_year) + months
+            + zero_months(from_year, min(first - 1, to_year)))
+
+
+# adds the rollup rows of the given closed months, a month that is being written to is left for a later call.
+# The caller already has the profits of the months (computed from the orders), so a failed fill is skipped
+def _fill_monthly_profit(months: List[datetime]) -> None:
+    if not months:
+        return
+    connection = None
     try:
         connection = Connector.DBConnector()
-        query = sql.SQL("""
-        select months.month, coalesce(sum(dpio.dish_profit), 0) price
-        from (select generate_series(1, 12) "month") months
-        left join "order" o 
-        on extract(month from o.date) = months.month and extract(year from o.date) = {input_year}
-        left join dish_profit_in_order dpio 
-        on dpio.order_id = o.order_id
-        group by months.month
-        order by months.month desc
-        """).format(input_year=sql.Literal(year))
-        _, result = connection.execute(query)
-        connection.close()
-        return [(int(row['month']), float(row['price'])) for row in result]
-    except DatabaseException.ConnectionInvalid:
-        return []
+        connection.execute(QUERIES['fill_monthly_profit'], params=(months,))
+    except (DatabaseException.ConnectionInvalid, errors.Error):
+        pass
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+# (year, month, 0.0) of every month from January of from_year to December of to_year, latest month first
+def zero_months(from_year: int, to_year: int) -> List[Tuple[int, int, float]]:
+    return [(year, month, 0.0) for year in range(to_year, from_year - 1, -1) for month in range(12, 0, -1)]
 
 
 def get_potential_dish_recommendations(cust_id: int) -> List[int]:
     try:
-        connection = Connector.DBConnector()
-        query = sql.SQL("""
-            select distinct l.dish_id dish_recommendations
-            from likes l
-            where l.cust_id in (
-                select l2.cust_id
-                from likes l1
-                join likes l2 on l1.dish_id = l2.dish_id
-                where l1.cust_id = {cust_id}
-                and l1.cust_id <> l2.cust_id
-                group by l2.cust_id
-                having count(*) > 2
-            )
-            and not exists (
-                select 1
-                from likes l3
-                where l3.dish_id = l.dish_id
-                and l3.cust_id = {cust_id}
-            )
-            order by l.dish_id
-        """).format(cust_id=sql.Literal(cust_id))
-        _, result = connection.execute(query)
+        connection = Connector.DBConnector(read_only=True)
+        _, result = connection.execute(QUERIES['get_potential_dish_recommendations'], params=(cust_id, cust_id),
+                                       read_only=True)
         connection.close()
         return result['dish_recommendations']
     except DatabaseException.ConnectionInvalid:
         return []
+
+
+# (cust_id, recommendations) for every requested customer, in the order requested, computed by one query
+# and streamed from a server-side cursor
+def get_potential_dish_recommendations_bulk(cust_ids: Iterable[int]) -> Iterator[Tuple[int, List[int]]]:
+    cust_ids = list(cust_ids)
+    if not cust_ids:
+        return
+    try:
+        connection = Connector.DBConnector(read_only=True)
+    except DatabaseException.ConnectionInvalid:
+        return
+    try:
+        result = connection.execute_stream(QUERIES['get_potential_dish_recommendations_bulk'], params=(cust_ids,))
+        for row in result:
+            yield row['cust_id'], row['dish_recommendations']
+    finally:
+        connection.close()
+
+
+# ---------------------------------- BULK API: ----------------------------------
+
+# Bulk API
+
+
+# inserts all rows with a single multi-row statement. A batch with a row that violates a constraint
+# is split in halves until the offending rows are isolated, so every row gets the same outcome as
+# the single-row function would return for it
+def _bulk_insert(connection: Connector.DBConnector, table: str, key: str, rows: List[tuple]) -> List[ReturnValue]:
+    if len(rows) == 0:
+        return []
+    query = sql.SQL("""
+                    insert into {table} values {rows}
+                    on conflict do nothing
+                    returning {key};
+                    """).format(table=sql.Identifier(table),
+                                rows=sql.SQL(', ').join(
+                                    sql.SQL('({})').format(sql.SQL(', ').join(map(sql.Literal, row))) for row in rows
+                                ),
+                                key=sql.Identifier(key))
+    try:
+        _, result = connection.execute(query)
+    except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
+        # only the failed statement was rolled back (to its savepoint), the halves run in the same transaction
+        if len(rows) == 1:
+            return [ReturnValue.BAD_PARAMS]
+        middle = len(rows) // 2
+        return (_bulk_insert(connection, table, key, rows[:middle])
+                + _bulk_insert(connection, table, key, rows[middle:]))
+
+    # a key that appears more than once in the batch is inserted for its first row only
+    inserted = set(result[key])
+    return_values = []
+    for row in rows:
+        if row[0] in inserted:
+            inserted.remove(row[0])
+            return_values.append(ReturnValue.OK)
+        else:
+            return_values.append(ReturnValue.ALREADY_EXISTS)
+    return return_values
+
+
+# the whole batch is one transaction: ReturnValue.ERROR for every row leaves none of them written
+def _bulk_add(table: str, key: str, rows: List[tuple]) -> List[ReturnValue]:
+    try:
+        return_values = _run_transaction(lambda connection: _bulk_insert(connection, table, key, rows))
+    except (DatabaseException.ConnectionInvalid, errors.Error):
+        return [ReturnValue.ERROR] * len(rows)
+    entity_cache.clear()
+    return return_values
+
+
+def add_customers(customers: List[Customer]) -> List[ReturnValue]:
+    return _bulk_add('customer', 'cust_id', [
+        (customer.get_cust_id(), customer.get_full_name(), customer.get_phone(), customer.get_address())
+        for customer in customers
+    ])
+
+
+def add_orders(orders: List[Order]) -> List[ReturnValue]:
+    return _bulk_add('order', 'order_id', [(order.get_order_id(), order.get_datetime()) for order in orders])
+
+
+def add_dishes(dishes: List[Dish]) -> List[ReturnValue]:
+    return _bulk_add('dish', 'dish_id', [
+        (dish.get_dish_id(), dish.get_name(), dish.get_price(), dish.get_is_active()) for dish in dishes
+    ])
+
+
+# integer value of a staged text column, NULL if the text is not an integer
+def _staged_integer(column: str) -> sql.Composable:
+    return sql.SQL("""
+                   case when {column} ~ '^\\s*[+-]?[0-9]{{1,18}}\\s*$' then
+                   case when {column}::bigint between -2147483648 and 2147483647 then {column}::integer end end
+                   """).format(column=sql.Identifier(column))
+
+
+# streams the rows of source (an iterable of tuples, or the path of a CSV file) into a temporary staging
+# table, numbering the rows by their position in the source. Each row is staged as a single text array of
+# its values and split by _split_staged, so a row with the wrong number of values is staged as well
+def _stage(connection: Connector.DBConnector, staging: str, source, header: bool) -> None:
+    connection.execute(sql.SQL("""
+                               drop table if exists {staging};
+                               create temp table {staging} (line bigint generated always as identity, fields text[]);
+                               """).format(staging=sql.Identifier(staging)))
+    query = sql.SQL("""copy {staging} (fields) from stdin with (format csv)""").format(
+        staging=sql.Identifier(staging))
+    file = open(source, newline='') if isinstance(source, str) else None
+    try:
+        rows = iter(csv.reader(file) if file is not None else source)
+        if header:
+            next(rows, None)
+        connection.copy(query, ([_array_literal(row)] for row in rows))
+    finally:
+        if file is not None:
+            file.close()
+    connection.execute(sql.SQL("analyze {staging};").format(staging=sql.Identifier(staging)))
+
+
+# a row as a text array literal, e.g. {"1","2",NULL} (empty values are NULL, as COPY reads them from CSV)
+def _array_literal(row) -> str:
+    values = row if isinstance(row, (tuple, list)) else (row,)
+    return '{' + ','.join(
+        'NULL' if value is None or value == '' else '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for value in values
+    ) + '}'
+
+
+# the rows staged by _stage with a text column per value. malformed is set for the rows that do not have
+# one value per column, they are rejected with BAD_PARAMS
+def _split_staged(staging: str, columns: List[str]) -> sql.Composable:
+    return sql.SQL("""
+                   select line, fields, cardinality(fields) <> {count} malformed, {values} from {staging}
+                   """).format(
+        count=sql.Literal(len(columns)),
+        values=sql.SQL(', ').join(
+            sql.SQL('fields[{}] {}').format(sql.Literal(index), sql.Identifier(column))
+            for index, column in enumerate(columns, 1)
+        ),
+        staging=sql.Identifier(staging))
+
+
+# loads the staged rows with a single statement and returns the rejected ones as (line, row, ReturnValue).
+# The parent rows the staged rows reference are locked first (see _lock_staged), in the same transaction
+def _load_staged(connection: Connector.DBConnector, staging: str, query: sql.Composable, columns: List[str],
+                 parents: List[str]) -> List[Tuple[int, tuple, ReturnValue]]:
+    with connection.transaction():
+        # the load sorts the whole staging table, keep the sorts in memory
+        connection.execute(sql.SQL("set local work_mem = '64MB'; ") + sql.SQL(' ').join(
+            _lock_staged(staging, columns, table, column) for table, column in parents))
+        _, result = connection.execute(query)
+    connection.execute(sql.SQL("drop table {staging};").format(staging=sql.Identifier(staging)))
+    return [
+        (row['line'],
+         tuple(row['fields']) if row['malformed'] else
+         tuple(row['raw_' + column] if row[column] is None else row[column] for column in columns),
+         ReturnValue[row['status']])
+        for row in result
+    ]
+
+
+# locks (FOR KEY SHARE, in key order) the rows of table whose key column is the value of a staged column,
+# so they cannot be deleted while the load that references them runs. A row deleted by a transaction that
+# commits first is not locked, and the load statement (with a snapshot taken after the lock) does not see it
+def _lock_staged(staging: str, columns: List[str], table: str, column: str) -> sql.Composable:
+    return sql.SQL("""
+                   select count(*) from (
+                       select 1 from {table} t where t.{column} in (select {value} from ({split}) s)
+                       order by t.{column} for key share
+                   ) locked;
+                   """).format(table=sql.Identifier(table), column=sql.Identifier(column),
+                               value=_staged_integer(column), split=_split_staged(staging, columns))
+
+
+# bulk version of order_contains_dish for (order_id, dish_id, amount) rows, loaded with COPY through a
+# staging table. Rows get the ReturnValue order_contains_dish would return for them (the first accepted
+# row of an (order_id, dish_id) pair wins, a pair inserted concurrently is ALREADY_EXISTS and a parent
+# deleted concurrently NOT_EXISTS) and only the rejected rows are returned, as
+# (line, row, ReturnValue) where line is the 1-based position of the row in the source.
+# Values that are not integers and rows without exactly three values (returned with their text values)
+# are rejected with BAD_PARAMS. If the database cannot be reached nothing is loaded and
+# [(0, (), ReturnValue.ERROR)] is returned
+def import_order_dishes(source, header: bool = False) -> List[Tuple[int, tuple, ReturnValue]]:
+    columns = ['order_id', 'dish_id', 'amount']
+    query = sql.SQL("""
+        with split as (
+            {split}
+        ),
+        parsed as materialized (
+            select s.line, s.fields, s.malformed, s.order_id raw_order_id, s.dish_id raw_dish_id,
+            s.amount raw_amount, {order_id} order_id, {dish_id} dish_id, {amount} amount
+            from split s
+        ),
+        classified as (
+            select p.*, d.price,
+            case
+                when p.malformed then 'BAD_PARAMS'
+                when (p.raw_order_id is not null and p.order_id is null)
+                or (p.raw_dish_id is not null and p.dish_id is null)
+                or (p.raw_amount is not null and p.amount is null) then 'BAD_PARAMS'
+                when p.order_id is null or p.amount is null or d.price is null then 'NOT_EXISTS'
+                when p.amount <= 0 then 'BAD_PARAMS'
+                when o.order_id is null then 'NOT_EXISTS'
+                when exists (
+                    select 1 from dishes_in_order dio where dio.order_id = p.order_id and dio.dish_id = p.dish_id
+                ) then 'ALREADY_EXISTS'
+            end status
+            from parsed p
+            left join dish d on d.dish_id = p.dish_id and d.is_active = true
+            left join "order" o on o.order_id = p.order_id
+        ),
+        ranked as (
+            select line, row_number() over (partition by order_id, dish_id order by line) rank
+            from classified
+            where status is null
+        ),
+        inserted as (
+            insert into dishes_in_order
+            select c.dish_id, c.order_id, c.amount, c.price
+            from classified c
+            join ranked r on r.line = c.line
+            where r.rank = 1
+            on conflict do nothing
+            returning order_id, dish_id
+        )
+        select c.line, c.fields, c.malformed, c.raw_order_id, c.raw_dish_id, c.raw_amount, c.order_id, c.dish_id,
+        c.amount, coalesce(c.status, 'ALREADY_EXISTS') status
+        from classified c
+        left join ranked r on r.line = c.line
+        left join inserted i on r.rank = 1 and i.order_id = c.order_id and i.dish_id = c.dish_id
+        where i.order_id is null
+        order by c.line;
+        """).format(split=_split_staged('order_dishes_staging', columns), order_id=_staged_integer('order_id'),
+                    dish_id=_staged_integer('dish_id'), amount=_staged_integer('amount'))
+    connection = None
+    try:
+        connection = Connector.DBConnector()
+        _stage(connection, 'order_dishes_staging', source, header)
+        rejected = _load_staged(connection, 'order_dishes_staging', query, columns,
+                                [('order', 'order_id'), ('dish', 'dish_id')])
+    except (DatabaseException.ConnectionInvalid, errors.Error):
+        rejected = [(0, (), ReturnValue.ERROR)]
+    if connection is not None:
+        connection.close()
+    return rejected
+
+
+# bulk version of customer_likes_dish for (cust_id, dish_id) rows, see import_order_dishes
+def import_likes(source, header: bool = False) -> List[Tuple[int, tuple, ReturnValue]]:
+    columns = ['cust_id', 'dish_id']
+    query = sql.SQL("""
+        with split as (
+            {split}
+        ),
+        parsed as materialized (
+            select s.line, s.fields, s.malformed, s.cust_id raw_cust_id, s.dish_id raw_dish_id,
+            {cust_id} cust_id, {dish_id} dish_id
+            from split s
+        ),
+        classified as (
+            select p.*,
+            case
+                when p.malformed then 'BAD_PARAMS'
+                when (p.raw_cust_id is not null and p.cust_id is null)
+                or (p.raw_dish_id is not null and p.dish_id is null) then 'BAD_PARAMS'
+                when p.cust_id is null or p.dish_id is null then 'NOT_EXISTS'
+                when exists (
+                    select 1 from likes l where l.cust_id = p.cust_id and l.dish_id = p.dish_id
+                ) then 'ALREADY_EXISTS'
+                when not exists (select 1 from customer c where c.cust_id = p.cust_id)
+                or not exists (select 1 from dish d where d.dish_id = p.dish_id) then 'NOT_EXISTS'
+            end status
+            from parsed p
+        ),
+        ranked as (
+            select line, row_number() over (partition by cust_id, dish_id order by line) rank
+            from classified
+            where status is null
+        ),
+        inserted as (
+            insert into likes
+            select c.cust_id, c.dish_id
+            from classified c
+            join ranked r on r.line = c.line
+            where r.rank = 1
+            on conflict do nothing
+            returning cust_id, dish_id
+        )
+        select c.line, c.fields, c.malformed, c.raw_cust_id, c.raw_dish_id, c.cust_id, c.dish_id,
+        coalesce(c.status, 'ALREADY_EXISTS') status
+        from classified c
+        left join ranked r on r.line = c.line
+        left join inserted i on r.rank = 1 and i.cust_id = c.cust_id and i.dish_id = c.dish_id
+        where i.cust_id is null
+        order by c.line;
+        """).format(split=_split_staged('likes_staging', columns), cust_id=_staged_integer('cust_id'),
+                    dish_id=_staged_integer('dish_id'))
+    connection = None
+    try:
+        connection = Connector.DBConnector()
+        _stage(connection, 'likes_staging', source, header)
+        rejected = _load_staged(connection, 'likes_staging', query, columns,
+                                [('customer', 'cust_id'), ('dish', 'dish_id')])
+    except (DatabaseException.ConnectionInvalid, errors.Error):
+        rejected = [(0, (), ReturnValue.ERROR)]
+    if connection is not None:
+        connection.close()
+    return rejected
@@ -0,0 +1,86 @@
+import asyncio
+import datetime
+import unittest
+import AsyncSolution
+import Utility.DBConnector as Connector
+from Business.Customer import Customer, BadCustomer
+from Business.Dish import Dish
+from Business.Order import Order
+from Utility.AsyncDBConnector import AsyncDBConnector
+from Utility.ReturnValue import ReturnValue
+
+'''
+    Tests for the asyncio API of AsyncSolution.py and its connection pool
+'''
+
+
+class AsyncSolutionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        Connector.DBConnector.configure_pool(maxconn=3, timeout=5)
+        await AsyncSolution.create_tables()
+
+    async def asyncTearDown(self) -> None:
+        await AsyncSolution.drop_tables()
+        Connector.DBConnector.configure_pool()
+
+    async def test_crud(self) -> None:
+        customer = Customer(1, 'name', '0502220000', 'Haifa')
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.add_customer(customer))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, await AsyncSolution.add_customer(customer))
+        self.assertEqual(ReturnValue.BAD_PARAMS, await AsyncSolution.add_customer(Customer(2, 'name', '050', 'H')))
+        self.assertEqual(customer, await AsyncSolution.get_customer(1))
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.add_order(Order(1, datetime.datetime(2024, 1, 1))))
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.add_dish(Dish(1, 'dish', 2.5, True)))
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.customer_placed_order(1, 1))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, await AsyncSolution.customer_placed_order(1, 1))
+        self.assertEqual(ReturnValue.NOT_EXISTS, await AsyncSolution.customer_placed_order(1, 2))
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.order_contains_dish(1, 1, 4))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, await AsyncSolution.order_contains_dish(1, 1, 4))
+        self.assertEqual(10, await AsyncSolution.get_order_total_price(1))
+        self.assertEqual(10, await AsyncSolution.get_max_amount_of_money_cust_spent(1))
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.OK)], 5),
+                         await AsyncSolution.place_order(Order(2, datetime.datetime(2024, 1, 1)), 1, [(1, 2)]))
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.customer_likes_dish(1, 1))
+        self.assertEqual([1], [dish.get_dish_id() for dish in await AsyncSolution.get_all_customer_likes(1)])
+        self.assertEqual((1, 15), (await AsyncSolution.get_total_profit_per_month(2024))[11])
+        self.assertEqual([(month, 0) for month in range(12, 0, -1)], await AsyncSolution.get_total_profit_per_month(0))
+        self.assertEqual([(1, [])], [item async for item in AsyncSolution.get_potential_dish_recommendations_bulk([1])])
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.delete_customer(1))
+        self.assertIsInstance(await AsyncSolution.get_customer(1), BadCustomer)
+        self.assertEqual(ReturnValue.NOT_EXISTS, await AsyncSolution.delete_customer(1))
+
+    async def test_concurrent_calls_share_pool(self) -> None:
+        dishes = [Dish(dish_id, 'dish' + str(dish_id), 10, True) for dish_id in range(1, 51)]
+        self.assertEqual([ReturnValue.OK] * 50, await AsyncSolution.add_dishes(dishes))
+        found = await asyncio.gather(*[AsyncSolution.get_dish(1 + i % 50) for i in range(500)])
+        self.assertEqual([1 + i % 50 for i in range(500)], [dish.get_dish_id() for dish in found])
+        stats = AsyncDBConnector.pool_stats()
+        self.assertLessEqual(stats['created'], 3)
+        self.assertEqual(0, stats['in_use'])
+
+    async def test_cancelled_call_releases_connection(self) -> None:
+        connection = await AsyncDBConnector().open()
+        task = asyncio.ensure_future(connection.execute("select pg_sleep(10)"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        connection.close()
+        self.assertEqual(0, AsyncDBConnector.pool_stats()['idle'], 'a connection still executing is closed')
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.add_dish(Dish(1, 'dish', 10, True)))
+
+    async def test_broken_idle_connection_replaced(self) -> None:
+        Connector.DBConnector.configure_pool(maxconn=3, timeout=5, ping_after=0.0)
+        async with AsyncDBConnector() as connection:
+            _, result = await connection.execute("select pg_backend_pid() pid")
+        connection = Connector.DBConnector()
+        connection.execute("select pg_terminate_backend(%s)", params=(result[0]['pid'],))
+        connection.close()
+        await asyncio.sleep(0.1)
+        self.assertEqual(ReturnValue.OK, await AsyncSolution.add_dish(Dish(1, 'dish', 10, True)))
+        self.assertEqual(1, AsyncDBConnector.pool_stats()['failed_health_checks'])
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,481 @@
+import collections
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import psycopg2
+from psycopg2 import extensions
+import Utility.DBConnector as Connector
+from Utility.Config import DatabaseConfig
+from Utility.ConnectionPool import ConnectionPool, PooledConnection
+from Utility.Exceptions import DatabaseException
+
+'''
+    Tests for the DBConnector infrastructure (connection pool, configuration, result sets)
+'''
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        Connector.DBConnector.configure_pool(minconn=1, maxconn=2, timeout=0.2)
+
+    def tearDown(self) -> None:
+        Connector.DBConnector.configure_pool()
+
+    def test_connection_reused(self) -> None:
+        conn = Connector.DBConnector()
+        first = conn.connection
+        conn.close()
+        conn = Connector.DBConnector()
+        self.assertIs(first, conn.connection, 'closed connection is handed out again')
+        conn.close()
+        stats = Connector.DBConnector.pool_stats()
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(2, stats['checkouts'])
+        self.assertEqual(0, stats['in_use'])
+
+    def test_pool_exhausted(self) -> None:
+        conn1 = Connector.DBConnector()
+        conn2 = Connector.DBConnector()
+        self.assertRaises(DatabaseException.ConnectionInvalid, Connector.DBConnector)
+        self.assertEqual(1, Connector.DBConnector.pool_stats()['timeouts'])
+        conn1.close()
+        conn3 = Connector.DBConnector()
+        conn2.close()
+        conn3.close()
+
+    def test_failed_statement_rolled_back(self) -> None:
+        conn = Connector.DBConnector()
+        self.assertRaises(Exception, conn.execute, "select * from no_such_table")
+        conn.close()
+        conn = Connector.DBConnector()
+        _, result = conn.execute("select 1 one")
+        self.assertEqual(1, result[0]['one'], 'pooled connection is usable after an error')
+        conn.close()
+
+    def test_read_only(self) -> None:
+        conn = Connector.DBConnector()
+        _, result = conn.execute("select 1 one", read_only=True)
+        self.assertEqual(1, result[0]['one'])
+        self.assertEqual(extensions.TRANSACTION_STATUS_IDLE, conn.connection.get_transaction_status(),
+                         'no transaction is opened for a read only query')
+        self.assertRaises(Exception, conn.execute, "select * from no_such_table", read_only=True)
+        self.assertFalse(conn.connection.autocommit, 'other statements still run in a transaction')
+        conn.close()
+
+    def test_read_only_after_failed_write(self) -> None:
+        conn = Connector.DBConnector()
+        self.assertRaises(Exception, conn.execute, "select * from no_such_table")
+        _, result = conn.execute("select 1 one", read_only=True)
+        self.assertEqual(1, result[0]['one'], 'the aborted transaction is rolled back')
+        self.assertEqual(extensions.TRANSACTION_STATUS_IDLE, conn.connection.get_transaction_status())
+        conn.close()
+
+    def test_health_check_outside_lock(self) -> None:
+        pinging, answer = threading.Event(), threading.Event()
+
+        # a connection whose health check does not answer until told to
+        class HangingConnection(PooledConnection):
+            def cursor(self, *args, **kwargs):
+                pinging.set()
+                answer.wait(5)
+                return super().cursor(*args, **kwargs)
+
+        pool = ConnectionPool(DatabaseConfig.get(), minconn=0, maxconn=2, ping_after=0.0)
+        # the pool's slot is handed over to a connection whose health check hangs
+        pool.getconn().close()
+        pool.putconn(psycopg2.connect(connection_factory=HangingConnection, **DatabaseConfig.get()))
+        checker = threading.Thread(target=pool.getconn)
+        checker.start()
+        self.assertTrue(pinging.wait(5))
+        start = time.monotonic()
+        conn = pool.getconn()
+        self.assertEqual(2, pool.stats()['in_use'])
+        self.assertLess(time.monotonic() - start, 1.0, 'other threads are not blocked by the health check')
+        answer.set()
+        checker.join()
+        pool.putconn(conn)
+        pool.closeall()
+
+    def test_max_lifetime(self) -> None:
+        Connector.DBConnector.configure_pool(max_lifetime=0.0)
+        conn = Connector.DBConnector()
+        conn.close()
+        stats = Connector.DBConnector.pool_stats()
+        self.assertEqual(1, stats['expired'])
+        self.assertEqual(0, stats['idle'])
+
+    def test_pooling_disabled(self) -> None:
+        Connector.DBConnector.configure_pool(enabled=False)
+        conn = Connector.DBConnector()
+        _, result = conn.execute("select 1 one")
+        conn.close()
+        self.assertEqual(1, result[0]['one'])
+        self.assertIsNone(Connector.DBConnector.pool_stats())
+
+
+class ResultSetTest(unittest.TestCase):
+    def setUp(self) -> None:
+        Column = collections.namedtuple('Column', ['name', 'type_code'])
+        self.result = Connector.ResultSet([Column('id', 23), Column('Name', 25), Column('QUERY PLAN', 25)],
+                                          [(1, 'a', 'x'), (2, 'b', 'y')])
+
+    def test_row_access(self) -> None:
+        row = self.result[1]
+        self.assertEqual(2, row['id'])
+        self.assertEqual('b', row['NAME'])
+        self.assertEqual('y', row['query plan'])
+        self.assertIsNone(row[0])
+        self.assertRaises(KeyError, lambda: row['missing'])
+        self.assertEqual(['id', 'Name', 'QUERY PLAN'], list(row), 'iterating a row gives its columns')
+        self.assertEqual({'id': 2, 'Name': 'b', 'QUERY PLAN': 'y'}, row)
+        self.assertEqual([1, 2], [row['id'] for row in self.result])
+
+    def test_column_access(self) -> None:
+        self.assertEqual([1, 2], self.result['id'])
+        column = self.result.column('name')
+        self.assertEqual(2, len(column))
+        self.assertEqual('b', column[1])
+        self.assertEqual(['a', 'b'], column)
+        self.assertEqual([], Connector.ResultSet().column('id'))
+
+    def test_to_columns(self) -> None:
+        conn = Connector.DBConnector()
+        _, result = conn.execute("select n, n / 2.0 half, null::numeric missing from generate_series(1, 3) n")
+        _, empty = conn.execute("select 1 one where false")
+        conn.close()
+        self.assertEqual({'n': [1, 2, 3], 'half': [0.5, 1.0, 1.5], 'missing': [None, None, None]},
+                         result.to_columns())
+        self.assertEqual({'one': []}, empty.to_columns())
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+    def test_to_numpy(self) -> None:
+        import numpy
+        conn = Connector.DBConnector()
+        _, result = conn.execute("""select n, n / 2.0 half, nullif(n, 2) sparse, n > 1 big, 'x' || n label,
+                                    timestamp '2024-01-01 10:00:00' + n * interval '1 day' stamp
+                                    from generate_series(1, 3) n""")
+        conn.close()
+        arrays = result.to_numpy()
+        self.assertEqual(numpy.int64, arrays['n'].dtype)
+        self.assertEqual([1, 2, 3], arrays['n'].tolist())
+        self.assertEqual(numpy.float64, arrays['half'].dtype)
+        self.assertEqual([0.5, 1.0, 1.5], arrays['half'].tolist())
+        self.assertEqual(numpy.float64, arrays['sparse'].dtype)
+        self.assertTrue(numpy.isnan(arrays['sparse'][1]))
+        self.assertEqual([False, True, True], arrays['big'].tolist())
+        self.assertEqual(['x1', 'x2', 'x3'], arrays['label'].tolist())
+        self.assertEqual(numpy.datetime64('2024-01-02T10:00:00'), arrays['stamp'][0])
+
+
+class StreamTest(unittest.TestCase):
+    def test_stream_rows(self) -> None:
+        conn = Connector.DBConnector()
+        result = conn.execute_stream("select n, n * 2 Twice from generate_series(1, 1000) n", itersize=100)
+        total = 0
+        for index, row in enumerate(result):
+            self.assertEqual(index + 1, row['n'])
+            self.assertEqual(2 * row['N'], row['twice'])
+            total += 1
+        self.assertEqual(1000, total)
+        self.assertEqual(['n', 'twice'], result.cols_header)
+        self.assertEqual([], list(result), 'a streamed result is read once')
+        _, after = conn.execute("select 1 one")
+        self.assertEqual(1, after[0]['one'], 'connection is usable after streaming')
+        conn.close()
+
+    def test_read_only_while_streaming(self) -> None:
+        conn = Connector.DBConnector()
+        result = conn.execute_stream("select n from generate_series(1, 100) n", itersize=10)
+        rows = iter(result)
+        self.assertEqual(1, next(rows)['n'])
+        _, count = conn.execute("select count(*) from generate_series(1, 5)", read_only=True)
+        self.assertEqual(5, count[0]['count'])
+        self.assertEqual(list(range(2, 101)), [row['n'] for row in rows], 'the stream goes on')
+        conn.close()
+
+    def test_stream_closed_early(self) -> None:
+        conn = Connector.DBConnector()
+        result = conn.execute_stream("select n from generate_series(1, 1000) n", itersize=10)
+        for row in result:
+            if row['n'] == 5:
+                break
+        result.close()
+        conn.close()
+        conn = Connector.DBConnector()
+        _, after = conn.execute("select 1 one")
+        self.assertEqual(1, after[0]['one'])
+        conn.close()
+
+
+class PreparedStatementTest(unittest.TestCase):
+    def setUp(self) -> None:
+        conn = Connector.DBConnector()
+        conn.execute("create table prepared_test (id integer primary key)")
+        conn.close()
+        Connector.DBConnector.register_statement('prepared_test_get', 'select * from prepared_test where id = $1')
+        Connector.DBConnector.register_statement('prepared_test_add', 'insert into prepared_test values ($1)')
+
+    def tearDown(self) -> None:
+        conn = Connector.DBConnector()
+        conn.execute("drop table prepared_test")
+        conn.close()
+
+    def test_prepared_once_per_connection(self) -> None:
+        conn = Connector.DBConnector()
+        self.assertEqual(1, conn.execute_prepared('prepared_test_add', (1,))[0])
+        self.assertRaises(DatabaseException.UNIQUE_VIOLATION, conn.execute_prepared, 'prepared_test_add', (1,))
+        conn.close()
+        conn = Connector.DBConnector()
+        prepared = dict(conn.connection.prepared)
+        _, result = conn.execute_prepared('prepared_test_get', (1,))
+        self.assertEqual(1, result[0]['id'])
+        self.assertIn('prepared_test_add', prepared, 'statement stays prepared on the pooled connection')
+        conn.close()
+
+    def test_prepared_read_only(self) -> None:
+        conn = Connector.DBConnector()
+        self.assertEqual(0, conn.execute_prepared('prepared_test_get', (1,), read_only=True)[1].size())
+        self.assertIn('prepared_test_get', conn.connection.prepared)
+        self.assertEqual(extensions.TRANSACTION_STATUS_IDLE, conn.connection.get_transaction_status())
+        conn.close()
+
+    def test_prepared_after_schema_change(self) -> None:
+        conn = Connector.DBConnector()
+        conn.execute_prepared('prepared_test_add', (1,))
+        self.assertEqual(1, conn.execute_prepared('prepared_test_get', (1,))[1].size())
+        conn.execute("alter table prepared_test add column name text")
+        _, result = conn.execute_prepared('prepared_test_get', (1,))
+        self.assertEqual(['id', 'name'], result.cols_header, 'statement is prepared again for the new schema')
+        conn.close()
+
+    def test_transaction(self) -> None:
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute_prepared('prepared_test_add', (1,))
+            self.assertRaises(DatabaseException.UNIQUE_VIOLATION, conn.execute_prepared, 'prepared_test_add', (1,))
+            conn.execute("insert into prepared_test values (2)")
+            _, result = conn.execute_prepared('prepared_test_get', (2,), read_only=True)
+            self.assertEqual(1, result.size(), 'a read only query in a transaction sees its changes')
+            conn.commit()
+            conn.execute_prepared('prepared_test_add', (3,))
+        self.assertRaises(ZeroDivisionError, self.__failed_transaction, conn)
+        conn.close()
+        conn = Connector.DBConnector()
+        _, result = conn.execute("select id from prepared_test order by id")
+        self.assertEqual([1, 2, 3], result['id'], 'only the failed statement is rolled back')
+        conn.close()
+
+    @staticmethod
+    def __failed_transaction(conn: Connector.DBConnector) -> None:
+        with conn.transaction():
+            conn.execute_prepared('prepared_test_add', (4,))
+            1 / 0
+
+
+class ConfigTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'database.ini')
+        shutil.copy(os.path.join('Utility', 'database.ini'), self.path)
+        os.environ['DATABASE_INI'] = self.path
+        DatabaseConfig.reload()
+
+    def tearDown(self) -> None:
+        del os.environ['DATABASE_INI']
+        os.environ.pop('DATABASE_INI_POOL_MAXCONN', None)
+        os.environ.pop('POSTGRESQL_VERSION', None)
+        DatabaseConfig.check_interval = 1.0
+        DatabaseConfig.reload()
+        shutil.rmtree(self.directory)
+
+    def test_parsed_once(self) -> None:
+        self.assertEqual(self.path, DatabaseConfig.path())
+        generation = DatabaseConfig.generation()
+        self.assertEqual('postgres', DatabaseConfig.get()['user'])
+        self.assertEqual('postgres', DatabaseConfig.get()['user'])
+        self.assertEqual(generation, DatabaseConfig.generation(), 'file is not parsed again')
+
+    def test_modified_file_reloaded(self) -> None:
+        DatabaseConfig.check_interval = 0.0
+        generation = DatabaseConfig.generation()
+        with open(self.path, 'a') as file:
+            file.write('\n[extra]\nkey=value\n')
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        self.assertEqual({'key': 'value'}, DatabaseConfig.get('extra'))
+        self.assertEqual(generation + 1, DatabaseConfig.generation())
+
+    def test_environment_override(self) -> None:
+        os.environ['DATABASE_INI_POOL_MAXCONN'] = '3'
+        DatabaseConfig.reload()
+        self.assertEqual('3', DatabaseConfig.get('pool')['maxconn'])
+        self.assertEqual(3, Connector.DBConnector.pool_settings()['maxconn'])
+
+    def test_unrelated_environment_ignored(self) -> None:
+        # e.g. set by a postgres container image, not a connection parameter
+        os.environ['POSTGRESQL_VERSION'] = '16'
+        DatabaseConfig.reload()
+        self.assertNotIn('version', DatabaseConfig.get())
+        conn = Connector.DBConnector()
+        _, result = conn.execute("select 1 one", read_only=True)
+        self.assertEqual(1, result[0]['one'])
+        conn.close()
+
+    def test_missing_section(self) -> None:
+        self.assertEqual({}, DatabaseConfig.get('no_such_section', required=False))
+        self.assertRaises(DatabaseException.database_ini_ERROR, DatabaseConfig.get, 'no_such_section')
+
+
+class ReplicaTest(unittest.TestCase):
+    def setUp(self) -> None:
+        Connector.DBConnector.configure_pool(minconn=1, maxconn=2, timeout=0.2)
+
+    def tearDown(self) -> None:
+        for name in list(os.environ):
+            if name.startswith(('DATABASE_INI_REPLICAS_', 'DATABASE_INI_SAME_', 'DATABASE_INI_DOWN_')):
+                del os.environ[name]
+        DatabaseConfig.reload()
+        Connector.DBConnector.configure_pool()
+
+    # replicas are configured through environment overrides of database.ini ([replicas], [same], [down])
+    @staticmethod
+    def configure(**variables) -> None:
+        os.environ.update(variables)
+        DatabaseConfig.reload()
+
+    def read_from(self) -> str:
+        conn = Connector.DBConnector(read_only=True)
+        replica = conn.replica
+        _, result = conn.execute("select 1 one", read_only=True)
+        self.assertEqual(1, result[0]['one'])
+        conn.close()
+        return replica
+
+    def test_no_replicas(self) -> None:
+        self.assertIsNone(self.read_from())
+        self.assertEqual({'reads': 1, 'replica_reads': 0, 'fallbacks': 0, 'lag': {}},
+                         Connector.DBConnector.replica_stats())
+
+    def test_read_from_replica(self) -> None:
+        # a "replica" with the parameters of the primary and its own application_name
+        self.configure(DATABASE_INI_REPLICAS_NAMES='same', DATABASE_INI_SAME_APPLICATION_NAME='replica_test')
+        conn = Connector.DBConnector(read_only=True)
+        self.assertEqual('same', conn.replica)
+        _, result = conn.execute("select current_setting('application_name') app", read_only=True)
+        self.assertEqual('replica_test', result[0]['app'])
+        conn.close()
+        writer = Connector.DBConnector()
+        self.assertIsNone(writer.replica, 'connectors that write use the primary')
+        writer.close()
+        self.assertEqual({'reads': 1, 'replica_reads': 1, 'fallbacks': 0, 'lag': {'same': 0.0}},
+                         Connector.DBConnector.replica_stats())
+        self.assertEqual(1, Connector.DBConnector.pool_stats('same')['created'])
+
+    def test_unreachable_replica_skipped(self) -> None:
+        self.configure(DATABASE_INI_REPLICAS_NAMES='down, same', DATABASE_INI_DOWN_PORT='1',
+                       DATABASE_INI_DOWN_CONNECT_TIMEOUT='1', DATABASE_INI_SAME_APPLICATION_NAME='replica_test')
+        self.assertEqual(['same'] * 4, [self.read_from() for _ in range(4)])
+        self.assertEqual({'down': None, 'same': 0.0}, Connector.DBConnector.replica_stats()['lag'])
+
+    def test_fallback_to_primary(self) -> None:
+        self.configure(DATABASE_INI_REPLICAS_NAMES='down', DATABASE_INI_DOWN_PORT='1',
+                       DATABASE_INI_DOWN_CONNECT_TIMEOUT='1')
+        self.assertIsNone(self.read_from())
+        self.configure(DATABASE_INI_REPLICAS_NAMES='same', DATABASE_INI_SAME_APPLICATION_NAME='replica_test',
+                       DATABASE_INI_REPLICAS_MAX_STALENESS='-1')
+        self.assertIsNone(self.read_from(), 'a replica lagging more than max_staleness is not used')
+        self.assertEqual({'reads': 1, 'replica_reads': 0, 'fallbacks': 1, 'lag': {'same': 0.0}},
+                         Connector.DBConnector.replica_stats())
+
+
+# needs a streaming standby of the primary, e.g.
+#   DATABASE_INI_STANDBY_PORT=5433 python -m pytest Tests/DBConnectorTest.py
+@unittest.skipUnless(os.environ.get('DATABASE_INI_STANDBY_PORT'), 'no standby configured (DATABASE_INI_STANDBY_PORT)')
+class StandbyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        os.environ.update(DATABASE_INI_REPLICAS_NAMES='standby', DATABASE_INI_REPLICAS_MAX_STALENESS='1',
+                          DATABASE_INI_REPLICAS_CHECK_INTERVAL='0')
+        DatabaseConfig.reload()
+        conn = Connector.DBConnector()
+        conn.execute("create table standby_test (id integer)")
+        conn.close()
+
+    def tearDown(self) -> None:
+        conn = Connector.DBConnector()
+        conn.execute("drop table standby_test")
+        conn.close()
+        for name in ('DATABASE_INI_REPLICAS_NAMES', 'DATABASE_INI_REPLICAS_MAX_STALENESS',
+                     'DATABASE_INI_REPLICAS_CHECK_INTERVAL'):
+            del os.environ[name]
+        DatabaseConfig.reload()
+
+    @staticmethod
+    def replay(action: str) -> None:
+        conn = Connector.DBConnector(read_only=True)
+        conn.execute("select pg_wal_replay_%s()" % action, read_only=True)
+        conn.close()
+
+    # the result of query run on the standby, whatever its lag
+    @staticmethod
+    def on_standby(query: str, params=None):
+        connection = psycopg2.connect(**dict(DatabaseConfig.get(), **DatabaseConfig.get('standby')))
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone() if cursor.description else None
+        finally:
+            connection.close()
+
+    def test_disconnected_standby(self) -> None:
+        time.sleep(0.5)
+        conninfo = self.on_standby("select current_setting('primary_conninfo')")[0]
+        self.on_standby("alter system set primary_conninfo = ''")
+        self.on_standby("select pg_reload_conf()")
+        try:
+            for _ in range(50):
+                if self.on_standby("select count(*) from pg_stat_wal_receiver")[0] == 0:
+                    break
+                time.sleep(0.1)
+            writer = Connector.DBConnector()
+            writer.execute("insert into standby_test values (1)")
+            writer.close()
+            time.sleep(1.5)
+            self.assertTrue(self.on_standby("select pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()")[0],
+                            'the standby replayed all the WAL it received')
+            conn = Connector.DBConnector(read_only=True)
+            self.assertIsNone(conn.replica, 'the standby does not receive the primary\'s WAL')
+            conn.close()
+        finally:
+            self.on_standby("alter system set primary_conninfo = %s", (conninfo,))
+            self.on_standby("select pg_reload_conf()")
+
+    def test_stale_standby(self) -> None:
+        time.sleep(0.5)
+        conn = Connector.DBConnector(read_only=True)
+        self.assertEqual('standby', conn.replica)
+        _, result = conn.execute("select pg_is_in_recovery() standby, count(*) from standby_test", read_only=True)
+        self.assertTrue(result[0]['standby'])
+        conn.close()
+        self.replay('pause')
+        try:
+            writer = Connector.DBConnector()
+            writer.execute("insert into standby_test values (1)")
+            writer.close()
+            time.sleep(1.5)
+            conn = Connector.DBConnector(read_only=True)
+            self.assertIsNone(conn.replica, 'the paused standby is too stale')
+            _, result = conn.execute("select count(*) from standby_test", read_only=True)
+            self.assertEqual(1, result[0]['count'])
+            conn.close()
+        finally:
+            os.environ['DATABASE_INI_REPLICAS_MAX_STALENESS'] = '3600'
+            DatabaseConfig.reload()
+            self.replay('resume')
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
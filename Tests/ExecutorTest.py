@@ -0,0 +1,75 @@
+import threading
+import unittest
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Business.Dish import Dish
+from Tests.AbstractTest import AbstractTest
+from Utility.Executor import SolutionExecutor
+from Utility.ReturnValue import ReturnValue
+
+'''
+    Tests for running the Solution API concurrently
+'''
+
+
+class ExecutorTest(AbstractTest):
+    def setUp(self) -> None:
+        Connector.DBConnector.configure_pool(maxconn=4)
+        super().setUp()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        Connector.DBConnector.configure_pool()
+
+    def test_submit_and_map(self) -> None:
+        with SolutionExecutor() as executor:
+            self.assertEqual(4, executor.workers)
+            futures = [executor.submit(Solution.add_dish, Dish(dish_id, 'dish', 10, True)) for dish_id in range(1, 41)]
+            self.assertEqual([ReturnValue.OK] * 40, [future.result() for future in futures])
+            dishes = list(executor.map(Solution.get_dish, range(1, 41)))
+            self.assertEqual(list(range(1, 41)), [dish.get_dish_id() for dish in dishes])
+            self.assertEqual([ReturnValue.ALREADY_EXISTS] * 3,
+                             list(executor.map(Solution.add_dish, [Dish(1, 'dish', 10, True)] * 3)))
+        stats = Connector.DBConnector.pool_stats()
+        self.assertLessEqual(stats['created'], 4)
+        self.assertEqual(0, stats['timeouts'])
+
+    def test_too_many_workers(self) -> None:
+        self.assertRaises(ValueError, SolutionExecutor, 5)
+
+    def test_worker_keeps_its_connection(self) -> None:
+        with SolutionExecutor(2) as executor:
+            def connections():
+                seen = set()
+                for _ in range(20):
+                    connection = Connector.DBConnector()
+                    seen.add(id(connection.connection))
+                    connection.close()
+                return seen
+            first, second = executor.submit(connections), executor.submit(connections)
+            self.assertEqual(1, len(first.result()))
+            self.assertEqual(1, len(second.result()))
+
+    def test_shared_connector(self) -> None:
+        connection = Connector.DBConnector()
+        errors = []
+
+        def run():
+            try:
+                for _ in range(50):
+                    _, result = connection.execute("select %s::integer n", params=(threading.get_ident() % 1000,))
+                    assert result[0]['n'] == threading.get_ident() % 1000
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        connection.close()
+        self.assertEqual([], errors)
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import unittest
+import AsyncSolution
+import Solution
+from Business.Customer import Customer
+from Utility.Instrumentation import Histogram, Instrumentation, QueryMetrics
+from Utility.ReturnValue import ReturnValue
+
+'''
+    Tests for the query instrumentation hooks of DBConnector and the QueryMetrics aggregation
+'''
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        Solution.create_tables()
+        self.events = []
+        self.metrics = QueryMetrics()
+        Instrumentation.add_hook(self.events.append)
+        Instrumentation.add_hook(self.metrics)
+
+    def tearDown(self) -> None:
+        Instrumentation.remove_hook(self.events.append)
+        Instrumentation.remove_hook(self.metrics)
+        Solution.drop_tables()
+        self.assertEqual((), Instrumentation.hooks)
+
+    def test_events(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa')))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa')))
+        self.assertEqual(1, Solution.get_customer(1).get_cust_id())
+        work = Solution.UnitOfWork()
+        work.customer_likes_dish(1, 1)
+        work.commit()
+        self.assertEqual(['Solution.add_customer', 'Solution.add_customer', 'Solution.get_customer',
+                          'Solution.UnitOfWork.commit'], [event.function for event in self.events])
+        added, failed, found, _ = self.events
+        self.assertEqual((1, 0, None), (added.rows_affected, added.rows_returned, added.error))
+        self.assertEqual('UNIQUE_VIOLATION', failed.error)
+        self.assertEqual(('get_customer', 0, 1), (found.statement, found.rows_affected, found.rows_returned))
+        self.assertEqual(len('1name0502220000Haifa'), found.bytes_fetched)
+        self.assertGreater(found.seconds, 0)
+
+    def test_async_caller(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa')))
+        asyncio.run(AsyncSolution.get_customer(1))
+        self.assertEqual('AsyncSolution.get_customer', self.events[-1].function)
+        self.assertEqual(1, self.events[-1].rows_returned)
+
+    def test_dumps(self) -> None:
+        Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa'))
+        Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa'))
+        Solution.get_customer(1)
+        metrics = json.loads(self.metrics.to_json())
+        self.assertEqual({'Solution.add_customer', 'Solution.get_customer'}, set(metrics))
+        self.assertEqual((2, 1, 1), tuple(metrics['Solution.add_customer'][key]
+                                          for key in ('calls', 'errors', 'rows_affected')))
+        self.assertEqual([[0, 0], [1, 1], [10, 1], [100, 1], [1000, 1], [10000, 1], [100000, 1], ['+Inf', 1]],
+                         metrics['Solution.get_customer']['rows_returned']['buckets'])
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE solution_query_seconds histogram\n', text)
+        self.assertIn('solution_query_seconds_bucket{function="Solution.get_customer",le="+Inf"} 1\n', text)
+        self.assertIn('solution_query_seconds_count{function="Solution.add_customer"} 2\n', text)
+        self.assertIn('solution_query_rows_affected_total{function="Solution.add_customer"} 1\n', text)
+        self.assertIn('solution_query_errors_total{function="Solution.add_customer"} 1\n', text)
+        self.metrics.reset()
+        self.assertEqual('{}', self.metrics.to_json())
+
+    def test_failing_hook(self) -> None:
+        def hook(event):
+            raise RuntimeError(event.statement)
+        Instrumentation.add_hook(hook)
+        try:
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa')))
+        finally:
+            Instrumentation.remove_hook(hook)
+        self.assertEqual(1, len(self.events), 'the hooks after a failing one are called')
+
+    def test_histogram(self) -> None:
+        histogram = Histogram([1, 10])
+        for value in (0.5, 1, 5, 100):
+            histogram.observe(value)
+        self.assertEqual([(1, 2), (10, 3), (float('inf'), 4)], histogram.cumulative())
+        self.assertEqual({'buckets': [[1, 2], [10, 3], ['+Inf', 4]], 'sum': 106.5, 'count': 4}, histogram.to_dict())
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
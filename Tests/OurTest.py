@@ -1,6 +1,12 @@
 import datetime
+import os
+import tempfile
+import threading
+import time
 import unittest
 import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Config import DatabaseConfig
 from Business.Dish import Dish, BadDish
 from Business.OrderDish import OrderDish
 from Utility.ReturnValue import ReturnValue
@@ -746,6 +752,522 @@ class Test(AbstractTest):
             Solution.get_customers_ordered_top_5_dishes()
         )
 
+    def test_bulk_add_customers(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(createCustomer(cust_id=1)))
+        customers = [createCustomer(cust_id=2), createCustomer(cust_id=1), createCustomer(cust_id=3, address="TA"),
+                     createCustomer(cust_id=4), createCustomer(cust_id=2, full_name="other"),
+                     Customer(None, 'name', "0502220000", "Haifa"), createCustomer(cust_id=-5)]
+        self.assertEqual([ReturnValue.OK, ReturnValue.ALREADY_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.OK,
+                          ReturnValue.ALREADY_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.BAD_PARAMS],
+                         Solution.add_customers(customers))
+        assertCustomersEqual(self.assertEqual, createCustomer(cust_id=2), Solution.get_customer(2))
+        assertCustomersEqual(self.assertEqual, createCustomer(cust_id=4), Solution.get_customer(4))
+        self.assertEqual(BadCustomer(), Solution.get_customer(3))
+        self.assertEqual([], Solution.add_customers([]))
+
+    def test_bulk_add_is_one_transaction(self) -> None:
+        connection = Connector.DBConnector()
+        connection.execute("""
+            create sequence customer_inserts;
+            create function abort_customer_insert() returns trigger language plpgsql as $$
+            begin
+                if nextval('customer_inserts') = 3 then
+                    raise exception 'aborted' using errcode = '55P03';
+                end if;
+                return null;
+            end $$;
+            create trigger abort_customer_insert before insert on customer
+                for each statement execute function abort_customer_insert();
+            """)
+        connection.close()
+        self.addCleanup(self.drop_customer_aborts)
+        # the batch fails, then its first half is inserted and the second half fails with a lock timeout
+        self.assertEqual([ReturnValue.ERROR] * 2,
+                         Solution.add_customers([createCustomer(cust_id=1), createCustomer(cust_id=-2)]))
+        self.assertEqual(BadCustomer(), Solution.get_customer(1))
+
+    def drop_customer_aborts(self) -> None:
+        connection = Connector.DBConnector()
+        connection.execute("drop function if exists abort_customer_insert() cascade; "
+                           "drop sequence if exists customer_inserts")
+        connection.close()
+
+    def test_bulk_add_orders_and_dishes(self) -> None:
+        orders = [createOrder(order_id=i) for i in range(1, 101)] + [createOrder(order_id=5), createOrder(order_id=0)]
+        self.assertEqual([ReturnValue.OK] * 100 + [ReturnValue.ALREADY_EXISTS, ReturnValue.BAD_PARAMS],
+                         Solution.add_orders(orders))
+        assertOrdersEqual(self.assertEqual, orders[41], Solution.get_order(42))
+
+        dishes = [createDish(dish_id=1), createDish(dish_id=2, price=-1), createDish(dish_id=3, name="ab"),
+                  createDish(dish_id=4, is_active=False)]
+        self.assertEqual([ReturnValue.OK, ReturnValue.BAD_PARAMS, ReturnValue.BAD_PARAMS, ReturnValue.OK],
+                         Solution.add_dishes(dishes))
+        assertDishesEqual(self.assertEqual, dishes[3], Solution.get_dish(4))
+
+    def test_import_order_dishes(self) -> None:
+        Solution.add_dishes([createDish(dish_id=1, price=10), createDish(dish_id=2, price=20),
+                             createDish(dish_id=3, is_active=False)])
+        Solution.add_orders([createOrder(order_id=1), createOrder(order_id=2)])
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(2, 2, 1))
+        rows = [(1, 1, 2), (1, 2, 0), (1, 2, 3), (1, 1, 5), (2, 2, 1), (3, 1, 1), (1, 3, 1), (1, 4, 1),
+                (None, 1, 1), ('x', 1, 1)]
+        self.assertEqual([(2, (1, 2, 0), ReturnValue.BAD_PARAMS), (4, (1, 1, 5), ReturnValue.ALREADY_EXISTS),
+                          (5, (2, 2, 1), ReturnValue.ALREADY_EXISTS), (6, (3, 1, 1), ReturnValue.NOT_EXISTS),
+                          (7, (1, 3, 1), ReturnValue.NOT_EXISTS), (8, (1, 4, 1), ReturnValue.NOT_EXISTS),
+                          (9, (None, 1, 1), ReturnValue.NOT_EXISTS), (10, ('x', 1, 1), ReturnValue.BAD_PARAMS)],
+                         Solution.import_order_dishes(iter(rows)))
+        self.assertEqual([OrderDish(1, 2, 10), OrderDish(2, 3, 20)], Solution.get_all_order_items(1))
+        self.assertEqual(80, Solution.get_order_total_price(1))
+
+    def test_import_likes_from_csv(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=1), createCustomer(cust_id=2)])
+        Solution.add_dishes([createDish(dish_id=1), createDish(dish_id=2)])
+        self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(2, 2))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'likes.csv')
+            with open(path, 'w') as file:
+                file.write('cust_id,dish_id\n1,1\n1,2\n1,1\n2,2\n3,1\n')
+            self.assertEqual([(3, (1, 1), ReturnValue.ALREADY_EXISTS), (4, (2, 2), ReturnValue.ALREADY_EXISTS),
+                              (5, (3, 1), ReturnValue.NOT_EXISTS)],
+                             Solution.import_likes(path, header=True))
+        self.assertEqual([1, 2], sorted(dish.get_dish_id() for dish in Solution.get_all_customer_likes(1)))
+
+    def test_import_malformed_rows(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=1)])
+        Solution.add_dishes([createDish(dish_id=1), createDish(dish_id=2)])
+        self.assertEqual([(1, ('1', '2', '3'), ReturnValue.BAD_PARAMS), (3, ('1',), ReturnValue.BAD_PARAMS),
+                          (4, (), ReturnValue.BAD_PARAMS)],
+                         Solution.import_likes(iter([(1, 2, 3), (1, 1), (1,), ()])))
+        self.assertEqual([1], [dish.get_dish_id() for dish in Solution.get_all_customer_likes(1)])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'likes.csv')
+            with open(path, 'w') as file:
+                file.write('1,2\n1,"2,3"\n1,2,x\n')
+            self.assertEqual([(2, (1, '2,3'), ReturnValue.BAD_PARAMS), (3, ('1', '2', 'x'), ReturnValue.BAD_PARAMS)],
+                             Solution.import_likes(path))
+        self.assertEqual([1, 2], sorted(dish.get_dish_id() for dish in Solution.get_all_customer_likes(1)))
+
+    def test_import_concurrent_writers(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=1)])
+        Solution.add_dishes([createDish(dish_id=i) for i in range(1, 4)])
+        rejected = []
+        rows = [(1, 1), (1, 2), (1, 3)]
+        importer = threading.Thread(target=lambda: rejected.extend(Solution.import_likes(iter(rows))))
+        connection = Connector.DBConnector()
+        try:
+            # the import starts while the like it adds and the dish it likes are changed, but not committed
+            with connection.transaction():
+                connection.execute("insert into likes values (1, 1); delete from dish where dish_id = 2")
+                importer.start()
+                time.sleep(0.5)
+        finally:
+            connection.close()
+        importer.join()
+        self.assertEqual([(1, (1, 1), ReturnValue.ALREADY_EXISTS), (2, (1, 2), ReturnValue.NOT_EXISTS)], rejected)
+        self.assertEqual([1, 3], sorted(dish.get_dish_id() for dish in Solution.get_all_customer_likes(1)))
+
+    def test_import_database_unreachable(self) -> None:
+        os.environ.update(DATABASE_INI_POSTGRESQL_PORT='1', DATABASE_INI_POSTGRESQL_CONNECT_TIMEOUT='1')
+        DatabaseConfig.reload()
+        try:
+            self.assertEqual([(0, (), ReturnValue.ERROR)], Solution.import_likes(iter([(1, 1)])))
+            self.assertEqual([(0, (), ReturnValue.ERROR)], Solution.import_order_dishes(iter([(1, 1, 1)])))
+        finally:
+            del os.environ['DATABASE_INI_POSTGRESQL_PORT'], os.environ['DATABASE_INI_POSTGRESQL_CONNECT_TIMEOUT']
+            DatabaseConfig.reload()
+
+    def test_entity_cache(self) -> None:
+        Solution.entity_cache.enabled = True
+        try:
+            Solution.entity_cache.clear()
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(createDish(dish_id=1, price=10)))
+            before = Solution.entity_cache.stats()
+            self.assertEqual(10, Solution.get_dish(1).get_price())
+            self.assertEqual(10, Solution.get_dish(1).get_price())
+            stats = Solution.entity_cache.stats()
+            self.assertEqual(1, stats['misses'] - before['misses'])
+            self.assertEqual(1, stats['hits'] - before['hits'])
+            self.assertEqual(ReturnValue.OK, Solution.update_dish_price(1, 20))
+            self.assertEqual(20, Solution.get_dish(1).get_price(), 'update invalidates the cached dish')
+            self.assertIsInstance(Solution.get_customer(5), BadCustomer)
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(createCustomer(cust_id=5)))
+            self.assertEqual(5, Solution.get_customer(5).get_cust_id(), 'misses are not cached')
+        finally:
+            Solution.entity_cache.enabled = False
+            Solution.entity_cache.clear()
+
+    def test_order_totals_maintained(self) -> None:
+        Solution.add_orders([createOrder(order_id=1), createOrder(order_id=2)])
+        Solution.add_dishes([createDish(dish_id=1, price=2.5), createDish(dish_id=2, price=4)])
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 1, 2))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 2, 1))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(2, 2, 3))
+        self.assertEqual(9, Solution.get_order_total_price(1))
+        self.assertEqual(ReturnValue.OK, Solution.update_dish_price(2, 10))
+        self.assertEqual(9, Solution.get_order_total_price(1), 'price changes do not affect placed orders')
+        self.assertEqual(ReturnValue.OK, Solution.order_does_not_contain_dish(1, 1))
+        self.assertEqual(4, Solution.get_order_total_price(1))
+        self.assertEqual(2, Solution.get_most_expensive_anonymous_order().get_order_id())
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(2))
+        self.assertEqual(0, Solution.get_order_total_price(2))
+        self.assertEqual([], Solution.check_order_totals())
+        connection = Connector.DBConnector()
+        connection.execute("update order_totals set order_price = 100 where order_id = 1")
+        connection.close()
+        self.assertEqual([(1, 100, 4, 1, 1)], Solution.check_order_totals(repair=True))
+        self.assertEqual([], Solution.check_order_totals())
+        self.assertEqual(4, Solution.get_order_total_price(1))
+
+    def test_total_profit_per_month_range(self) -> None:
+        Solution.add_orders([createOrder(order_id=1, date=datetime.datetime(2022, 12, 31, 23, 59, 59)),
+                             createOrder(order_id=2, date=datetime.datetime(2023, 1, 1)),
+                             createOrder(order_id=3, date=datetime.datetime(2024, 1, 1))])
+        Solution.add_dishes([createDish(dish_id=1, price=10)])
+        for order_id in (1, 2, 3):
+            self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, 1, order_id))
+        profits = Solution.get_total_profit_per_month_range(2022, 2023)
+        self.assertEqual(24, len(profits))
+        self.assertEqual((2023, 12, 0), profits[0])
+        self.assertEqual((2023, 1, 20), profits[11])
+        self.assertEqual((2022, 12, 10), profits[12])
+        self.assertEqual(30, sum(profit for _, _, profit in profits))
+        self.assertEqual([(month, profit) for year, month, profit in profits if year == 2023],
+                         Solution.get_total_profit_per_month(2023))
+
+    def test_total_profit_per_month_out_of_range_years(self) -> None:
+        self.assertEqual([(month, 0) for month in range(12, 0, -1)], Solution.get_total_profit_per_month(0))
+        self.assertEqual([(month, 0) for month in range(12, 0, -1)], Solution.get_total_profit_per_month(10000))
+        profits = Solution.get_total_profit_per_month_range(-1, 2)
+        self.assertEqual([(year, month) for year in (2, 1, 0, -1) for month in range(12, 0, -1)],
+                         [(year, month) for year, month, _ in profits])
+
+    def test_monthly_profit_rollup(self) -> None:
+        now = datetime.datetime.now().replace(microsecond=0)
+        Solution.add_orders([createOrder(order_id=1, date=datetime.datetime(2023, 5, 1)),
+                             createOrder(order_id=2, date=datetime.datetime(2023, 5, 31, 23, 59, 59)),
+                             createOrder(order_id=3, date=datetime.datetime(2023, 6, 1)),
+                             createOrder(order_id=4, date=now)])
+        Solution.add_dishes([createDish(dish_id=1, price=10), createDish(dish_id=2, price=3)])
+        for order_id in (1, 2, 3, 4):
+            self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, 1, 1))
+            self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, 2, 2))
+        self.assertEqual(ReturnValue.OK, Solution.order_does_not_contain_dish(1, 2))
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(3))
+        self.assertEqual([], self.rollup(), 'months are added to the rollup when they are read')
+        self.assertEqual((5, 26), Solution.get_total_profit_per_month(2023)[7])
+        self.assertEqual((6, 0), Solution.get_total_profit_per_month(2023)[6])
+        self.assertEqual([(2023, 5, 26)], self.rollup())
+        self.assertEqual(ReturnValue.OK, Solution.order_does_not_contain_dish(2, 1))
+        self.assertEqual([(2023, 5, 16)], self.rollup(), 'writes to a closed month update its rollup row')
+        self.assertEqual((5, 16), Solution.get_total_profit_per_month(2023)[7])
+        self.assertEqual((now.month, 16), Solution.get_total_profit_per_month(now.year)[12 - now.month])
+        self.assertEqual([(2023, 5, 16)], self.rollup(), 'the current month is not rolled up')
+
+    def test_monthly_profit_fill_fails(self) -> None:
+        Solution.add_orders([createOrder(order_id=1, date=datetime.datetime(2023, 5, 1))])
+        Solution.add_dishes([createDish(dish_id=1, price=10)])
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 1, 2))
+        connection = Connector.DBConnector()
+        connection.execute("""
+            create function abort_monthly_profit_insert() returns trigger language plpgsql as $$
+            begin
+                raise exception 'aborted' using errcode = '55P03';
+            end $$;
+            create trigger abort_monthly_profit_insert before insert on monthly_profit
+                for each statement execute function abort_monthly_profit_insert();
+            """)
+        connection.close()
+        self.addCleanup(self.drop_monthly_profit_aborts)
+        self.assertEqual((5, 20), Solution.get_total_profit_per_month(2023)[7], 'a failed fill is skipped')
+        self.assertEqual([], self.rollup())
+        self.drop_monthly_profit_aborts()
+        self.assertEqual((5, 20), Solution.get_total_profit_per_month(2023)[7])
+        self.assertEqual([(2023, 5, 20)], self.rollup())
+
+    def drop_monthly_profit_aborts(self) -> None:
+        connection = Connector.DBConnector()
+        connection.execute("drop function if exists abort_monthly_profit_insert() cascade")
+        connection.close()
+
+    def test_current_month_writes_do_not_wait(self) -> None:
+        now = datetime.datetime.now().replace(microsecond=0)
+        Solution.add_orders([createOrder(order_id=1, date=now), createOrder(order_id=2, date=now)])
+        Solution.add_dishes([createDish(dish_id=1, price=10), createDish(dish_id=2, price=3)])
+        first, second = Connector.DBConnector(), Connector.DBConnector()
+        try:
+            with first.transaction():
+                first.execute("insert into dishes_in_order values (1, 1, 1, 10)")
+                second.execute("set local lock_timeout = '2s'; insert into dishes_in_order values (2, 2, 1, 3)")
+        finally:
+            first.close()
+            second.close()
+        self.assertEqual((now.month, 13), Solution.get_total_profit_per_month(now.year)[12 - now.month])
+
+    def test_rollup_not_filled_during_write(self) -> None:
+        Solution.add_orders([createOrder(order_id=1, date=datetime.datetime(2023, 5, 1))])
+        Solution.add_dishes([createDish(dish_id=1, price=10), createDish(dish_id=2, price=3)])
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 1, 1))
+        connection = Connector.DBConnector()
+        try:
+            with connection.transaction():
+                connection.execute("insert into dishes_in_order values (2, 1, 1, 3)")
+                self.assertEqual((5, 10), Solution.get_total_profit_per_month(2023)[7])
+                self.assertEqual([], self.rollup(), 'a month is not filled while it is written to')
+        finally:
+            connection.close()
+        self.assertEqual((5, 13), Solution.get_total_profit_per_month(2023)[7])
+        self.assertEqual([(2023, 5, 13)], self.rollup())
+
+    # (year, month, profit) rows of monthly_profit
+    @staticmethod
+    def rollup() -> list:
+        connection = Connector.DBConnector()
+        _, result = connection.execute("select extract(year from month)::integer y, "
+                                       "extract(month from month)::integer m, profit "
+                                       "from monthly_profit order by month")
+        connection.close()
+        return [(row['y'], row['m'], row['profit']) for row in result]
+
+    def test_dish_stats_maintained(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=1), createCustomer(cust_id=2)])
+        Solution.add_orders([createOrder(order_id=1), createOrder(order_id=2)])
+        Solution.add_dishes([createDish(dish_id=1), createDish(dish_id=2), createDish(dish_id=3)])
+        for cust_id, dish_id in ((1, 1), (1, 2), (2, 2), (2, 3)):
+            self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(cust_id, dish_id))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 2, 5))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(2, 3, 7))
+        self.assertFalse(Solution.is_most_liked_dish_equal_to_most_purchased())
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(2))
+        self.assertTrue(Solution.is_most_liked_dish_equal_to_most_purchased())
+        self.assertEqual(ReturnValue.OK, Solution.customer_dislike_dish(1, 1))
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(2))
+        connection = Connector.DBConnector()
+        _, stats = connection.execute("select dish_id, like_count, purchased_amount from dish_stats order by dish_id")
+        connection.close()
+        self.assertEqual([(1, 0, 0), (2, 1, 5), (3, 0, 0)],
+                         [(row['dish_id'], row['like_count'], row['purchased_amount']) for row in stats])
+
+    def test_dish_stats_concurrent_writers(self) -> None:
+        Solution.add_orders([createOrder(order_id=1, date=datetime.datetime(2023, 1, 1)),
+                             createOrder(order_id=2, date=datetime.datetime(2023, 2, 1))])
+        Solution.add_dishes([createDish(dish_id=1), createDish(dish_id=2)])
+        barrier = threading.Barrier(2, timeout=10)
+        errors = []
+
+        # adds the dishes to the order one statement at a time, both writers wait in between
+        def write(order_id: int, dish_ids: tuple) -> None:
+            connection = Connector.DBConnector()
+            try:
+                with connection.transaction():
+                    for dish_id in dish_ids:
+                        connection.execute("insert into dishes_in_order values (%s, %s, 1, 10)",
+                                           params=(dish_id, order_id))
+                        barrier.wait()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        writers = [threading.Thread(target=write, args=(1, (1, 2))), threading.Thread(target=write, args=(2, (2, 1)))]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        self.assertEqual([], errors)
+        connection = Connector.DBConnector()
+        _, stats = connection.execute("select dish_id, purchased_amount from dish_stats order by dish_id")
+        connection.close()
+        self.assertEqual([(1, 2), (2, 2)], [(row['dish_id'], row['purchased_amount']) for row in stats])
+
+    def test_customer_similarity_maintained(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=i) for i in range(1, 5)])
+        Solution.add_dishes([createDish(dish_id=i) for i in range(1, 7)])
+        connection = Connector.DBConnector()
+        connection.execute("insert into likes values (1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (3, 1)")
+        connection.close()
+        for dish_id in (3, 4, 5):
+            self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(2, dish_id))
+        self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(4, 6))
+        self.assertEqual([4, 5], Solution.get_potential_dish_recommendations(1))
+        self.assertEqual([], Solution.get_potential_dish_recommendations(3))
+        self.assertEqual(ReturnValue.OK, Solution.customer_dislike_dish(2, 3))
+        self.assertEqual([], Solution.get_potential_dish_recommendations(1))
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(3))
+        connection = Connector.DBConnector()
+        _, pairs = connection.execute("select cust_id, other_id, common_likes from customer_similarity "
+                                      "order by cust_id, other_id")
+        connection.close()
+        self.assertEqual([(1, 2, 2), (2, 1, 2)],
+                         [(row['cust_id'], row['other_id'], row['common_likes']) for row in pairs])
+
+    def test_customer_similarity_concurrent_writers(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=1), createCustomer(cust_id=2)])
+        Solution.add_dishes([createDish(dish_id=i) for i in range(1, 5)])
+        for cust_id in (1, 2):
+            for dish_id in (1, 2):
+                self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(cust_id, dish_id))
+        first_liked = threading.Event()
+        errors = []
+
+        # the first writer commits a moment after the second one liked the same dish
+        def like(cust_id: int, wait: threading.Event) -> None:
+            connection = Connector.DBConnector()
+            try:
+                with connection.transaction():
+                    if wait is not None:
+                        wait.wait(10)
+                    connection.execute("insert into likes values (%s, 3)", params=(cust_id,))
+                    if wait is None:
+                        first_liked.set()
+                        time.sleep(0.5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        writers = [threading.Thread(target=like, args=(1, None)), threading.Thread(target=like, args=(2, first_liked))]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        self.assertEqual([], errors)
+        connection = Connector.DBConnector()
+        _, pairs = connection.execute("select cust_id, other_id, common_likes from customer_similarity "
+                                      "order by cust_id, other_id")
+        connection.close()
+        self.assertEqual([(1, 2, 3), (2, 1, 3)],
+                         [(row['cust_id'], row['other_id'], row['common_likes']) for row in pairs])
+        self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(2, 4))
+        self.assertEqual([4], Solution.get_potential_dish_recommendations(1))
+
+    def test_potential_dish_recommendations_bulk(self) -> None:
+        Solution.add_customers([createCustomer(cust_id=i) for i in range(1, 5)])
+        Solution.add_dishes([createDish(dish_id=i) for i in range(1, 7)])
+        for cust_id, dish_id in ((1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3), (2, 4), (3, 2), (3, 3), (3, 4),
+                                 (3, 5), (3, 6)):
+            self.assertEqual(ReturnValue.OK, Solution.customer_likes_dish(cust_id, dish_id))
+        cust_ids = [3, 1, 2, 4, 9, 1]
+        bulk = list(Solution.get_potential_dish_recommendations_bulk(cust_ids))
+        self.assertEqual(cust_ids, [cust_id for cust_id, _ in bulk])
+        for cust_id, dishes in bulk:
+            self.assertEqual(Solution.get_potential_dish_recommendations(cust_id), dishes)
+        self.assertEqual((1, [4]), bulk[1])
+        self.assertEqual([], list(Solution.get_potential_dish_recommendations_bulk([])))
+
+    def test_unit_of_work(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(createCustomer(1)))
+        for dish_id in range(1, 21):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(createDish(dish_id, price=dish_id)))
+        work = Solution.UnitOfWork()
+        work.add_order(createOrder(1))
+        work.customer_placed_order(1, 1)
+        for dish_id in range(1, 21):
+            work.order_contains_dish(1, dish_id, 2)
+        work.order_contains_dish(1, 1, 2)
+        work.order_contains_dish(1, 99, 2)
+        work.order_contains_dish(1, 2, -1)
+        expected = [ReturnValue.OK] * 22 + [ReturnValue.ALREADY_EXISTS, ReturnValue.NOT_EXISTS, ReturnValue.BAD_PARAMS]
+        self.assertEqual(expected, work.commit())
+        self.assertEqual([], work.commit(), 'the queue is emptied by commit')
+        self.assertEqual(420, Solution.get_order_total_price(1))
+        self.assertEqual(1, Solution.get_customer_that_placed_order(1).get_cust_id())
+        self.assertEqual(20, len(Solution.get_all_order_items(1)))
+
+        work = Solution.UnitOfWork(all_or_nothing=True)
+        work.add_order(createOrder(2))
+        work.customer_placed_order(1, 2)
+        work.order_contains_dish(2, 1, 1)
+        work.order_contains_dish(2, 99, 1)
+        self.assertEqual([ReturnValue.OK] * 3 + [ReturnValue.NOT_EXISTS], work.commit())
+        self.assertIsInstance(Solution.get_order(2), BadOrder)
+        self.assertEqual(420, Solution.get_max_amount_of_money_cust_spent(1))
+
+    # the first times inserts into "order" fail with the given SQLSTATE (the counter is not rolled back)
+    def abort_order_inserts(self, sqlstate: str, times: int) -> None:
+        connection = Connector.DBConnector()
+        connection.execute("create sequence order_aborts")
+        connection.execute("""
+            create function abort_order_insert() returns trigger language plpgsql as $$
+            begin
+                if nextval('order_aborts') <= %d then
+                    raise exception 'aborted' using errcode = '%s';
+                end if;
+                return new;
+            end $$;
+            create trigger abort_order_insert before insert on "order"
+                for each row execute function abort_order_insert();
+            """ % (times, sqlstate))
+        connection.close()
+        self.addCleanup(self.drop_order_aborts)
+
+    def drop_order_aborts(self) -> None:
+        connection = Connector.DBConnector()
+        connection.execute("drop function if exists abort_order_insert() cascade; drop sequence if exists order_aborts")
+        connection.close()
+
+    def test_unit_of_work_aborted(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(createCustomer(1)))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(createDish(1, price=5)))
+        self.abort_order_inserts('40P01', 2)
+        work = Solution.UnitOfWork()
+        work.add_order(createOrder(1))
+        work.customer_placed_order(1, 1)
+        work.order_contains_dish(1, 1, 2)
+        self.assertEqual([ReturnValue.OK] * 3, work.commit(), 'a deadlock victim is run again')
+        self.assertEqual(10, Solution.get_order_total_price(1))
+
+        self.drop_order_aborts()
+        self.abort_order_inserts('40001', 3)
+        work.add_order(createOrder(2))
+        work.customer_placed_order(1, 2)
+        self.assertEqual([ReturnValue.ERROR] * 2, work.commit())
+        self.assertIsInstance(Solution.get_order(2), BadOrder)
+
+        self.drop_order_aborts()
+        self.abort_order_inserts('55P03', 1)
+        work.add_order(createOrder(3))
+        self.assertEqual([ReturnValue.ERROR], work.commit(), 'a lock timeout is not run again')
+        self.assertIsInstance(Solution.get_order(3), BadOrder)
+
+    def test_place_order(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(createCustomer(1)))
+        for dish_id in range(1, 21):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(createDish(dish_id, price=dish_id)))
+        self.assertEqual(ReturnValue.OK, Solution.update_dish_active_status(20, False))
+        lines = [(dish_id, 2) for dish_id in range(1, 21)] + [(1, 3), (99, 1), (2, 0), (3, -1)]
+        status, results, total = Solution.place_order(createOrder(1), 1, lines)
+        self.assertEqual(ReturnValue.OK, status)
+        expected = [ReturnValue.OK] * 19 + [ReturnValue.NOT_EXISTS, ReturnValue.ALREADY_EXISTS,
+                                            ReturnValue.NOT_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.BAD_PARAMS]
+        self.assertEqual(list(zip([dish_id for dish_id, _ in lines], expected)), results)
+        self.assertEqual(380, total)
+        self.assertEqual(380, Solution.get_order_total_price(1))
+        self.assertEqual(380, Solution.get_max_amount_of_money_cust_spent(1))
+        self.assertEqual(19, len(Solution.get_all_order_items(1)))
+
+        self.assertEqual((ReturnValue.ALREADY_EXISTS, [], 0), Solution.place_order(createOrder(1), 1, lines))
+        self.assertEqual((ReturnValue.NOT_EXISTS, [], 0), Solution.place_order(createOrder(2), 2, lines))
+        self.assertIsInstance(Solution.get_order(2), BadOrder)
+        self.assertEqual((ReturnValue.BAD_PARAMS, [], 0), Solution.place_order(createOrder(-3), 1, lines))
+        self.assertEqual((ReturnValue.OK, [], 0), Solution.place_order(createOrder(4), 1, []))
+        self.assertEqual(1, Solution.get_customer_that_placed_order(4).get_cust_id())
+
+    def test_place_order_aborted(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(createCustomer(1)))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(createDish(1, price=5)))
+        self.abort_order_inserts('40P01', 2)
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.OK)], 10), Solution.place_order(createOrder(1), 1, [(1, 2)]))
+        self.assertEqual(1, Solution.get_customer_that_placed_order(1).get_cust_id())
+
+        self.drop_order_aborts()
+        self.abort_order_inserts('40P01', 3)
+        self.assertEqual((ReturnValue.ERROR, [], 0), Solution.place_order(createOrder(2), 1, [(1, 2)]))
+        self.assertIsInstance(Solution.get_order(2), BadOrder)
+
+        self.drop_order_aborts()
+        self.abort_order_inserts('55P03', 1)
+        self.assertEqual((ReturnValue.ERROR, [], 0), Solution.place_order(createOrder(3), 1, [(1, 2)]))
+        self.assertIsInstance(Solution.get_order(3), BadOrder)
 
 # *** DO NOT RUN EACH TEST MANUALLY ***
 if __name__ == '__main__':
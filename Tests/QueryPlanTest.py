@@ -0,0 +1,102 @@
+import datetime
+import unittest
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Config import DatabaseConfig
+
+'''
+    Plans every query template of Solution.py with EXPLAIN on tables filled with [query_plan] rows
+    (QUERY_PLAN_ROWS overrides it) and fails if a query reads one of the tables with a sequential scan
+'''
+
+# queries that aggregate whole tables by design, a sequential scan is the right plan for them
+FULL_SCAN_QUERIES = {
+    'get_non_worth_price_increase',
+    'check_order_totals',
+    'repair_order_totals',
+}
+
+# tables a query may still read sequentially: recommendations for a large batch of customers read the
+# likes of their similar customers in one pass
+SEQ_SCANS_ALLOWED = {
+    'get_potential_dish_recommendations_bulk': ['likes'],
+}
+
+SAMPLE_PARAMS = {
+    'add_customer': (0, 'name', '0500000000', 'Haifa'),
+    'delete_customer': (7,),
+    'add_order': (0, datetime.datetime(2024, 1, 1)),
+    'delete_order': (7,),
+    'add_dish': (0, 'dish', 10, True),
+    'update_dish_price': (12, 7),
+    'update_dish_active_status': (False, 7),
+    'customer_placed_order': (7, 7),
+    'get_customer_that_placed_order': (7,),
+    'order_does_not_contain_dish': (7, 7),
+    'place_order_lines': {'order_id': 7, 'dish_ids': list(range(1, 21)), 'amounts': [1] * 20},
+    'get_all_order_items': (7,),
+    'customer_likes_dish': (7, 7),
+    'customer_dislike_dish': (7, 7),
+    'get_all_customer_likes': (7,),
+    'get_order_total_price': (7,),
+    'get_max_amount_of_money_cust_spent': (7,),
+    'get_most_expensive_anonymous_order': (),
+    'is_most_liked_dish_equal_to_most_purchased': (),
+    'get_customers_ordered_top_5_dishes': (),
+    'get_potential_dish_recommendations': (7, 7),
+    'get_potential_dish_recommendations_bulk': (list(range(1, 1001)),),
+    'get_total_profit_per_month_range': {'from_year': 2021, 'to_year': 2021},
+    'fill_monthly_profit': ([datetime.datetime(2021, month, 1) for month in range(1, 13)],),
+}
+
+
+class QueryPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        rows = int(DatabaseConfig.get('query_plan', required=False).get('rows', 20000))
+        Solution.create_tables()
+        cls.addClassCleanup(Solution.drop_tables)
+        connection = Connector.DBConnector()
+        connection.execute("""
+            insert into customer select n, 'name' || n, '0500000000', 'Haifa' from generate_series(1, %(rows)s) n;
+            insert into dish select n, 'dish' || n, 1 + n %% 50, n %% 7 <> 0 from generate_series(1, %(dishes)s) n;
+            insert into "order" select n, timestamp '2000-01-01' + n * interval '1 day'
+            from generate_series(1, %(rows)s) n;
+            insert into customer_orders select 1 + n %% %(rows)s, n from generate_series(1, %(rows)s, 2) n;
+            insert into dishes_in_order select 1 + (n * 7 + k) %% %(dishes)s, n, k, 1 + k
+            from generate_series(1, %(rows)s) n, generate_series(1, 3) k;
+            insert into likes select n, 1 + (n * 13 + k) %% %(dishes)s
+            from generate_series(1, %(rows)s) n, generate_series(1, 3) k;
+            select monthly_profit_fill(array(select generate_series(timestamp '2000-01-01', localtimestamp,
+                                                                    interval '1 month')));
+            analyze;
+            """, params={'rows': rows, 'dishes': max(rows // 2, 10)})
+        connection.close()
+
+    def test_every_query_has_sample_params(self) -> None:
+        self.assertEqual(set(Solution.QUERIES), set(SAMPLE_PARAMS) | FULL_SCAN_QUERIES)
+
+    def test_no_sequential_scans(self) -> None:
+        connection = Connector.DBConnector()
+        try:
+            for name, params in SAMPLE_PARAMS.items():
+                with self.subTest(query=name):
+                    _, result = connection.execute("explain (format json) " + Solution.QUERIES[name],
+                                                   params=params)
+                    scans = sorted(set(QueryPlanTest.__seq_scans(result[0]['query plan'][0]['Plan']))
+                                   - set(SEQ_SCANS_ALLOWED.get(name, [])))
+                    self.assertEqual([], scans, 'sequential scans in the plan of ' + name)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __seq_scans(node: dict):
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from QueryPlanTest.__seq_scans(child)
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
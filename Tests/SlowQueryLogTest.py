@@ -0,0 +1,94 @@
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+import Solution
+import Utility.DBConnector as Connector
+from Business.Customer import Customer, BadCustomer
+from Utility.Instrumentation import Instrumentation
+from Utility.ReturnValue import ReturnValue
+from Utility.SlowQueryLog import SlowQueryLog
+
+'''
+    Tests for the slow query log (statements over the threshold logged with an EXPLAIN ANALYZE plan)
+'''
+
+
+class SlowQueryLogTest(unittest.TestCase):
+    def setUp(self) -> None:
+        Solution.create_tables()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'slow_queries.log')
+
+    def tearDown(self) -> None:
+        Solution.drop_tables()
+        shutil.rmtree(self.directory)
+
+    def logged(self, log: SlowQueryLog, *calls) -> str:
+        Instrumentation.add_hook(log)
+        try:
+            for call in calls:
+                call()
+        finally:
+            Instrumentation.remove_hook(log)
+            log.close()
+        with open(self.path) as file:
+            return file.read()
+
+    def test_plans_captured(self) -> None:
+        log = SlowQueryLog(enabled=True, threshold=0, path=self.path)
+        text = self.logged(log, lambda: Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa')),
+                           lambda: Solution.get_customer(1), Solution.get_non_worth_price_increase)
+        self.assertIn('s in Solution.get_customer\nstatement: get_customer: select * from customer where cust_id = $1\n'
+                      'parameters: (1,)\nplan:\n', text)
+        self.assertIn('Index Scan using customer_pkey on customer', text)
+        self.assertIn('s in Solution.get_non_worth_price_increase\n', text)
+        self.assertIn('Execution Time', text, 'the plans are EXPLAIN ANALYZE plans')
+        self.assertIn('(EXPLAIN ANALYZE failed: duplicate key value violates unique constraint', text,
+                      'the customer exists when the insert is analyzed again')
+        self.assertIn('Insert on customer', text)
+        self.assertEqual({'logged': 3, 'dropped': 0, 'explain_failures': 1, 'pending': 0}, log.stats())
+
+    def test_analyzed_write_rolled_back(self) -> None:
+        log = SlowQueryLog(enabled=True, threshold=0, path=self.path)
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', '0502220000', 'Haifa')))
+        text = self.logged(log, lambda: Solution.delete_customer(1))
+        self.assertIn('Delete on customer', text)
+        self.assertIn('actual time', text)
+        self.assertIsInstance(Solution.get_customer(1), BadCustomer)
+
+    def test_threshold(self) -> None:
+        log = SlowQueryLog(enabled=True, threshold=0.2, path=self.path, explain=False)
+
+        def slow():
+            connection = Connector.DBConnector()
+            connection.execute("select pg_sleep(%s)", params=(0.3,), read_only=True)
+            connection.close()
+        text = self.logged(log, lambda: Solution.get_customer(1), slow)
+        self.assertNotIn('get_customer', text)
+        self.assertIn('statement: select pg_sleep(%s)\nparameters: (0.3,)\n', text)
+        self.assertNotIn('plan:', text)
+
+    def test_not_explained(self) -> None:
+        log = SlowQueryLog(enabled=True, threshold=0, path=self.path)
+        text = self.logged(log, Solution.clear_tables)
+        self.assertIn('(not captured: only a single SELECT, INSERT, UPDATE or DELETE statement is explained)', text)
+
+    def test_rotation(self) -> None:
+        log = SlowQueryLog(enabled=True, threshold=0, path=self.path, max_bytes=1000, backup_count=2, explain=False)
+        self.logged(log, *[lambda: Solution.get_customer(1)] * 30)
+        self.assertEqual(3, len(glob.glob(self.path + '*')), 'the log and 2 rotated files')
+
+    def test_disabled(self) -> None:
+        log = SlowQueryLog(enabled=False, threshold=0, path=self.path)
+        Instrumentation.add_hook(log)
+        Solution.get_customer(1)
+        Instrumentation.remove_hook(log)
+        log.close()
+        self.assertFalse(os.path.exists(self.path))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
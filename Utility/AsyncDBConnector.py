@@ -0,0 +1,291 @@
+import asyncio
+import os
+import time
+import weakref
+from collections import deque
+from typing import Optional, Union
+import psycopg2
+from psycopg2 import errors, extensions, sql
+from Utility.Config import DatabaseConfig
+from Utility.ConnectionPool import PooledConnection
+from Utility.DBConnector import DBConnector, ResultSet, _violations
+from Utility.Exceptions import DatabaseException
+from Utility.Instrumentation import Instrumentation, QueryEvent
+
+
+# wait for the current operation of an asynchronous connection without blocking the event loop
+async def _wait(conn: PooledConnection) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            add, remove = loop.add_reader, loop.remove_reader
+        elif state == extensions.POLL_WRITE:
+            add, remove = loop.add_writer, loop.remove_writer
+        else:
+            raise psycopg2.OperationalError("Unexpected poll state %s" % state)
+        ready = loop.create_future()
+        fileno = conn.fileno()
+        add(fileno, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        except asyncio.CancelledError:
+            # stop the statement on the server too, the connection is discarded when it is returned
+            conn.cancel()
+            raise
+        finally:
+            remove(fileno)
+
+
+# pool of asynchronous psycopg2 connections for one event loop. At most maxconn connections are
+# open, a coroutine waits (without blocking the loop) for at most timeout seconds for a free one,
+# connections are replaced after max_lifetime seconds, and a connection idle for more than ping_after
+# seconds is checked with a round trip before it is handed out (as ConnectionPool does).
+# Asynchronous connections are always in autocommit mode: every statement commits on its own
+class AsyncConnectionPool:
+    # constructor
+    def __init__(self, params: dict, maxconn: int = 10, max_lifetime: float = 3600.0, ping_after: float = 30.0,
+                 timeout: float = 30.0):
+        if maxconn < 1:
+            raise ValueError("Invalid pool size")
+        self.params = params
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self.__idle = deque()
+        self.__slots = asyncio.Semaphore(maxconn)
+        self.__in_use = 0
+        self.__closed = False
+        self.__stats = {"created": 0, "closed": 0, "checkouts": 0, "returns": 0, "timeouts": 0, "expired": 0,
+                        "failed_health_checks": 0}
+
+    # get a connection from the pool, opening a new one if none is idle
+    async def getconn(self) -> PooledConnection:
+        if self.__closed:
+            raise DatabaseException.ConnectionInvalid("Connection pool is closed")
+        try:
+            await asyncio.wait_for(self.__slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.__stats["timeouts"] += 1
+            raise DatabaseException.ConnectionInvalid("Connection pool exhausted")
+        now = time.monotonic()
+        try:
+            while self.__idle:
+                conn = self.__idle.pop()
+                if conn.closed:
+                    self.__discard(conn)
+                elif now - conn.created_at > self.max_lifetime:
+                    self.__stats["expired"] += 1
+                    self.__discard(conn)
+                elif await self.__healthy(conn):
+                    return self.__checkout(conn)
+                else:
+                    self.__stats["failed_health_checks"] += 1
+                    self.__discard(conn)
+            conn = psycopg2.connect(async_=True, connection_factory=PooledConnection, **self.params)
+            await _wait(conn)
+        except BaseException:
+            self.__slots.release()
+            raise
+        self.__stats["created"] += 1
+        return self.__checkout(conn)
+
+    # give a connection back to the pool. A connection that is still executing (its coroutine was
+    # cancelled while waiting for the server) is closed
+    def putconn(self, conn: PooledConnection, discard: bool = False) -> None:
+        self.__in_use -= 1
+        self.__stats["returns"] += 1
+        if discard or conn.closed or self.__closed or conn.isexecuting():
+            self.__discard(conn)
+        else:
+            conn.last_used = time.monotonic()
+            self.__idle.append(conn)
+        self.__slots.release()
+
+    # close every idle connection, connections in use are closed when they are returned
+    def closeall(self) -> None:
+        self.__closed = True
+        while self.__idle:
+            self.__discard(self.__idle.pop())
+
+    # pool statistics for monitoring
+    def stats(self) -> dict:
+        stats = dict(self.__stats)
+        stats.update(idle=len(self.__idle), in_use=self.__in_use, size=len(self.__idle) + self.__in_use,
+                     maxconn=self.maxconn)
+        return stats
+
+    async def __healthy(self, conn: PooledConnection) -> bool:
+        if time.monotonic() - conn.last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("select 1")
+                await _wait(conn)
+            return True
+        except asyncio.CancelledError:
+            self.__discard(conn)
+            raise
+        except Exception:
+            return False
+
+    def __checkout(self, conn: PooledConnection) -> PooledConnection:
+        self.__in_use += 1
+        self.__stats["checkouts"] += 1
+        conn.last_used = time.monotonic()
+        return conn
+
+    def __discard(self, conn: PooledConnection) -> None:
+        self.__stats["closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# asyncio counterpart of DBConnector, drawing from a pool of the running event loop (configured by the
+# [pool] section of database.ini and DBConnector.configure_pool). Use it as an async context manager:
+#   async with AsyncDBConnector() as connection:
+#       rows_effected, result = await connection.execute(query, params=(...))
+class AsyncDBConnector:
+    __pools = weakref.WeakKeyDictionary()
+
+    # constructor
+    def __init__(self):
+        self.connection = None
+        self.__connection_pool = None
+
+    async def __aenter__(self) -> 'AsyncDBConnector':
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    # take a connection from the pool
+    async def open(self) -> 'AsyncDBConnector':
+        try:
+            self.__connection_pool = AsyncDBConnector.__get_pool()
+            self.connection = await self.__connection_pool.getconn()
+        except DatabaseException.ConnectionInvalid:
+            raise
+        except Exception:
+            raise DatabaseException.ConnectionInvalid("Could not connect to database")
+        return self
+
+    # return the connection to the pool
+    def close(self) -> None:
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            self.__connection_pool.putconn(connection)
+
+    # statistics of the running event loop's pool, None if no pool was created yet
+    @staticmethod
+    def pool_stats() -> Optional[dict]:
+        entry = AsyncDBConnector.__pools.get(asyncio.get_running_loop())
+        return None if entry is None else entry[1].stats()
+
+    # the pool of the running event loop, created again when database.ini changes and in a forked child
+    @staticmethod
+    def __get_pool() -> AsyncConnectionPool:
+        loop = asyncio.get_running_loop()
+        key = (os.getpid(), DatabaseConfig.generation())
+        entry = AsyncDBConnector.__pools.get(loop)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        if entry is not None and entry[0][0] == os.getpid():
+            entry[1].closeall()
+        settings = DBConnector.pool_settings()
+        pool = AsyncConnectionPool(DatabaseConfig.get(), maxconn=settings["maxconn"],
+                                   max_lifetime=settings["max_lifetime"], ping_after=settings["ping_after"],
+                                   timeout=settings["timeout"])
+        AsyncDBConnector.__pools[loop] = (key, pool)
+        return pool
+
+    # executes the query, if it is SELECT you may ask to print the results with printSchema
+    # params are the values of the query's %s placeholders (if any)
+    # returns the number of rows effected and a ResultSet (for SELECT)
+    async def execute(self, query: Union[str, sql.Composed], printSchema=False, params=None) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if not Instrumentation.hooks:
+            return await self.__execute(query, printSchema, params)
+        statement = query if isinstance(query, str) else query.as_string(self.connection)
+        with Instrumentation.measure(statement, params) as event:
+            return await self.__execute(query, printSchema, params, event)
+
+    async def __execute(self, query: Union[str, sql.Composed], printSchema: bool, params,
+                        event: Optional[QueryEvent] = None) -> (int, ResultSet):
+        with self.connection.cursor() as cursor:
+            with _violations():
+                cursor.execute(query, params)
+                await _wait(self.connection)
+            return AsyncDBConnector.__result(cursor, printSchema, event)
+
+    # executes a statement registered with DBConnector.register_statement, PREPAREd once per connection
+    # returns the number of rows effected and a ResultSet (for SELECT)
+    async def execute_prepared(self, name: str, params: tuple = (), printSchema=False) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if not Instrumentation.hooks:
+            return await self.__execute_prepared(name, params, printSchema)
+        with Instrumentation.measure(name, params, prepared=True) as event:
+            return await self.__execute_prepared(name, params, printSchema, event)
+
+    async def __execute_prepared(self, name: str, params: tuple, printSchema: bool,
+                                 event: Optional[QueryEvent] = None) -> (int, ResultSet):
+        execute = sql.SQL("execute {name} ({params})" if params else "execute {name}").format(
+            name=sql.Identifier(name), params=sql.SQL(', ').join(sql.Placeholder() * len(params)))
+        with self.connection.cursor() as cursor:
+            with _violations():
+                try:
+                    await self.__prepare(cursor, name)
+                    cursor.execute(execute, params)
+                    await _wait(self.connection)
+                except (errors.FeatureNotSupported, errors.InvalidSqlStatementName):
+                    # the prepared plan no longer matches the schema (or was deallocated), prepare it again
+                    await self.__prepare(cursor, name, replace=True)
+                    cursor.execute(execute, params)
+                    await _wait(self.connection)
+            return AsyncDBConnector.__result(cursor, printSchema, event)
+
+    async def __prepare(self, cursor, name: str, replace: bool = False) -> None:
+        query = DBConnector.statement(name)
+        prepared = self.connection.prepared
+        if not replace and prepared.get(name) == query:
+            return
+        if name in prepared:
+            prepared.pop(name)
+            try:
+                cursor.execute(sql.SQL("deallocate {name}").format(name=sql.Identifier(name)))
+                await _wait(self.connection)
+            except errors.InvalidSqlStatementName:
+                pass
+        cursor.execute(sql.SQL("prepare {name} as {query}").format(name=sql.Identifier(name), query=sql.SQL(query)))
+        await _wait(self.connection)
+        prepared[name] = query
+
+    # the number of rows effected and the ResultSet of the statement just run on cursor, recorded in event
+    # for the instrumentation hooks
+    @staticmethod
+    def __result(cursor, printSchema: bool, event: Optional[QueryEvent]) -> (int, ResultSet):
+        row_effected, entries = max(cursor.rowcount, 0), AsyncDBConnector.__entries(cursor, printSchema)
+        if event is not None:
+            event.done(cursor.statusmessage, row_effected, entries.rows)
+        return row_effected, entries
+
+    # get entries in case of SELECT
+    @staticmethod
+    def __entries(cursor, printSchema: bool) -> ResultSet:
+        if cursor.description is not None:
+            entries = ResultSet(cursor.description, cursor.fetchall())
+        else:
+            entries = ResultSet()
+
+        # print SELECT entries
+        if printSchema:
+            print(entries)
+
+        return entries
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from configparser import ConfigParser
+from typing import List, Optional
+from Utility.Exceptions import DatabaseException
+
+
+# database.ini loader: the file is located and parsed once per process and served from memory.
+# The file's mtime is checked at most every check_interval seconds and the file is parsed again
+# when it changed. Environment variables override values from the file:
+#   DATABASE_INI                    path of the configuration file
+#   DATABASE_INI_<SECTION>_<KEY>    value of key in section, e.g. DATABASE_INI_POSTGRESQL_PASSWORD or
+#                                   DATABASE_INI_POOL_MAXCONN (other variables, e.g. POSTGRESQL_VERSION
+#                                   set by a container image, are not taken)
+class DatabaseConfig:
+    filename = 'database.ini'
+    environment_prefix = 'DATABASE_INI_'
+    check_interval = 1.0
+    __lock = threading.Lock()
+    __path = None
+    __file_mtime = None
+    __sections = None
+    __merged = {}
+    __next_check = 0.0
+    __generation = 0
+
+    # a copy of the section's parameters, an empty dict if the section is missing and not required
+    @staticmethod
+    def get(section: str = 'postgresql', required: bool = True) -> dict:
+        # the sections and the values merged from them are read (or parsed again) together
+        with DatabaseConfig.__lock:
+            sections = DatabaseConfig.__refresh()
+            merged = DatabaseConfig.__merged
+            if section not in merged:
+                merged[section] = DatabaseConfig.__with_environment(section, sections.get(section))
+            params = merged[section]
+        if params is None:
+            if required:
+                raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
+            return {}
+        return dict(params)
+
+    # counter that changes every time the configuration is parsed again
+    @staticmethod
+    def generation() -> int:
+        DatabaseConfig.__load()
+        return DatabaseConfig.__generation
+
+    # path of the configuration file in use, None if no file was found
+    @staticmethod
+    def path() -> Optional[str]:
+        DatabaseConfig.__load()
+        return DatabaseConfig.__path
+
+    # drop the cached configuration, the file is located and parsed again on next use
+    @staticmethod
+    def reload() -> None:
+        with DatabaseConfig.__lock:
+            DatabaseConfig.__sections = None
+            DatabaseConfig.__path = None
+
+    @staticmethod
+    def __load() -> dict:
+        sections = DatabaseConfig.__sections
+        if sections is not None and time.monotonic() < DatabaseConfig.__next_check:
+            return sections
+        with DatabaseConfig.__lock:
+            return DatabaseConfig.__refresh()
+
+    # the parsed sections, parsed again if the file changed. Called with the lock held
+    @staticmethod
+    def __refresh() -> dict:
+        now = time.monotonic()
+        if DatabaseConfig.__sections is not None and now < DatabaseConfig.__next_check:
+            return DatabaseConfig.__sections
+        path = DatabaseConfig.__path
+        mtime = DatabaseConfig.__stat_mtime(path) if path is not None else None
+        if path is None or mtime is None:
+            path = DatabaseConfig.__resolve()
+            mtime = DatabaseConfig.__stat_mtime(path) if path is not None else None
+        if (DatabaseConfig.__sections is None or path != DatabaseConfig.__path
+                or mtime != DatabaseConfig.__file_mtime):
+            DatabaseConfig.__sections = DatabaseConfig.__parse(path)
+            DatabaseConfig.__merged = {}
+            DatabaseConfig.__path = path
+            DatabaseConfig.__file_mtime = mtime
+            DatabaseConfig.__generation += 1
+        DatabaseConfig.__next_check = now + DatabaseConfig.check_interval
+        return DatabaseConfig.__sections
+
+    # the first existing file among $DATABASE_INI, ./Utility/database.ini, ../Utility/database.ini
+    # and the database.ini next to this module
+    @staticmethod
+    def __resolve() -> Optional[str]:
+        for candidate in DatabaseConfig.__candidates():
+            if os.path.isfile(candidate):
+                return os.path.abspath(candidate)
+        return None
+
+    @staticmethod
+    def __candidates() -> List[str]:
+        candidates = []
+        if os.environ.get('DATABASE_INI'):
+            candidates.append(os.environ['DATABASE_INI'])
+        candidates.append(os.path.join(os.getcwd(), 'Utility', DatabaseConfig.filename))
+        candidates.append(os.path.join(os.path.dirname(os.getcwd()), 'Utility', DatabaseConfig.filename))
+        candidates.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), DatabaseConfig.filename))
+        return candidates
+
+    @staticmethod
+    def __parse(path: Optional[str]) -> dict:
+        parser = ConfigParser()
+        if path is not None:
+            parser.read(path)
+        return {section: dict(parser.items(section)) for section in parser.sections()}
+
+    @staticmethod
+    def __with_environment(section: str, params: Optional[dict]) -> Optional[dict]:
+        prefix = DatabaseConfig.environment_prefix + section.upper() + '_'
+        params = None if params is None else dict(params)
+        for name, value in os.environ.items():
+            if name.startswith(prefix) and len(name) > len(prefix):
+                params = {} if params is None else params
+                params[name[len(prefix):].lower()] = value
+        return params
+
+    @staticmethod
+    def __stat_mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+import psycopg2
+from psycopg2 import extensions
+from Utility.Exceptions import DatabaseException
+
+
+# psycopg2 connection that remembers when it was opened and last handed out by the pool (and to
+# which thread), and which statements were prepared on it (name -> query)
+class PooledConnection(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.owner = None
+        self.prepared = {}
+
+
+class ConnectionPool:
+    # constructor
+    # minconn connections are kept open, at most maxconn are open at the same time.
+    # idle connections above minconn are closed after max_idle seconds, every connection is
+    # replaced after max_lifetime seconds, and a connection idle for more than ping_after seconds
+    # is checked with a round trip before it is handed out.
+    def __init__(self, params: dict, minconn: int = 1, maxconn: int = 10, max_idle: float = 300.0,
+                 max_lifetime: float = 3600.0, ping_after: float = 30.0, timeout: float = 30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size")
+        self.params = params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.__idle = deque()
+        self.__in_use = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__stats = {"created": 0, "closed": 0, "checkouts": 0, "returns": 0, "waits": 0, "timeouts": 0,
+                        "failed_health_checks": 0, "evicted_idle": 0, "expired": 0}
+
+    # get a connection from the pool, opening a new one if none is idle and the pool is not full.
+    # A thread gets back the connection it used last if that one is idle
+    def getconn(self) -> PooledConnection:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = self.__reserve(deadline)
+            if conn is None:
+                break
+            # checked outside of the lock so a server that does not answer does not block other threads
+            if self.__healthy(conn):
+                with self.__condition:
+                    return self.__checkout(conn)
+            with self.__condition:
+                self.__stats["failed_health_checks"] += 1
+                self.__discard(conn)
+                self.__in_use -= 1
+                self.__condition.notify()
+        # connect outside of the lock so a slow handshake does not block other threads
+        try:
+            conn = self.__connect()
+        except Exception:
+            with self.__condition:
+                self.__in_use -= 1
+                self.__condition.notify()
+            raise
+        with self.__condition:
+            self.__stats["checkouts"] += 1
+        conn.owner = threading.get_ident()
+        return conn
+
+    # give a connection back to the pool, its open transaction (if any) is rolled back
+    def putconn(self, conn: PooledConnection, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self.__condition:
+            self.__in_use -= 1
+            self.__stats["returns"] += 1
+            now = time.monotonic()
+            if discard or conn.closed or self.__closed:
+                self.__discard(conn)
+            elif now - conn.created_at > self.max_lifetime:
+                self.__stats["expired"] += 1
+                self.__discard(conn)
+            else:
+                conn.last_used = now
+                self.__idle.append(conn)
+            self.__condition.notify()
+
+    # close every idle connection, connections in use are closed when they are returned
+    def closeall(self) -> None:
+        with self.__condition:
+            self.__closed = True
+            while self.__idle:
+                self.__discard(self.__idle.pop())
+            self.__condition.notify_all()
+
+    # pool statistics for monitoring
+    def stats(self) -> dict:
+        with self.__condition:
+            stats = dict(self.__stats)
+            stats.update(idle=len(self.__idle), in_use=self.__in_use, size=len(self.__idle) + self.__in_use,
+                         minconn=self.minconn, maxconn=self.maxconn)
+        return stats
+
+    def __connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.params)
+        conn.autocommit = False
+        with self.__condition:
+            self.__stats["created"] += 1
+        return conn
+
+    # take a slot for the caller: an idle connection, or None if a new connection may be opened.
+    # Either way the slot counts as in use until the connection is given back
+    def __reserve(self, deadline: float) -> Optional[PooledConnection]:
+        with self.__condition:
+            while True:
+                if self.__closed:
+                    raise DatabaseException.ConnectionInvalid("Connection pool is closed")
+                self.__evict()
+                if self.__idle or self.__in_use < self.maxconn:
+                    self.__in_use += 1
+                    return self.__take_idle() if self.__idle else None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.__stats["timeouts"] += 1
+                    raise DatabaseException.ConnectionInvalid("Connection pool exhausted")
+                self.__stats["waits"] += 1
+                self.__condition.wait(remaining)
+
+    def __checkout(self, conn: PooledConnection) -> PooledConnection:
+        self.__stats["checkouts"] += 1
+        conn.last_used = time.monotonic()
+        conn.owner = threading.get_ident()
+        return conn
+
+    # the idle connection last used by the calling thread, else the most recently returned one
+    def __take_idle(self) -> PooledConnection:
+        owner = threading.get_ident()
+        for index in range(len(self.__idle) - 1, -1, -1):
+            if self.__idle[index].owner == owner:
+                conn = self.__idle[index]
+                del self.__idle[index]
+                return conn
+        return self.__idle.pop()
+
+    def __healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("select 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # close idle connections that expired or stayed idle for too long (keeping minconn open)
+    def __evict(self) -> None:
+        now = time.monotonic()
+        kept = deque()
+        while self.__idle:
+            conn = self.__idle.popleft()
+            if now - conn.created_at > self.max_lifetime:
+                self.__stats["expired"] += 1
+                self.__discard(conn)
+            elif now - conn.last_used > self.max_idle and len(kept) + len(self.__idle) + self.__in_use >= self.minconn:
+                self.__stats["evicted_idle"] += 1
+                self.__discard(conn)
+            else:
+                kept.append(conn)
+        self.__idle = kept
+
+    def __discard(self, conn: PooledConnection) -> None:
+        self.__stats["closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,9 +1,40 @@
 import psycopg2
-from psycopg2 import errors, sql
-from configparser import ConfigParser
+from psycopg2 import errors, extensions, sql
+from Utility.Config import DatabaseConfig
+from Utility.ConnectionPool import ConnectionPool, PooledConnection
 from Utility.Exceptions import DatabaseException
+from Utility.Instrumentation import Instrumentation, QueryEvent
+import csv
+import io
+import itertools
 import os
-from typing import Union
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Union
+
+
+# PostgreSQL type OIDs used to type exported columns
+BOOLEAN_OID = 16
+NUMERIC_OID = 1700
+INTEGER_OIDS = (20, 21, 23)
+FLOAT_OIDS = (700, 701, NUMERIC_OID)
+DATETIME_OIDS = {1082: 'datetime64[D]', 1114: 'datetime64[us]'}
+
+
+# translate constraint violations to DatabaseException
+@contextmanager
+def _violations():
+    try:
+        yield
+    except errors.lookup("23502"):
+        raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
+    except errors.lookup("23503"):
+        raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
+    except errors.lookup("23505"):
+        raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
+    except errors.lookup("23514"):
+        raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
 
 
 class ResultSetDict(dict):
@@ -13,11 +44,92 @@ class ResultSetDict(dict):
         return super().__getitem__(item.lower())
 
 
+# a row of a ResultSet: a view over the fetched tuple that shares the column index of its ResultSet,
+# so no per-row dict is built. Supports the read-only dict interface of ResultSetDict
+class ResultSetRow:
+    __slots__ = ('__values', '__cols', '__header')
+
+    def __init__(self, values: tuple, cols: ResultSetDict, header: list):
+        self.__values = values
+        self.__cols = cols
+        self.__header = header
+
+    def __getitem__(self, item):
+        if type(item) is not str:
+            return None
+        return self.__values[dict.__getitem__(self.__cols, item.lower())]
+
+    def get(self, item, default=None):
+        try:
+            return self[item]
+        except KeyError:
+            return default
+
+    def __contains__(self, item):
+        return type(item) is str and item.lower() in self.__cols
+
+    # iterating a row gives its column names, like iterating a dict
+    def __iter__(self):
+        return iter(self.__header)
+
+    def __len__(self):
+        return len(self.__header)
+
+    def keys(self):
+        return list(self.__header)
+
+    def values(self):
+        return list(self.__values)
+
+    def items(self):
+        return list(zip(self.__header, self.__values))
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.__header, self.__values))
+
+    def __eq__(self, other):
+        if isinstance(other, ResultSetRow):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+# a column of a ResultSet: a read-only sequence that reads the fetched tuples in place
+class ResultSetColumn:
+    __slots__ = ('__rows', '__index')
+
+    def __init__(self, rows: list, index: int):
+        self.__rows = rows
+        self.__index = index
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [values[self.__index] for values in self.__rows[row]]
+        return self.__rows[row][self.__index]
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __iter__(self):
+        index = self.__index
+        for values in self.__rows:
+            yield values[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class ResultSet:
     # constructor
     def __init__(self, description=None, results=None):
         self.rows = []
         self.cols_header = []
+        self.cols_types = []
         self.cols = ResultSetDict()
         self.__fromQuery(description, results)
 
@@ -26,6 +138,10 @@ class ResultSet:
             return [x[self.cols[idx]] for x in self.rows]
         return self.__getRow(idx)
 
+    # the values of a column without copying them (result['col'] builds a list)
+    def column(self, col: str) -> ResultSetColumn:
+        return ResultSetColumn(self.rows, self.cols[col]) if self.rows else ResultSetColumn([], 0)
+
     # so you can use print(ResultSet)
     def __str__(self):
         string = ""
@@ -39,8 +155,9 @@ class ResultSet:
         return string
 
     def __iter__(self):
-        for row in range(len(self.rows)):
-            yield self.__getRow(row)
+        cols, header = self.cols, self.cols_header
+        for values in self.rows:
+            yield ResultSetRow(values, cols, header)
 
     # what is the size of the ResultSet?
     def size(self):
@@ -54,80 +171,516 @@ class ResultSet:
         if len(self.rows) <= row:
             print('Invalid row ' + str(row))
             return ResultSetDict()
-        row_to_return = ResultSetDict()
-        for val, col in zip(self.rows[row], self.cols_header):
-            row_to_return[col] = val
-        return row_to_return
+        return ResultSetRow(self.rows[row], self.cols, self.cols_header)
+
+    # columns as {name: list of values}, numeric (Decimal) values are converted to float
+    def to_columns(self, decimal_to_float: bool = True) -> Dict[str, list]:
+        values = list(zip(*self.rows)) if self.rows else [()] * len(self.cols_header)
+        columns = {}
+        for col, type_code, column in zip(self.cols_header, self.cols_types, values):
+            if decimal_to_float and type_code == NUMERIC_OID:
+                columns[col] = [None if val is None else float(val) for val in column]
+            else:
+                columns[col] = list(column)
+        return columns
+
+    # columns as {name: numpy array} typed by the column's PostgreSQL type: integers as int64
+    # (float64 if the column has NULLs), numeric and floating point as float64 (NULL is nan),
+    # booleans as bool, dates and timestamps as datetime64 (NULL is NaT), anything else as object
+    def to_numpy(self) -> dict:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("ResultSet.to_numpy requires numpy")
+        size = len(self.rows)
+        values = list(zip(*self.rows)) if self.rows else [()] * len(self.cols_header)
+        arrays = {}
+        for col, type_code, column in zip(self.cols_header, self.cols_types, values):
+            has_nulls = None in column
+            if type_code in FLOAT_OIDS or (type_code in INTEGER_OIDS and has_nulls):
+                if has_nulls:
+                    column = [numpy.nan if val is None else val for val in column]
+                arrays[col] = numpy.fromiter(column, dtype=numpy.float64, count=size)
+            elif type_code in INTEGER_OIDS:
+                arrays[col] = numpy.fromiter(column, dtype=numpy.int64, count=size)
+            elif type_code == BOOLEAN_OID and not has_nulls:
+                arrays[col] = numpy.fromiter(column, dtype=numpy.bool_, count=size)
+            elif type_code in DATETIME_OIDS:
+                arrays[col] = numpy.array(column, dtype=DATETIME_OIDS[type_code])
+            else:
+                arrays[col] = numpy.array(column, dtype=object)
+        return arrays
 
     def __fromQuery(self, description, results: list):
-        if results is None or len(results) == 0:  # no results
-            self.cols = ResultSetDict()
-        else:
-            self.rows = results.copy()
+        self.cols = ResultSetDict()
+        if description is not None:
             self.cols_header = [d.name for d in description]
-            self.cols = ResultSetDict()
-            for col, index in zip(self.cols_header, range(len(results[0]))):
-                self.cols[col] = index
+            self.cols_types = [d.type_code for d in description]
+            for index, col in enumerate(self.cols_header):
+                self.cols[col.lower()] = index
+        if results is not None:
+            self.rows = results
+
+
+# ResultSet of a server-side cursor: rows are fetched itersize at a time while iterating,
+# so the whole result is never held in memory. It can be iterated once.
+class StreamingResultSet:
+    def __init__(self, connector, cursor):
+        self.__connector = connector
+        self.__cursor = cursor
+        self.cols_header = []
+        self.cols = ResultSetDict()
+
+    def __iter__(self):
+        cursor = self.__cursor
+        if cursor is None or cursor.closed:
+            return
+        try:
+            with _violations():
+                for row in cursor:
+                    if not self.cols_header:
+                        self.__read_header(cursor.description)
+                    yield ResultSetRow(row, self.cols, self.cols_header)
+        finally:
+            self.close()
+        # the cursor lives in its own transaction, end it once the result was read
+        self.__connector.commit()
+
+    # stop reading, the rest of the result is discarded
+    def close(self):
+        if self.__cursor is not None and not self.__cursor.closed:
+            self.__cursor.close()
+
+    def __read_header(self, description):
+        self.cols_header = [d.name for d in description]
+        for index, col in enumerate(self.cols_header):
+            self.cols[col.lower()] = index
+
+
+# file-like object that renders an iterable of rows as CSV on demand, for COPY ... FROM STDIN
+class CSVRowStream:
+    def __init__(self, rows):
+        self.__rows = iter(rows)
+        self.__buffer = io.StringIO()
+        self.__writer = csv.writer(self.__buffer, lineterminator='\n')
+        self.__pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.__pending) < size:
+            row = next(self.__rows, None)
+            if row is None:
+                break
+            self.__writer.writerow(row)
+            self.__pending += self.__buffer.getvalue()
+            self.__buffer.seek(0)
+            self.__buffer.truncate()
+        if size < 0:
+            size = len(self.__pending)
+        chunk, self.__pending = self.__pending[:size], self.__pending[size:]
+        return chunk
 
 
 class DBConnector:
+    # process-wide connection pool, DBConnector() draws from it and close() returns to it.
+    # The settings come from the [pool] section of database.ini, configure_pool() overrides them.
+    pool_defaults = {"enabled": True, "minconn": 1, "maxconn": 10, "max_idle": 300.0, "max_lifetime": 3600.0,
+                     "ping_after": 30.0, "timeout": 30.0}
+    # read-only connectors are routed to the replicas named in the [replicas] section (see replica_settings)
+    replica_defaults = {"names": "", "max_staleness": 5.0, "check_interval": 1.0}
+    __pool_overrides = {}
+    __pools = {}
+    __pool_key = None
+    __pool_lock = threading.Lock()
+    __replica_state = {}
+    __replica_turn = itertools.count()
+    __replica_stats = {"reads": 0, "replica_reads": 0, "fallbacks": 0}
+    __stream_ids = itertools.count()
+    __statements = {}
+
     # constructor
-    def __init__(self):
+    # read_only=True asks for a connection to a replica (only for queries that change nothing). It is
+    # a connection to the primary if no replica is configured, reachable and up to date
+    def __init__(self, read_only: bool = False):
+        self.connection = None
+        self.cursor = None
+        self.replica = None
+        self.__connection_pool = None
+        # a connector shared by several threads runs one statement at a time
+        self.__lock = threading.RLock()
+        self.__in_transaction = False
+        self.__savepoint = False
         try:
-            # Obtain the configuration parameters
-            params = DBConnector.__config()
-            self.connection = psycopg2.connect(**params)
-            self.connection.autocommit = False
+            if read_only:
+                self.__connect_replica()
+            if self.connection is None:
+                self.__connection_pool, self.connection = DBConnector.__connect('postgresql')
             self.cursor = self.connection.cursor()
         except Exception as e:
-            self.connection = None
-            self.cursor = None
+            self.close()
             raise DatabaseException.ConnectionInvalid("Could not connect to database")
 
-    # close connection
+    # close connection (a pooled connection is returned to the pool)
     def close(self):
-        if self.cursor is not None:
-            self.cursor.close()
-        if self.connection is not None:
-            self.connection.close()
+        with self.__lock:
+            if self.cursor is not None:
+                try:
+                    self.cursor.close()
+                except Exception:
+                    pass
+                self.cursor = None
+            if self.connection is not None:
+                connection, self.connection = self.connection, None
+                if self.__connection_pool is not None:
+                    self.__connection_pool.putconn(connection)
+                else:
+                    connection.close()
 
-    # commit connection's changes
-    def commit(self):
-        if self.connection is not None:
+    # return the connection to the pool even if close() was never called
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    # override the pool settings of database.ini (configure_pool() with no arguments drops the overrides),
+    # the current pool is closed and a new one is created on next use
+    @staticmethod
+    def configure_pool(**settings):
+        for key in settings:
+            if key not in DBConnector.pool_defaults:
+                raise ValueError("Unknown pool setting " + key)
+        with DBConnector.__pool_lock:
+            DBConnector.__pool_overrides = dict(settings)
+            DBConnector.__pool_key = None
+
+    # effective pool settings: defaults, then database.ini, then configure_pool() overrides
+    @staticmethod
+    def pool_settings() -> dict:
+        settings = dict(DBConnector.pool_defaults)
+        for key, value in DBConnector.__config(section='pool', required=False).items():
+            if key in settings:
+                default = settings[key]
+                if type(default) is bool:
+                    settings[key] = value.strip().lower() in ('1', 'true', 'yes', 'on')
+                else:
+                    settings[key] = type(default)(value)
+        settings.update(DBConnector.__pool_overrides)
+        return settings
+
+    # statistics of the process-wide pool of the primary (or of the named replica), None if pooling is
+    # disabled or no pool was created yet
+    @staticmethod
+    def pool_stats(replica: Optional[str] = None) -> Optional[dict]:
+        pool = DBConnector.__pools.get(replica or 'postgresql')
+        return None if pool is None else pool.stats()
+
+    # effective replica settings: defaults, then the [replicas] section of database.ini.
+    # names is a comma separated list of sections holding the connection parameters of the replicas
+    # (parameters missing there are taken from [postgresql]). A replica is not used while it lags
+    # more than max_staleness seconds behind the primary or cannot be reached; its lag is checked
+    # at most every check_interval seconds
+    @staticmethod
+    def replica_settings() -> dict:
+        settings = dict(DBConnector.replica_defaults)
+        for key, value in DBConnector.__config(section='replicas', required=False).items():
+            if key in settings:
+                settings[key] = type(settings[key])(value)
+        settings["names"] = [name.strip() for name in settings["names"].split(",") if name.strip()]
+        return settings
+
+    # routing statistics of read-only connectors, and the last known lag (in seconds, None if the
+    # replica or the primary could not be reached, inf if it is unknown) of every replica
+    @staticmethod
+    def replica_stats() -> dict:
+        with DBConnector.__pool_lock:
+            stats = dict(DBConnector.__replica_stats)
+            stats["lag"] = {name: state[1] for name, state in DBConnector.__replica_state.items()}
+        return stats
+
+    # the pools (and the replica statistics) are dropped when database.ini changes, and in a forked
+    # child (a pool inherited through fork shares its sockets with the parent)
+    @staticmethod
+    def __check_pools() -> None:
+        key = (os.getpid(), DatabaseConfig.generation())
+        if DBConnector.__pool_key == key:
+            return
+        with DBConnector.__pool_lock:
+            if DBConnector.__pool_key != key:
+                for pool in DBConnector.__pools.values():
+                    if pool is not None and pool.pid == os.getpid():
+                        pool.closeall()
+                DBConnector.__pools = {}
+                DBConnector.__replica_state = {}
+                DBConnector.__replica_stats = dict.fromkeys(DBConnector.__replica_stats, 0)
+                DBConnector.__pool_key = key
+
+    # the pool of the primary or of a replica, created on first use
+    @staticmethod
+    def __get_pool(section: str) -> Optional[ConnectionPool]:
+        DBConnector.__check_pools()
+        if section in DBConnector.__pools:
+            return DBConnector.__pools[section]
+        with DBConnector.__pool_lock:
+            if section not in DBConnector.__pools:
+                settings = DBConnector.pool_settings()
+                enabled = settings.pop("enabled")
+                params = DBConnector.__params(section)
+                DBConnector.__pools[section] = ConnectionPool(params, **settings) if enabled else None
+            return DBConnector.__pools[section]
+
+    # a connection to the database of section, from its pool (returned with the pool, None if pooling
+    # is disabled)
+    @staticmethod
+    def __connect(section: str) -> (Optional[ConnectionPool], PooledConnection):
+        pool = DBConnector.__get_pool(section)
+        if pool is not None:
+            return pool, pool.getconn()
+        connection = psycopg2.connect(connection_factory=PooledConnection, **DBConnector.__params(section))
+        connection.autocommit = False
+        return None, connection
+
+    # connection parameters of the primary, or of a replica (defaulting to those of the primary)
+    @staticmethod
+    def __params(section: str) -> dict:
+        params = DBConnector.__config()
+        if section != 'postgresql':
+            params.update(DBConnector.__config(section))
+        return params
+
+    # take a connection to the next replica (round robin) that is reachable and at most max_staleness
+    # seconds behind the primary, leaves self.connection None if there is none
+    def __connect_replica(self) -> None:
+        DBConnector.__check_pools()
+        settings = DBConnector.replica_settings()
+        names = settings["names"]
+        turn = next(DBConnector.__replica_turn)
+        for index in range(len(names)):
+            name = names[(turn + index) % len(names)]
+            checked_at, lag = DBConnector.__replica_state.get(name, (None, None))
+            now = time.monotonic()
+            due = checked_at is None or now - checked_at >= settings["check_interval"]
+            if not due and (lag is None or lag > settings["max_staleness"]):
+                continue
+            pool, connection = None, None
             try:
-                self.connection.commit()
+                pool, connection = DBConnector.__connect(name)
+                if due:
+                    lag = DBConnector.__replica_lag(connection)
             except Exception:
-                raise DatabaseException.ConnectionInvalid("Could not commit changes")
+                lag = None
+            if due:
+                with DBConnector.__pool_lock:
+                    DBConnector.__replica_state[name] = (now, lag)
+            if lag is not None and lag <= settings["max_staleness"]:
+                self.__connection_pool, self.connection, self.replica = pool, connection, name
+                break
+            if connection is not None:
+                if pool is not None:
+                    pool.putconn(connection)
+                else:
+                    connection.close()
+        with DBConnector.__pool_lock:
+            DBConnector.__replica_stats["reads"] += 1
+            if self.replica is not None:
+                DBConnector.__replica_stats["replica_reads"] += 1
+            elif names:
+                DBConnector.__replica_stats["fallbacks"] += 1
+
+    # seconds the replica's data may be behind the primary: 0 if it replayed all the WAL the primary had
+    # flushed when checked (or is not a standby at all), else the age of the last transaction it replayed
+    # (infinite if it replayed none). It is measured against the primary, not against the WAL the replica
+    # received, so a standby whose WAL receiver disconnected does not count as fresh
+    @staticmethod
+    def __replica_lag(connection: PooledConnection) -> float:
+        pool, primary = DBConnector.__connect('postgresql')
+        try:
+            with primary.cursor() as cursor:
+                cursor.execute("select pg_current_wal_flush_lsn()")
+                primary_lsn = cursor.fetchone()[0]
+            primary.rollback()
+        finally:
+            if pool is not None:
+                pool.putconn(primary)
+            else:
+                primary.close()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                select case when not pg_is_in_recovery() or pg_last_wal_replay_lsn() >= %s::pg_lsn then 0
+                       else greatest(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+                       end""", (primary_lsn,))
+            lag = cursor.fetchone()[0]
+        connection.rollback()
+        return float('inf') if lag is None else float(lag)
+
+    # commit connection's changes (inside transaction() the changes are committed when it ends)
+    def commit(self):
+        with self.__lock:
+            if self.connection is not None and not self.__in_transaction:
+                try:
+                    self.connection.commit()
+                except Exception:
+                    raise DatabaseException.ConnectionInvalid("Could not commit changes")
 
     # rollback connection's changes
     def rollback(self):
-        if self.connection is not None:
+        with self.__lock:
+            self.__savepoint = False
+            if self.connection is not None:
+                try:
+                    self.connection.rollback()
+                except Exception:
+                    raise DatabaseException.ConnectionInvalid("Could not rollback changes")
+
+    # groups the statements executed in the with block into one transaction, committed when the block
+    # ends and rolled back if it raises. Every statement runs after a savepoint: a failed statement
+    # (e.g. a constraint violation) is rolled back on its own and the transaction goes on.
+    # Other threads cannot use the connector until the block ends. Nested blocks join the outer one
+    @contextmanager
+    def transaction(self):
+        with self.__lock:
+            if self.connection is None:
+                raise DatabaseException.ConnectionInvalid("Connection Invalid")
+            if self.__in_transaction:
+                yield self
+                return
+            self.__in_transaction = True
+            self.__savepoint = False
             try:
+                yield self
+            except BaseException:
+                self.__in_transaction = False
+                self.rollback()
+                raise
+            self.__in_transaction = False
+            self.__savepoint = False
+            self.commit()
+
+    # runs query on the cursor, inside transaction() after a savepoint that the statement is rolled back
+    # to if it fails. The savepoint is set (and the previous one released) in the same round trip.
+    # A read_only query outside transaction() runs in autocommit mode: psycopg2 sends no BEGIN before it
+    # and there is nothing to commit after it, so it costs one round trip instead of three. A transaction
+    # left aborted by a failed statement is rolled back first, one still open (e.g. of a stream being read)
+    # is not ended and the query runs in it
+    def __run(self, query: Union[str, sql.Composable], params=None, read_only: bool = False) -> None:
+        if not self.__in_transaction:
+            if read_only and self.connection.get_transaction_status() == extensions.TRANSACTION_STATUS_INERROR:
                 self.connection.rollback()
-            except Exception:
-                raise DatabaseException.ConnectionInvalid("Could not rollback changes")
+            if read_only and self.connection.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE:
+                self.connection.autocommit = True
+                try:
+                    self.cursor.execute(query, params)
+                finally:
+                    self.connection.autocommit = False
+            else:
+                self.cursor.execute(query, params)
+            return
+        prefix = "release savepoint statement; savepoint statement; " if self.__savepoint else "savepoint statement; "
+        query = prefix + query if isinstance(query, str) else sql.SQL(prefix) + query
+        self.__savepoint = True
+        try:
+            self.cursor.execute(query, params)
+        except psycopg2.Error:
+            self.cursor.execute("rollback to savepoint statement")
+            raise
 
     # executes the query, if it is SELECT you may ask to print the results with printSchema
+    # params are the values of the query's %s placeholders (if any)
+    # read_only=True is for queries that change nothing (plain SELECTs), they run without a transaction
     # returns the number of rows effected and a ResultSet (for SELECT)
-    def execute(self, query: Union[str, sql.Composed], printSchema=False) -> (int, ResultSet):
-        if self.connection is None:
-            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+    def execute(self, query: Union[str, sql.Composed], printSchema=False, params=None,
+                read_only: bool = False) -> (int, ResultSet):
+        if not Instrumentation.hooks:
+            return self.__execute(query, printSchema, params, read_only)
+        statement = query if isinstance(query, str) or self.connection is None else query.as_string(self.connection)
+        with Instrumentation.measure(statement, params) as event:
+            return self.__execute(query, printSchema, params, read_only, event)
 
-        # try to execute the query
-        try:
-            self.cursor.execute(query)
-            row_effected = max(self.cursor.rowcount, 0)
-            self.commit()
-        except errors.lookup("23502"):
-            raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
-        except errors.lookup("23503"):
-            raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
-        except errors.lookup("23505"):
-            raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
-        except errors.lookup("23514"):
-            raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
-
-        # get entries in case of SELECT
+    def __execute(self, query: Union[str, sql.Composed], printSchema: bool, params, read_only: bool,
+                  event: Optional[QueryEvent] = None) -> (int, ResultSet):
+        with self.__lock:
+            if self.connection is None:
+                raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+            # try to execute the query
+            with _violations():
+                self.__run(query, params, read_only)
+                row_effected = max(self.cursor.rowcount, 0)
+                if not read_only:
+                    self.commit()
+
+            return self.__result(row_effected, printSchema, event)
+
+    # register a statement (with $1, $2, ... parameters) for execute_prepared
+    @staticmethod
+    def register_statement(name: str, query: str) -> None:
+        DBConnector.__statements[name] = query
+
+    # the query registered under name
+    @staticmethod
+    def statement(name: str) -> str:
+        return DBConnector.__statements[name]
+
+    # executes a registered statement with the given parameters. The statement is PREPAREd the first
+    # time it is used on a connection, so a pooled connection parses and plans it once.
+    # read_only is as in execute()
+    # returns the number of rows effected and a ResultSet (for SELECT)
+    def execute_prepared(self, name: str, params: tuple = (), printSchema=False,
+                         read_only: bool = False) -> (int, ResultSet):
+        if not Instrumentation.hooks:
+            return self.__execute_prepared(name, params, printSchema, read_only)
+        with Instrumentation.measure(name, params, prepared=True) as event:
+            return self.__execute_prepared(name, params, printSchema, read_only, event)
+
+    def __execute_prepared(self, name: str, params: tuple, printSchema: bool, read_only: bool,
+                           event: Optional[QueryEvent] = None) -> (int, ResultSet):
+        execute = sql.SQL("execute {name} ({params})" if params else "execute {name}").format(
+            name=sql.Identifier(name), params=sql.SQL(', ').join(sql.Placeholder() * len(params)))
+        with self.__lock:
+            if self.connection is None:
+                raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+            with _violations():
+                try:
+                    self.__prepare(name, read_only=read_only)
+                    self.__run(execute, params, read_only)
+                except (errors.FeatureNotSupported, errors.InvalidSqlStatementName):
+                    # the prepared plan no longer matches the schema (or was deallocated), prepare it again
+                    if not self.__in_transaction:
+                        self.connection.rollback()
+                    self.__prepare(name, replace=True, read_only=read_only)
+                    self.__run(execute, params, read_only)
+                row_effected = max(self.cursor.rowcount, 0)
+                if not read_only:
+                    self.commit()
+
+            return self.__result(row_effected, printSchema, event)
+
+    def __prepare(self, name: str, replace: bool = False, read_only: bool = False) -> None:
+        query = DBConnector.__statements[name]
+        prepared = self.connection.prepared
+        if not replace and prepared.get(name) == query:
+            return
+        if name in prepared:
+            prepared.pop(name)
+            try:
+                self.__run(sql.SQL("deallocate {name}").format(name=sql.Identifier(name)), read_only=read_only)
+            except errors.InvalidSqlStatementName:
+                if not self.__in_transaction:
+                    self.connection.rollback()
+        self.__run(sql.SQL("prepare {name} as {query}").format(name=sql.Identifier(name), query=sql.SQL(query)),
+                   read_only=read_only)
+        prepared[name] = query
+
+    # the number of rows effected and the ResultSet of the statement just run, recorded in event for the
+    # instrumentation hooks
+    def __result(self, row_effected: int, printSchema: bool, event: Optional[QueryEvent]) -> (int, ResultSet):
+        entries = self.__entries(printSchema)
+        if event is not None:
+            event.done(self.cursor.statusmessage, row_effected, entries.rows)
+        return row_effected, entries
+
+    # get entries in case of SELECT
+    def __entries(self, printSchema: bool) -> ResultSet:
         if self.cursor.description is not None:
             entries = ResultSet(self.cursor.description, self.cursor.fetchall())
         else:
@@ -137,27 +690,39 @@ class DBConnector:
         if printSchema:
             print(entries)
 
-        return row_effected, entries
+        return entries
+
+    # executes a SELECT with a named server-side cursor and returns a StreamingResultSet that fetches
+    # itersize rows per round trip while it is iterated. The connection must not be used for other
+    # statements until the result was read (or closed)
+    def execute_stream(self, query: Union[str, sql.Composed], itersize: int = 2000, params=None) -> StreamingResultSet:
+        with self.__lock:
+            if self.connection is None:
+                raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+            cursor = self.connection.cursor(name="stream_%d" % next(DBConnector.__stream_ids))
+            cursor.itersize = itersize
+            with _violations():
+                cursor.execute(query, params)
+            return StreamingResultSet(self, cursor)
+
+    # runs a COPY ... FROM STDIN statement, source is a file-like object or an iterable of rows
+    # (rows are streamed to the server as CSV, so the iterable is never held in memory)
+    # returns the number of rows copied
+    def copy(self, query: Union[str, sql.Composed], source) -> int:
+        if not hasattr(source, 'read'):
+            source = CSVRowStream(source)
+        with self.__lock:
+            if self.connection is None:
+                raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+            with _violations():
+                self.cursor.copy_expert(query, source)
+                row_effected = max(self.cursor.rowcount, 0)
+                self.commit()
+            return row_effected
 
     # grant credentials
     @staticmethod
-    def __config(filename=os.path.join(os.path.join(os.getcwd(), "Utility"), 'database.ini'),
-                 section='postgresql'):
-        # create a parser
-        parser = ConfigParser()
-        # read config file
-        parser.read(filename)
-
-        # get section
-        db = {}
-        if parser.has_section(section):
-            params = parser.items(section)
-            for param in params:
-                db[param[0]] = param[1]
-        else:
-            # file not found
-            db = DBConnector.__config(
-                filename=os.path.join(os.path.join(os.path.dirname(os.getcwd()), 'Utility'), 'database.ini'))
-            if db is None:
-                raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
-        return db
+    def __config(section='postgresql', required=True):
+        return DatabaseConfig.get(section, required)
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+from Utility.Config import DatabaseConfig
+
+
+# in-process LRU cache with a time to live, for point lookups by primary key.
+# Entries are keyed by (kind, key), e.g. ('dish', 3). A reader takes a token() before querying the
+# database and passes it to put(), so a value read before a concurrent invalidate() is not stored.
+class EntityCache:
+    # constructor
+    def __init__(self, enabled: bool = False, max_size: int = 1024, ttl: float = 60.0):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__invalidations = 0
+        self.__stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    # a cache configured by the [cache] section of database.ini (disabled if the section is missing)
+    @staticmethod
+    def from_config() -> 'EntityCache':
+        params = DatabaseConfig.get('cache', required=False)
+        return EntityCache(enabled=params.get('enabled', 'false').strip().lower() in ('1', 'true', 'yes', 'on'),
+                           max_size=int(params.get('max_size', 1024)),
+                           ttl=float(params.get('ttl', 60.0)))
+
+    # the cached value, None on a miss
+    def get(self, kind: str, key: Hashable) -> Optional[tuple]:
+        if not self.enabled:
+            return None
+        with self.__lock:
+            entry = self.__entries.get((kind, key))
+            if entry is None:
+                self.__stats["misses"] += 1
+                return None
+            value, expires = entry
+            if time.monotonic() >= expires:
+                del self.__entries[(kind, key)]
+                self.__stats["expirations"] += 1
+                self.__stats["misses"] += 1
+                return None
+            self.__entries.move_to_end((kind, key))
+            self.__stats["hits"] += 1
+            return value
+
+    def token(self) -> int:
+        return self.__invalidations
+
+    # store a value read from the database, unless an invalidation happened since token was taken
+    def put(self, kind: str, key: Hashable, value: tuple, token: int) -> None:
+        if not self.enabled:
+            return
+        with self.__lock:
+            if token != self.__invalidations:
+                return
+            self.__entries[(kind, key)] = (value, time.monotonic() + self.ttl)
+            self.__entries.move_to_end((kind, key))
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.__stats["evictions"] += 1
+
+    def invalidate(self, kind: str, key: Hashable) -> None:
+        with self.__lock:
+            self.__invalidations += 1
+            self.__stats["invalidations"] += 1
+            self.__entries.pop((kind, key), None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__invalidations += 1
+            self.__entries.clear()
+
+    # hit/miss counters and current size
+    def stats(self) -> dict:
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats.update(size=len(self.__entries), max_size=self.max_size, enabled=self.enabled)
+        return stats
@@ -0,0 +1,42 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+from Utility.DBConnector import DBConnector
+
+
+# runs Solution API calls (or any function that opens its own DBConnector) on a bounded pool of
+# worker threads. Every call draws a connection from the process-wide pool and returns it when it
+# is done, so a worker holds at most one connection at a time. workers defaults to, and may not
+# exceed, the pool's maxconn, so workers never wait for each other's connections.
+# The pool hands a worker back the connection it used for its previous call, so each worker keeps
+# working on its own connection (and its prepared statements)
+class SolutionExecutor:
+    # constructor
+    def __init__(self, workers: Optional[int] = None):
+        settings = DBConnector.pool_settings()
+        if workers is None:
+            workers = settings["maxconn"]
+        if workers < 1:
+            raise ValueError("Invalid number of workers")
+        if settings["enabled"] and workers > settings["maxconn"]:
+            raise ValueError("More workers than pooled connections (maxconn=%d)" % settings["maxconn"])
+        self.workers = workers
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="solution")
+
+    def __enter__(self) -> 'SolutionExecutor':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.shutdown()
+
+    # schedule function(*args, **kwargs), the future holds its result
+    def submit(self, function: Callable, *args, **kwargs) -> Future:
+        return self.__executor.submit(function, *args, **kwargs)
+
+    # function applied to the items of iterables (like the builtin map), calls run concurrently and
+    # results are returned in order. timeout is the number of seconds to wait for all of them
+    def map(self, function: Callable, *iterables: Iterable, timeout: Optional[float] = None) -> Iterator:
+        return self.__executor.map(function, *iterables, timeout=timeout)
+
+    # wait for the scheduled calls and stop the worker threads
+    def shutdown(self, wait: bool = True) -> None:
+        self.__executor.shutdown(wait=wait)
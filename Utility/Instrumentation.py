@@ -0,0 +1,212 @@
+import bisect
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+# one statement run by DBConnector (or AsyncDBConnector), as passed to the instrumentation hooks.
+# function is the API function that ran it (e.g. 'Solution.get_customer'), statement the query text
+# or the name of the prepared statement (then prepared is True), params its parameters.
+# bytes_fetched (the size of the result's values in text form, about what was read from the server)
+# is computed when it is first read
+class QueryEvent:
+    __slots__ = ('function', 'statement', 'params', 'prepared', 'seconds', 'rows_returned', 'rows_affected',
+                 'error', 'rows', '__bytes_fetched')
+
+    def __init__(self, statement: str, params=None, prepared: bool = False):
+        self.function = None
+        self.statement = statement
+        self.params = params
+        self.prepared = prepared
+        self.seconds = 0.0
+        self.rows_returned = 0
+        self.rows_affected = 0
+        self.error = None
+        self.rows = ()
+        self.__bytes_fetched = None
+
+    # record the outcome of the statement: its command status (e.g. 'INSERT 0 3'), the number of rows
+    # effected (as DBConnector.execute returns it) and the rows returned. Only INSERT, UPDATE, DELETE,
+    # MERGE and COPY affect rows
+    def done(self, status: Optional[str], row_effected: int, rows: list) -> None:
+        self.rows = rows
+        if status is not None and status.startswith(('INSERT', 'UPDATE', 'DELETE', 'MERGE', 'COPY')):
+            self.rows_affected = row_effected
+
+    @property
+    def bytes_fetched(self) -> int:
+        if self.__bytes_fetched is None:
+            self.__bytes_fetched = sum(QueryEvent.__size(value) for row in self.rows for value in row)
+        return self.__bytes_fetched
+
+    @staticmethod
+    def __size(value) -> int:
+        if value is None:
+            return 0
+        if isinstance(value, (str, bytes, memoryview)):
+            return len(value)
+        return len(str(value))
+
+
+# instrumentation of the statements run through DBConnector: every registered hook is called with a
+# QueryEvent after each statement, e.g.
+#   metrics = QueryMetrics()
+#   Instrumentation.add_hook(metrics)
+# With no hook registered a statement costs one extra attribute check
+class Instrumentation:
+    hooks = ()
+    __lock = threading.Lock()
+
+    @staticmethod
+    def add_hook(hook: Callable[[QueryEvent], None]) -> None:
+        with Instrumentation.__lock:
+            Instrumentation.hooks = Instrumentation.hooks + (hook,)
+
+    @staticmethod
+    def remove_hook(hook: Callable[[QueryEvent], None]) -> None:
+        with Instrumentation.__lock:
+            Instrumentation.hooks = tuple(registered for registered in Instrumentation.hooks if registered != hook)
+
+    # times the statement run in the with block, which sets rows_affected and rows on the yielded
+    # event, and passes the event to the hooks. A failing hook does not fail the statement
+    @staticmethod
+    @contextmanager
+    def measure(statement: str, params=None, prepared: bool = False):
+        event = QueryEvent(statement, params, prepared)
+        start = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.seconds = time.perf_counter() - start
+            event.rows_returned = len(event.rows)
+            event.function = Instrumentation.caller()
+            for hook in Instrumentation.hooks:
+                try:
+                    hook(event)
+                except Exception:
+                    pass
+
+    # the public function (module.qualified_name) that ran the statement: the innermost caller outside
+    # of the Utility package that is not private (Solution's _write helpers are skipped)
+    @staticmethod
+    def caller() -> str:
+        frame = sys._getframe(1)
+        fallback = None
+        while frame is not None:
+            module = frame.f_globals.get('__name__', '')
+            if not module.startswith('Utility.') and module != 'contextlib':
+                name = getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+                if fallback is None:
+                    fallback = module + '.' + name
+                if not name.rsplit('.', 1)[-1].startswith(('_', '<')):
+                    return module + '.' + name
+            frame = frame.f_back
+        return fallback or '<unknown>'
+
+
+# histogram with fixed bucket upper bounds (an observation goes to the first bucket it is <= to)
+class Histogram:
+    # constructor
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # (upper bound, number of observations <= it) per bucket, the last bound is inf
+    def cumulative(self) -> List[tuple]:
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + [float('inf')], self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+    def to_dict(self) -> dict:
+        return {"buckets": [["+Inf" if bound == float('inf') else bound, count] for bound, count in self.cumulative()],
+                "sum": self.sum, "count": self.count}
+
+
+# instrumentation hook aggregating the statements per calling function into histograms of wall time,
+# rows returned and bytes fetched, and counters of rows affected and errors.
+# to_prometheus() renders them in the Prometheus text exposition format, to_json() as JSON
+class QueryMetrics:
+    seconds_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    rows_buckets = (0, 1, 10, 100, 1000, 10000, 100000)
+    bytes_buckets = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+    # constructor, measure_bytes=False skips computing bytes_fetched (its histogram stays empty)
+    def __init__(self, measure_bytes: bool = True, prefix: str = 'solution_query'):
+        self.measure_bytes = measure_bytes
+        self.prefix = prefix
+        self.__functions = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, event: QueryEvent) -> None:
+        bytes_fetched = event.bytes_fetched if self.measure_bytes else None
+        with self.__lock:
+            metrics = self.__functions.get(event.function)
+            if metrics is None:
+                metrics = self.__functions[event.function] = {
+                    "calls": 0, "errors": 0, "rows_affected": 0,
+                    "seconds": Histogram(QueryMetrics.seconds_buckets),
+                    "rows_returned": Histogram(QueryMetrics.rows_buckets),
+                    "bytes_fetched": Histogram(QueryMetrics.bytes_buckets)}
+            metrics["calls"] += 1
+            metrics["errors"] += event.error is not None
+            metrics["rows_affected"] += event.rows_affected
+            metrics["seconds"].observe(event.seconds)
+            metrics["rows_returned"].observe(event.rows_returned)
+            if bytes_fetched is not None:
+                metrics["bytes_fetched"].observe(bytes_fetched)
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__functions = {}
+
+    # {function: {"calls", "errors", "rows_affected", "seconds", "rows_returned", "bytes_fetched"}},
+    # the histograms as dicts of Histogram.to_dict
+    def snapshot(self) -> Dict[str, dict]:
+        with self.__lock:
+            return {function: {key: value.to_dict() if isinstance(value, Histogram) else value
+                               for key, value in metrics.items()}
+                    for function, metrics in sorted(self.__functions.items())}
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, kind, help_text in (
+                ("seconds", "histogram", "Wall time of the statements run by the function"),
+                ("rows_returned", "histogram", "Rows returned by the statements run by the function"),
+                ("bytes_fetched", "histogram", "Bytes of the rows returned to the function"),
+                ("rows_affected", "counter", "Rows inserted, updated or deleted by the function"),
+                ("errors", "counter", "Statements of the function that failed"),
+                ("calls", "counter", "Statements run by the function")):
+            metric = self.prefix + "_" + name + ("_total" if kind == "counter" else "")
+            lines.append("# HELP %s %s" % (metric, help_text))
+            lines.append("# TYPE %s %s" % (metric, kind))
+            for function, metrics in snapshot.items():
+                label = 'function="%s"' % function.replace('\\', '\\\\').replace('"', '\\"')
+                if kind == "counter":
+                    lines.append("%s{%s} %s" % (metric, label, metrics[name]))
+                    continue
+                histogram = metrics[name]
+                for bound, count in histogram["buckets"]:
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (metric, label, bound, count))
+                lines.append("%s_sum{%s} %s" % (metric, label, histogram["sum"]))
+                lines.append("%s_count{%s} %d" % (metric, label, histogram["count"]))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,173 @@
+import logging
+import logging.handlers
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import psycopg2
+from Utility.Config import DatabaseConfig
+from Utility.DBConnector import DBConnector
+from Utility.Instrumentation import QueryEvent
+
+# statements EXPLAIN accepts
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with', 'values', 'execute', 'merge', 'table')
+
+
+# instrumentation hook writing the statements that ran longer than threshold seconds to a rotating log
+# file (path, rotated at max_bytes with backup_count old files kept), with their parameters and, when
+# explain is set, an EXPLAIN (ANALYZE, BUFFERS) plan. The plan is captured in the background on a side
+# connection of its own, in a transaction that is rolled back (so a captured write changes nothing),
+# after the statement's own transaction went on. A statement that cannot be analyzed again (e.g. an
+# insert of a row that now exists) is logged with its plain EXPLAIN plan. At most max_pending
+# statements wait for their plan, slow statements beyond that are dropped
+class SlowQueryLog:
+    # constructor
+    def __init__(self, enabled: bool = False, threshold: float = 0.5, path: str = 'slow_queries.log',
+                 max_bytes: int = 10485760, backup_count: int = 5, explain: bool = True,
+                 explain_timeout: float = 30.0, max_pending: int = 100):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.path = path
+        self.explain = explain
+        self.explain_timeout = explain_timeout
+        self.max_pending = max_pending
+        self.__handler = None
+        self.__logger = None
+        self.__max_bytes = max_bytes
+        self.__backup_count = backup_count
+        self.__executor = None
+        self.__connection = None
+        self.__last = None
+        self.__pending = 0
+        self.__lock = threading.Lock()
+        self.__stats = {"logged": 0, "dropped": 0, "explain_failures": 0}
+
+    # a log configured by the [slow_query_log] section of database.ini (disabled if the section is missing)
+    @staticmethod
+    def from_config() -> 'SlowQueryLog':
+        params = DatabaseConfig.get('slow_query_log', required=False)
+        return SlowQueryLog(enabled=params.get('enabled', 'false').strip().lower() in ('1', 'true', 'yes', 'on'),
+                            threshold=float(params.get('threshold', 0.5)),
+                            path=params.get('path', 'slow_queries.log'),
+                            max_bytes=int(params.get('max_bytes', 10485760)),
+                            backup_count=int(params.get('backup_count', 5)),
+                            explain=params.get('explain', 'true').strip().lower() in ('1', 'true', 'yes', 'on'),
+                            explain_timeout=float(params.get('explain_timeout', 30.0)))
+
+    def __call__(self, event: QueryEvent) -> None:
+        if not self.enabled or event.seconds < self.threshold:
+            return
+        with self.__lock:
+            if self.__pending >= self.max_pending:
+                self.__stats["dropped"] += 1
+                return
+            self.__pending += 1
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow_query_log")
+            self.__last = self.__executor.submit(self.__write, event.function, event.statement, event.params,
+                                                 event.prepared, event.seconds, event.error)
+
+    # wait until the slow statements seen so far are written
+    def flush(self) -> None:
+        last = self.__last
+        if last is not None:
+            last.result()
+
+    # write the pending statements, then close the side connection and the log file
+    def close(self) -> None:
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+        if self.__handler is not None:
+            self.__logger.removeHandler(self.__handler)
+            self.__handler.close()
+            self.__handler = None
+
+    def stats(self) -> dict:
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats.update(pending=self.__pending)
+        return stats
+
+    def __write(self, function: str, statement: str, params, prepared: bool, seconds: float,
+                error: Optional[str]) -> None:
+        try:
+            query = DBConnector.statement(statement) if prepared else statement
+            lines = ["slow query: %.3f s in %s" % (seconds, function),
+                     "statement: " + (statement + ": " if prepared else "") + " ".join(query.split())]
+            if params is not None:
+                lines.append("parameters: " + SlowQueryLog.__shorten(repr(params)))
+            if error is not None:
+                lines.append("error: " + error)
+            elif self.explain:
+                lines.append("plan:")
+                lines.extend("  " + line for line in self.__plan(query, params, prepared).splitlines())
+            self.__get_logger().warning("\n".join(lines))
+            with self.__lock:
+                self.__stats["logged"] += 1
+        finally:
+            with self.__lock:
+                self.__pending -= 1
+
+    # the EXPLAIN (ANALYZE, BUFFERS) plan of the statement, the plain EXPLAIN plan if it fails
+    def __plan(self, query: str, params, prepared: bool) -> str:
+        query = query.strip().rstrip(';').strip()
+        if ';' in query or not query.split(None, 1)[0].lower() in EXPLAINABLE:
+            return "(not captured: only a single SELECT, INSERT, UPDATE or DELETE statement is explained)"
+        try:
+            return self.__explain(query, params, prepared, "analyze, buffers")
+        except psycopg2.Error as e:
+            with self.__lock:
+                self.__stats["explain_failures"] += 1
+            analyze_error = str(e).strip().splitlines()[0]
+        try:
+            plan = self.__explain(query, params, prepared, "costs")
+            return "(EXPLAIN ANALYZE failed: %s)\n%s" % (analyze_error, plan)
+        except psycopg2.Error as e:
+            return "(not captured: %s)" % str(e).strip().splitlines()[0]
+
+    def __explain(self, query: str, params, prepared: bool, options: str) -> str:
+        connection = self.__side_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("set local statement_timeout = %s; set local lock_timeout = '1s'",
+                               (int(self.explain_timeout * 1000),))
+                if prepared:
+                    cursor.execute("prepare slow_query_log_statement as " + query)
+                    query = "execute slow_query_log_statement"
+                    if params:
+                        query += " (" + ", ".join(["%s"] * len(params)) + ")"
+                cursor.execute("explain (" + options + ") " + query, params or None)
+                return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            connection.rollback()
+            if prepared:
+                # PREPARE is not undone by the rollback
+                with connection.cursor() as cursor:
+                    cursor.execute("deallocate all")
+                connection.rollback()
+
+    # the log's own connection to the primary, opened again if it was lost
+    def __side_connection(self):
+        if self.__connection is None or self.__connection.closed:
+            self.__connection = psycopg2.connect(**DatabaseConfig.get())
+            self.__connection.autocommit = False
+        return self.__connection
+
+    def __get_logger(self) -> logging.Logger:
+        if self.__handler is None:
+            self.__handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.__max_bytes,
+                                                                  backupCount=self.__backup_count)
+            self.__handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.__logger = logging.getLogger("slow_query_log.%d" % id(self))
+            self.__logger.propagate = False
+            self.__logger.setLevel(logging.INFO)
+            self.__logger.addHandler(self.__handler)
+        return self.__logger
+
+    @staticmethod
+    def __shorten(text: str, limit: int = 1000) -> str:
+        return text if len(text) <= limit else text[:limit] + "... (%d characters)" % len(text)